@@ -41,6 +41,7 @@ from .graphs import dijkstra
 from .graphs import dag_shortest_paths
 from .graphs import floyd_warshall
 from .graphs import bipartite_matching
+from .graphs import CSRGraph
 
 from .greedy import activity_selector
 from .greedy import task_scheduling
@@ -0,0 +1,32 @@
+# Copyright 2021 DeepMind Technologies Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Lightweight argument checks for the algorithm generators.
+
+These stand in for `chex` assertions, so that importing the generators does not
+import JAX.
+"""
+
+import numpy as np
+
+
+def assert_rank(inputs, expected_rank: int) -> None:
+  """Checks that an array, or each array in a list, has `expected_rank`."""
+  if not isinstance(inputs, (list, tuple)):
+    inputs = [inputs]
+  for x in inputs:
+    if np.ndim(x) != expected_rank:
+      raise AssertionError(
+          f'Expected rank {expected_rank}, got shape {np.shape(x)}.')
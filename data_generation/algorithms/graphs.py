@@ -36,23 +36,117 @@ See "Introduction to Algorithms" 3ed (CLRS3) for more information.
 # pylint: disable=invalid-name
 
 
-from typing import Tuple
+import collections
+from typing import Tuple, Union
 
-import chex
 import probing
 import specs
 import numpy as np
 
+from . import checks
+
 
 _Array = np.ndarray
 _Out = Tuple[_Array, probing.ProbesDict]
 _OutputClass = specs.OutputClass
 
 
-def dfs(A: _Array) -> _Out:
+class CSRGraph(
+    collections.namedtuple('CSRGraph', ['indptr', 'indices', 'weights'])):
+  """Sparse (compressed sparse row) weighted graph.
+
+  The neighbours of node `u` are `indices[indptr[u]:indptr[u + 1]]`, in
+  increasing order, with edge weights `weights[indptr[u]:indptr[u + 1]]`.
+  Graph algorithms that accept a `CSRGraph` visit neighbours in O(deg) and
+  produce the same probes as for the equivalent dense matrix.
+  """
+
+  @property
+  def shape(self) -> Tuple[int, int]:
+    nb_nodes = len(self.indptr) - 1
+    return (nb_nodes, nb_nodes)
+
+  @classmethod
+  def fromdense(cls, A: _Array) -> 'CSRGraph':
+    """CSR form of the adjacency (or weight) matrix `A`."""
+    checks.assert_rank(A, 2)
+    rows, cols = np.nonzero(A)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows,
+                                                        minlength=len(A)))])
+    return cls(indptr, cols, A[rows, cols])
+
+  def todense(self) -> _Array:
+    """Equivalent dense adjacency (or weight) matrix."""
+    nb_nodes = self.shape[0]
+    rows = np.repeat(np.arange(nb_nodes), np.diff(self.indptr))
+    mat = np.zeros(self.shape, dtype=self.weights.dtype)
+    mat[rows, self.indices] = self.weights
+    return mat
+
+
+_Graph = Union[_Array, CSRGraph]
+
+
+def _dense(A: _Graph) -> _Array:
+  """Checks that `A` is a graph and returns it as a new dense matrix.
+
+  A `CSRGraph` is densified into a new array, so only a dense `A` is copied.
+  Input probes may keep the result.
+  """
+  if isinstance(A, CSRGraph):
+    return A.todense()
+  checks.assert_rank(A, 2)
+  return np.copy(A)
+
+
+def _neighbours(A: _Graph, u: int) -> Tuple[_Array, _Array]:
+  """Nodes `v` with `A[u, v] != 0` in increasing order, and the weights."""
+  if isinstance(A, CSRGraph):
+    start, end = A.indptr[u], A.indptr[u + 1]
+    return A.indices[start:end], A.weights[start:end]
+  vs, = np.nonzero(A[u])
+  return vs, A[u, vs]
+
+
+def _edges_from(A: _Graph, us: _Array) -> Tuple[_Array, _Array, _Array]:
+  """Edges `(u, v, weight)` out of the sorted nodes `us`, in `(u, v)` order."""
+  if isinstance(A, CSRGraph):
+    starts = A.indptr[us]
+    counts = A.indptr[us + 1] - starts
+    # Positions of each node's edges, concatenated.
+    edges = (np.repeat(starts - np.cumsum(counts) + counts, counts) +
+             np.arange(counts.sum()))
+    return np.repeat(us, counts), A.indices[edges], A.weights[edges]
+  rows, vs = np.nonzero(A[us])
+  return us[rows], vs, A[us[rows], vs]
+
+
+def _extract_min(values: _Array) -> int:
+  """Index of the least value, breaking ties as `np.argsort(values)[0]` does.
+
+  The default `np.argsort` is not stable, so which of several tied minima it
+  puts first depends on the NumPy build. Only ties pay for a full sort.
+  """
+  u = np.argmin(values)
+  if np.count_nonzero(values == values[u]) > 1:
+    return np.argsort(values)[0]
+  return u
+
+
+def _first_minima(vs: _Array, values: _Array,
+                  us: _Array) -> Tuple[_Array, _Array, _Array]:
+  """For each distinct `v`, the least value and the lowest `u` attaining it."""
+  order = np.lexsort((us, values, vs))
+  vs, values, us = vs[order], values[order], us[order]
+  first = np.ones(len(vs), dtype=bool)
+  first[1:] = vs[1:] != vs[:-1]
+  return vs[first], values[first], us[first]
+
+
+def dfs(A: _Graph) -> _Out:
   """Depth-first search (Moore, 1959)."""
 
-  chex.assert_rank(A, 2)
+  A_dense = _dense(A)
   probes = probing.initialize(specs.SPECS['dfs'])
 
   A_pos = np.arange(A.shape[0])
@@ -62,8 +156,8 @@ def dfs(A: _Array) -> _Out:
       specs.Stage.INPUT,
       next_probe={
           'pos': np.copy(A_pos) * 1.0 / A.shape[0],
-          'A': np.copy(A),
-          'adj': probing.graph(np.copy(A))
+          'A': A_dense,
+          'adj': probing.graph(A_dense)
       })
 
   color = np.zeros(A.shape[0], dtype=np.int32)
@@ -81,11 +175,11 @@ def dfs(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'pi_h': np.copy(pi),
+              'pi_h': pi,
               'color': probing.array_cat(color, 3),
-              'd': np.copy(d),
-              'f': np.copy(f),
-              's_prev': np.copy(s_prev),
+              'd': d,
+              'f': f,
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -101,11 +195,11 @@ def dfs(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'pi_h': np.copy(pi),
+                  'pi_h': pi,
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -113,30 +207,32 @@ def dfs(A: _Array) -> _Out:
                   'time': time
               })
 
-        for v in range(A.shape[0]):
-          if A[u, v] != 0:
-            if color[v] == 0:
-              pi[v] = u
-              color[v] = 1
-              s_prev[v] = s_last
-              s_last = v
-
-              probing.push(
-                  probes,
-                  specs.Stage.HINT,
-                  next_probe={
-                      'pi_h': np.copy(pi),
-                      'color': probing.array_cat(color, 3),
-                      'd': np.copy(d),
-                      'f': np.copy(f),
-                      's_prev': np.copy(s_prev),
-                      's': probing.mask_one(s, A.shape[0]),
-                      'u': probing.mask_one(u, A.shape[0]),
-                      'v': probing.mask_one(v, A.shape[0]),
-                      's_last': probing.mask_one(s_last, A.shape[0]),
-                      'time': time
-                  })
-              break
+        for v in _neighbours(A, u)[0]:
+          if color[v] == 0:
+            pi[v] = u
+            color[v] = 1
+            s_prev[v] = s_last
+            s_last = v
+
+            probing.push(
+                probes,
+                specs.Stage.HINT,
+                next_probe={
+                    'pi_h': pi,
+                    'color': probing.array_cat(color, 3),
+                    'd': d,
+                    'f': f,
+                    's_prev': s_prev,
+                    's': probing.mask_one(s, A.shape[0]),
+                    'u': probing.mask_one(u, A.shape[0]),
+                    'v': probing.mask_one(v, A.shape[0]),
+                    's_last': probing.mask_one(s_last, A.shape[0]),
+                    'time': time
+                })
+            break
+        else:
+          # `v` ends where a scan over all the nodes would.
+          v = A.shape[0] - 1
 
         if s_last == u:
           color[u] = 2
@@ -147,11 +243,11 @@ def dfs(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'pi_h': np.copy(pi),
+                  'pi_h': pi,
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -174,10 +270,10 @@ def dfs(A: _Array) -> _Out:
   return pi, probes
 
 
-def bfs(A: _Array, s: int) -> _Out:
+def bfs(A: _Graph, s: int) -> _Out:
   """Breadth-first search (Moore, 1959)."""
 
-  chex.assert_rank(A, 2)
+  A_dense = _dense(A)
   probes = probing.initialize(specs.SPECS['bfs'])
 
   A_pos = np.arange(A.shape[0])
@@ -188,29 +284,32 @@ def bfs(A: _Array, s: int) -> _Out:
       next_probe={
           'pos': np.copy(A_pos) * 1.0 / A.shape[0],
           's': probing.mask_one(s, A.shape[0]),
-          'A': np.copy(A),
-          'adj': probing.graph(np.copy(A))
+          'A': A_dense,
+          'adj': probing.graph(A_dense)
       })
 
   reach = np.zeros(A.shape[0])
   pi = np.arange(A.shape[0])
   reach[s] = 1
   while True:
-    prev_reach = np.copy(reach)
     probing.push(
         probes,
         specs.Stage.HINT,
         next_probe={
-            'reach_h': np.copy(prev_reach),
-            'pi_h': np.copy(pi)
+            'reach_h': reach,
+            'pi_h': pi
         })
-    for i in range(A.shape[0]):
-      for j in range(A.shape[0]):
-        if A[i, j] > 0 and prev_reach[i] == 1:
-          if pi[j] == j and j != s:
-            pi[j] = i
-          reach[j] = 1
-    if np.all(reach == prev_reach):
+    us, js, ws = _edges_from(A, np.flatnonzero(reach == 1))
+    us, js = us[ws > 0], js[ws > 0]
+    # Edges are in (u, j) order, so the first edge into j is from the lowest
+    # reached u, which is the predecessor a scan over u would assign first.
+    js, first = np.unique(js, return_index=True)
+    us = us[first]
+    unassigned = (pi[js] == js) & (js != s)
+    pi[js[unassigned]] = us[unassigned]
+    changed = np.any(reach[js] != 1)
+    reach[js] = 1
+    if not changed:
       break
 
   probing.push(probes, specs.Stage.OUTPUT, next_probe={'pi': np.copy(pi)})
@@ -222,7 +321,7 @@ def bfs(A: _Array, s: int) -> _Out:
 def topological_sort(A: _Array) -> _Out:
   """Topological sorting (Knuth, 1973)."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   probes = probing.initialize(specs.SPECS['topological_sort'])
 
   A_pos = np.arange(A.shape[0])
@@ -249,10 +348,10 @@ def topological_sort(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'topo_h': np.copy(topo),
+              'topo_h': topo,
               'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
               'color': probing.array_cat(color, 3),
-              's_prev': np.copy(s_prev),
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -265,10 +364,10 @@ def topological_sort(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'topo_h': np.copy(topo),
+                  'topo_h': topo,
                   'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
                   'color': probing.array_cat(color, 3),
-                  's_prev': np.copy(s_prev),
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -286,10 +385,10 @@ def topological_sort(A: _Array) -> _Out:
                   probes,
                   specs.Stage.HINT,
                   next_probe={
-                      'topo_h': np.copy(topo),
+                      'topo_h': topo,
                       'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
                       'color': probing.array_cat(color, 3),
-                      's_prev': np.copy(s_prev),
+                      's_prev': s_prev,
                       's': probing.mask_one(s, A.shape[0]),
                       'u': probing.mask_one(u, A.shape[0]),
                       'v': probing.mask_one(v, A.shape[0]),
@@ -308,10 +407,10 @@ def topological_sort(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'topo_h': np.copy(topo),
+                  'topo_h': topo,
                   'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
                   'color': probing.array_cat(color, 3),
-                  's_prev': np.copy(s_prev),
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -342,7 +441,7 @@ def topological_sort(A: _Array) -> _Out:
 def articulation_points(A: _Array) -> _Out:
   """Articulation points."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   probes = probing.initialize(specs.SPECS['articulation_points'])
 
   A_pos = np.arange(A.shape[0])
@@ -376,14 +475,14 @@ def articulation_points(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'is_cut_h': np.copy(is_cut),
-              'pi_h': np.copy(pi),
+              'is_cut_h': is_cut,
+              'pi_h': pi,
               'color': probing.array_cat(color, 3),
-              'd': np.copy(d),
-              'f': np.copy(f),
-              'low': np.copy(low),
-              'child_cnt': np.copy(child_cnt),
-              's_prev': np.copy(s_prev),
+              'd': d,
+              'f': f,
+              'low': low,
+              'child_cnt': child_cnt,
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -400,14 +499,14 @@ def articulation_points(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'is_cut_h': np.copy(is_cut),
-                  'pi_h': np.copy(pi),
+                  'is_cut_h': is_cut,
+                  'pi_h': pi,
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  'low': np.copy(low),
-                  'child_cnt': np.copy(child_cnt),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  'low': low,
+                  'child_cnt': child_cnt,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -428,14 +527,14 @@ def articulation_points(A: _Array) -> _Out:
                   probes,
                   specs.Stage.HINT,
                   next_probe={
-                      'is_cut_h': np.copy(is_cut),
-                      'pi_h': np.copy(pi),
+                      'is_cut_h': is_cut,
+                      'pi_h': pi,
                       'color': probing.array_cat(color, 3),
-                      'd': np.copy(d),
-                      'f': np.copy(f),
-                      'low': np.copy(low),
-                      'child_cnt': np.copy(child_cnt),
-                      's_prev': np.copy(s_prev),
+                      'd': d,
+                      'f': f,
+                      'low': low,
+                      'child_cnt': child_cnt,
+                      's_prev': s_prev,
                       's': probing.mask_one(s, A.shape[0]),
                       'u': probing.mask_one(u, A.shape[0]),
                       'v': probing.mask_one(v, A.shape[0]),
@@ -449,14 +548,14 @@ def articulation_points(A: _Array) -> _Out:
                   probes,
                   specs.Stage.HINT,
                   next_probe={
-                      'is_cut_h': np.copy(is_cut),
-                      'pi_h': np.copy(pi),
+                      'is_cut_h': is_cut,
+                      'pi_h': pi,
                       'color': probing.array_cat(color, 3),
-                      'd': np.copy(d),
-                      'f': np.copy(f),
-                      'low': np.copy(low),
-                      'child_cnt': np.copy(child_cnt),
-                      's_prev': np.copy(s_prev),
+                      'd': d,
+                      'f': f,
+                      'low': low,
+                      'child_cnt': child_cnt,
+                      's_prev': s_prev,
                       's': probing.mask_one(s, A.shape[0]),
                       'u': probing.mask_one(u, A.shape[0]),
                       'v': probing.mask_one(v, A.shape[0]),
@@ -481,14 +580,14 @@ def articulation_points(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'is_cut_h': np.copy(is_cut),
-                  'pi_h': np.copy(pi),
+                  'is_cut_h': is_cut,
+                  'pi_h': pi,
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  'low': np.copy(low),
-                  'child_cnt': np.copy(child_cnt),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  'low': low,
+                  'child_cnt': child_cnt,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -518,7 +617,7 @@ def articulation_points(A: _Array) -> _Out:
 def bridges(A: _Array) -> _Out:
   """Bridges."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   probes = probing.initialize(specs.SPECS['bridges'])
 
   A_pos = np.arange(A.shape[0])
@@ -553,13 +652,13 @@ def bridges(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'is_bridge_h': np.copy(is_bridge),
-              'pi_h': np.copy(pi),
+              'is_bridge_h': is_bridge,
+              'pi_h': pi,
               'color': probing.array_cat(color, 3),
-              'd': np.copy(d),
-              'f': np.copy(f),
-              'low': np.copy(low),
-              's_prev': np.copy(s_prev),
+              'd': d,
+              'f': f,
+              'low': low,
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -576,13 +675,13 @@ def bridges(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'is_bridge_h': np.copy(is_bridge),
-                  'pi_h': np.copy(pi),
+                  'is_bridge_h': is_bridge,
+                  'pi_h': pi,
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  'low': np.copy(low),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  'low': low,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -602,13 +701,13 @@ def bridges(A: _Array) -> _Out:
                   probes,
                   specs.Stage.HINT,
                   next_probe={
-                      'is_bridge_h': np.copy(is_bridge),
-                      'pi_h': np.copy(pi),
+                      'is_bridge_h': is_bridge,
+                      'pi_h': pi,
                       'color': probing.array_cat(color, 3),
-                      'd': np.copy(d),
-                      'f': np.copy(f),
-                      'low': np.copy(low),
-                      's_prev': np.copy(s_prev),
+                      'd': d,
+                      'f': f,
+                      'low': low,
+                      's_prev': s_prev,
                       's': probing.mask_one(s, A.shape[0]),
                       'u': probing.mask_one(u, A.shape[0]),
                       'v': probing.mask_one(v, A.shape[0]),
@@ -622,13 +721,13 @@ def bridges(A: _Array) -> _Out:
                   probes,
                   specs.Stage.HINT,
                   next_probe={
-                      'is_bridge_h': np.copy(is_bridge),
-                      'pi_h': np.copy(pi),
+                      'is_bridge_h': is_bridge,
+                      'pi_h': pi,
                       'color': probing.array_cat(color, 3),
-                      'd': np.copy(d),
-                      'f': np.copy(f),
-                      'low': np.copy(low),
-                      's_prev': np.copy(s_prev),
+                      'd': d,
+                      'f': f,
+                      'low': low,
+                      's_prev': s_prev,
                       's': probing.mask_one(s, A.shape[0]),
                       'u': probing.mask_one(u, A.shape[0]),
                       'v': probing.mask_one(v, A.shape[0]),
@@ -652,13 +751,13 @@ def bridges(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'is_bridge_h': np.copy(is_bridge),
-                  'pi_h': np.copy(pi),
+                  'is_bridge_h': is_bridge,
+                  'pi_h': pi,
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  'low': np.copy(low),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  'low': low,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -688,7 +787,7 @@ def bridges(A: _Array) -> _Out:
 def strongly_connected_components(A: _Array) -> _Out:
   """Kosaraju's strongly-connected components (Aho et al., 1974)."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   probes = probing.initialize(
       specs.SPECS['strongly_connected_components'])
 
@@ -720,12 +819,12 @@ def strongly_connected_components(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'scc_id_h': np.copy(scc_id),
-              'A_t': probing.graph(np.copy(A_t)),
+              'scc_id_h': scc_id,
+              'A_t': probing.graph(A_t),
               'color': probing.array_cat(color, 3),
-              'd': np.copy(d),
-              'f': np.copy(f),
-              's_prev': np.copy(s_prev),
+              'd': d,
+              'f': f,
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -742,12 +841,12 @@ def strongly_connected_components(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'scc_id_h': np.copy(scc_id),
-                  'A_t': probing.graph(np.copy(A_t)),
+                  'scc_id_h': scc_id,
+                  'A_t': probing.graph(A_t),
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -765,12 +864,12 @@ def strongly_connected_components(A: _Array) -> _Out:
                   probes,
                   specs.Stage.HINT,
                   next_probe={
-                      'scc_id_h': np.copy(scc_id),
-                      'A_t': probing.graph(np.copy(A_t)),
+                      'scc_id_h': scc_id,
+                      'A_t': probing.graph(A_t),
                       'color': probing.array_cat(color, 3),
-                      'd': np.copy(d),
-                      'f': np.copy(f),
-                      's_prev': np.copy(s_prev),
+                      'd': d,
+                      'f': f,
+                      's_prev': s_prev,
                       's': probing.mask_one(s, A.shape[0]),
                       'u': probing.mask_one(u, A.shape[0]),
                       'v': probing.mask_one(v, A.shape[0]),
@@ -789,12 +888,12 @@ def strongly_connected_components(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'scc_id_h': np.copy(scc_id),
-                  'A_t': probing.graph(np.copy(A_t)),
+                  'scc_id_h': scc_id,
+                  'A_t': probing.graph(A_t),
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -824,12 +923,12 @@ def strongly_connected_components(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'scc_id_h': np.copy(scc_id),
-              'A_t': probing.graph(np.copy(A_t)),
+              'scc_id_h': scc_id,
+              'A_t': probing.graph(A_t),
               'color': probing.array_cat(color, 3),
-              'd': np.copy(d),
-              'f': np.copy(f),
-              's_prev': np.copy(s_prev),
+              'd': d,
+              'f': f,
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -847,12 +946,12 @@ def strongly_connected_components(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'scc_id_h': np.copy(scc_id),
-                  'A_t': probing.graph(np.copy(A_t)),
+                  'scc_id_h': scc_id,
+                  'A_t': probing.graph(A_t),
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -870,12 +969,12 @@ def strongly_connected_components(A: _Array) -> _Out:
                   probes,
                   specs.Stage.HINT,
                   next_probe={
-                      'scc_id_h': np.copy(scc_id),
-                      'A_t': probing.graph(np.copy(A_t)),
+                      'scc_id_h': scc_id,
+                      'A_t': probing.graph(A_t),
                       'color': probing.array_cat(color, 3),
-                      'd': np.copy(d),
-                      'f': np.copy(f),
-                      's_prev': np.copy(s_prev),
+                      'd': d,
+                      'f': f,
+                      's_prev': s_prev,
                       's': probing.mask_one(s, A.shape[0]),
                       'u': probing.mask_one(u, A.shape[0]),
                       'v': probing.mask_one(v, A.shape[0]),
@@ -894,12 +993,12 @@ def strongly_connected_components(A: _Array) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'scc_id_h': np.copy(scc_id),
-                  'A_t': probing.graph(np.copy(A_t)),
+                  'scc_id_h': scc_id,
+                  'A_t': probing.graph(A_t),
                   'color': probing.array_cat(color, 3),
-                  'd': np.copy(d),
-                  'f': np.copy(f),
-                  's_prev': np.copy(s_prev),
+                  'd': d,
+                  'f': f,
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -930,7 +1029,7 @@ def strongly_connected_components(A: _Array) -> _Out:
 def mst_kruskal(A: _Array) -> _Out:
   """Kruskal's minimum spanning tree (Kruskal, 1956)."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   probes = probing.initialize(specs.SPECS['mst_kruskal'])
 
   A_pos = np.arange(A.shape[0])
@@ -960,14 +1059,14 @@ def mst_kruskal(A: _Array) -> _Out:
         probes,
         specs.Stage.HINT,
         next_probe={
-            'in_mst_h': np.copy(in_mst),
-            'pi': np.copy(pi),
+            'in_mst_h': in_mst,
+            'pi': pi,
             'u': probing.mask_one(u, A.shape[0]),
             'v': probing.mask_one(v, A.shape[0]),
             'root_u': probing.mask_one(root_u, A.shape[0]),
             'root_v': probing.mask_one(root_v, A.shape[0]),
-            'mask_u': np.copy(mask_u),
-            'mask_v': np.copy(mask_v),
+            'mask_u': mask_u,
+            'mask_v': mask_v,
             'phase': probing.mask_one(1, 3)
         })
 
@@ -981,14 +1080,14 @@ def mst_kruskal(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'in_mst_h': np.copy(in_mst),
-              'pi': np.copy(pi),
+              'in_mst_h': in_mst,
+              'pi': pi,
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
               'root_u': probing.mask_one(root_u, A.shape[0]),
               'root_v': probing.mask_one(root_v, A.shape[0]),
-              'mask_u': np.copy(mask_u),
-              'mask_v': np.copy(mask_v),
+              'mask_u': mask_u,
+              'mask_v': mask_v,
               'phase': probing.mask_one(1, 3)
           })
 
@@ -1002,14 +1101,14 @@ def mst_kruskal(A: _Array) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'in_mst_h': np.copy(in_mst),
-              'pi': np.copy(pi),
+              'in_mst_h': in_mst,
+              'pi': pi,
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
               'root_u': probing.mask_one(root_u, A.shape[0]),
               'root_v': probing.mask_one(root_v, A.shape[0]),
-              'mask_u': np.copy(mask_u),
-              'mask_v': np.copy(mask_v),
+              'mask_u': mask_u,
+              'mask_v': mask_v,
               'phase': probing.mask_one(2, 3)
           })
 
@@ -1025,14 +1124,14 @@ def mst_kruskal(A: _Array) -> _Out:
         probes,
         specs.Stage.HINT,
         next_probe={
-            'in_mst_h': np.copy(in_mst),
-            'pi': np.copy(pi),
+            'in_mst_h': in_mst,
+            'pi': pi,
             'u': probing.mask_one(u, A.shape[0]),
             'v': probing.mask_one(v, A.shape[0]),
             'root_u': probing.mask_one(root_u, A.shape[0]),
             'root_v': probing.mask_one(root_v, A.shape[0]),
-            'mask_u': np.copy(mask_u),
-            'mask_v': np.copy(mask_v),
+            'mask_u': mask_u,
+            'mask_v': mask_v,
             'phase': probing.mask_one(0, 3)
         })
 
@@ -1053,8 +1152,8 @@ def mst_kruskal(A: _Array) -> _Out:
       probes,
       specs.Stage.HINT,
       next_probe={
-          'in_mst_h': np.copy(in_mst),
-          'pi': np.copy(pi),
+          'in_mst_h': in_mst,
+          'pi': pi,
           'u': probing.mask_one(0, A.shape[0]),
           'v': probing.mask_one(0, A.shape[0]),
           'root_u': probing.mask_one(0, A.shape[0]),
@@ -1078,10 +1177,10 @@ def mst_kruskal(A: _Array) -> _Out:
   return in_mst, probes
 
 
-def mst_prim(A: _Array, s: int) -> _Out:
+def mst_prim(A: _Graph, s: int) -> _Out:
   """Prim's minimum spanning tree (Prim, 1957)."""
 
-  chex.assert_rank(A, 2)
+  A_dense = _dense(A)
   probes = probing.initialize(specs.SPECS['mst_prim'])
 
   A_pos = np.arange(A.shape[0])
@@ -1092,8 +1191,8 @@ def mst_prim(A: _Array, s: int) -> _Out:
       next_probe={
           'pos': np.copy(A_pos) * 1.0 / A.shape[0],
           's': probing.mask_one(s, A.shape[0]),
-          'A': np.copy(A),
-          'adj': probing.graph(np.copy(A))
+          'A': A_dense,
+          'adj': probing.graph(A_dense)
       })
 
   key = np.zeros(A.shape[0])
@@ -1107,34 +1206,34 @@ def mst_prim(A: _Array, s: int) -> _Out:
       probes,
       specs.Stage.HINT,
       next_probe={
-          'pi_h': np.copy(pi),
-          'key': np.copy(key),
-          'mark': np.copy(mark),
-          'in_queue': np.copy(in_queue),
+          'pi_h': pi,
+          'key': key,
+          'mark': mark,
+          'in_queue': in_queue,
           'u': probing.mask_one(s, A.shape[0])
       })
 
   for _ in range(A.shape[0]):
-    u = np.argsort(key + (1.0 - in_queue) * 1e9)[0]  # drop-in for extract-min
+    u = _extract_min(key + (1.0 - in_queue) * 1e9)
     if in_queue[u] == 0:
       break
     mark[u] = 1
     in_queue[u] = 0
-    for v in range(A.shape[0]):
-      if A[u, v] != 0:
-        if mark[v] == 0 and (in_queue[v] == 0 or A[u, v] < key[v]):
-          pi[v] = u
-          key[v] = A[u, v]
-          in_queue[v] = 1
+    vs, ws = _neighbours(A, u)
+    relax = (mark[vs] == 0) & ((in_queue[vs] == 0) | (ws < key[vs]))
+    vs = vs[relax]
+    pi[vs] = u
+    key[vs] = ws[relax]
+    in_queue[vs] = 1
 
     probing.push(
         probes,
         specs.Stage.HINT,
         next_probe={
-            'pi_h': np.copy(pi),
-            'key': np.copy(key),
-            'mark': np.copy(mark),
-            'in_queue': np.copy(in_queue),
+            'pi_h': pi,
+            'key': key,
+            'mark': mark,
+            'in_queue': in_queue,
             'u': probing.mask_one(u, A.shape[0])
         })
 
@@ -1144,10 +1243,10 @@ def mst_prim(A: _Array, s: int) -> _Out:
   return pi, probes
 
 
-def bellman_ford(A: _Array, s: int) -> _Out:
+def bellman_ford(A: _Graph, s: int) -> _Out:
   """Bellman-Ford's single-source shortest path (Bellman, 1958)."""
 
-  chex.assert_rank(A, 2)
+  A_dense = _dense(A)
   probes = probing.initialize(specs.SPECS['bellman_ford'])
 
   A_pos = np.arange(A.shape[0])
@@ -1158,8 +1257,8 @@ def bellman_ford(A: _Array, s: int) -> _Out:
       next_probe={
           'pos': np.copy(A_pos) * 1.0 / A.shape[0],
           's': probing.mask_one(s, A.shape[0]),
-          'A': np.copy(A),
-          'adj': probing.graph(np.copy(A))
+          'A': A_dense,
+          'adj': probing.graph(A_dense)
       })
 
   d = np.zeros(A.shape[0])
@@ -1168,24 +1267,26 @@ def bellman_ford(A: _Array, s: int) -> _Out:
   d[s] = 0
   msk[s] = 1
   while True:
-    prev_d = np.copy(d)
-    prev_msk = np.copy(msk)
     probing.push(
         probes,
         specs.Stage.HINT,
         next_probe={
-            'pi_h': np.copy(pi),
-            'd': np.copy(prev_d),
-            'msk': np.copy(prev_msk)
+            'pi_h': pi,
+            'd': d,
+            'msk': msk
         })
-    for u in range(A.shape[0]):
-      for v in range(A.shape[0]):
-        if prev_msk[u] == 1 and A[u, v] != 0:
-          if msk[v] == 0 or prev_d[u] + A[u, v] < d[v]:
-            d[v] = prev_d[u] + A[u, v]
-            pi[v] = u
-          msk[v] = 1
-    if np.all(d == prev_d):
+    us, vs, ws = _edges_from(A, np.flatnonzero(msk == 1))
+    vs, new_d, us = _first_minima(vs, d[us] + ws, us)
+    # As relaxing the edges in (u, v) order would: an unreached v takes its
+    # best candidate, a reached one only a strictly better candidate, and ties
+    # go to the lowest u.
+    improved = (msk[vs] == 0) | (new_d < d[vs])
+    vs, new_d, us = vs[improved], new_d[improved], us[improved]
+    changed = np.any(new_d != d[vs])
+    d[vs] = new_d
+    pi[vs] = us
+    msk[vs] = 1
+    if not changed:
       break
 
   probing.push(probes, specs.Stage.OUTPUT, next_probe={'pi': np.copy(pi)})
@@ -1194,10 +1295,10 @@ def bellman_ford(A: _Array, s: int) -> _Out:
   return pi, probes
 
 
-def dijkstra(A: _Array, s: int) -> _Out:
+def dijkstra(A: _Graph, s: int) -> _Out:
   """Dijkstra's single-source shortest path (Dijkstra, 1959)."""
 
-  chex.assert_rank(A, 2)
+  A_dense = _dense(A)
   probes = probing.initialize(specs.SPECS['dijkstra'])
 
   A_pos = np.arange(A.shape[0])
@@ -1208,8 +1309,8 @@ def dijkstra(A: _Array, s: int) -> _Out:
       next_probe={
           'pos': np.copy(A_pos) * 1.0 / A.shape[0],
           's': probing.mask_one(s, A.shape[0]),
-          'A': np.copy(A),
-          'adj': probing.graph(np.copy(A))
+          'A': A_dense,
+          'adj': probing.graph(A_dense)
       })
 
   d = np.zeros(A.shape[0])
@@ -1223,34 +1324,35 @@ def dijkstra(A: _Array, s: int) -> _Out:
       probes,
       specs.Stage.HINT,
       next_probe={
-          'pi_h': np.copy(pi),
-          'd': np.copy(d),
-          'mark': np.copy(mark),
-          'in_queue': np.copy(in_queue),
+          'pi_h': pi,
+          'd': d,
+          'mark': mark,
+          'in_queue': in_queue,
           'u': probing.mask_one(s, A.shape[0])
       })
 
   for _ in range(A.shape[0]):
-    u = np.argsort(d + (1.0 - in_queue) * 1e9)[0]  # drop-in for extract-min
+    u = _extract_min(d + (1.0 - in_queue) * 1e9)
     if in_queue[u] == 0:
       break
     mark[u] = 1
     in_queue[u] = 0
-    for v in range(A.shape[0]):
-      if A[u, v] != 0:
-        if mark[v] == 0 and (in_queue[v] == 0 or d[u] + A[u, v] < d[v]):
-          pi[v] = u
-          d[v] = d[u] + A[u, v]
-          in_queue[v] = 1
+    vs, ws = _neighbours(A, u)
+    new_d = d[u] + ws
+    relax = (mark[vs] == 0) & ((in_queue[vs] == 0) | (new_d < d[vs]))
+    vs = vs[relax]
+    pi[vs] = u
+    d[vs] = new_d[relax]
+    in_queue[vs] = 1
 
     probing.push(
         probes,
         specs.Stage.HINT,
         next_probe={
-            'pi_h': np.copy(pi),
-            'd': np.copy(d),
-            'mark': np.copy(mark),
-            'in_queue': np.copy(in_queue),
+            'pi_h': pi,
+            'd': d,
+            'mark': mark,
+            'in_queue': in_queue,
             'u': probing.mask_one(u, A.shape[0])
         })
 
@@ -1263,7 +1365,7 @@ def dijkstra(A: _Array, s: int) -> _Out:
 def dag_shortest_paths(A: _Array, s: int) -> _Out:
   """DAG shortest path."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   probes = probing.initialize(specs.SPECS['dag_shortest_paths'])
 
   A_pos = np.arange(A.shape[0])
@@ -1292,13 +1394,13 @@ def dag_shortest_paths(A: _Array, s: int) -> _Out:
       probes,
       specs.Stage.HINT,
       next_probe={
-          'pi_h': np.copy(pi),
-          'd': np.copy(d),
-          'mark': np.copy(mark),
-          'topo_h': np.copy(topo),
+          'pi_h': pi,
+          'd': d,
+          'mark': mark,
+          'topo_h': topo,
           'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
           'color': probing.array_cat(color, 3),
-          's_prev': np.copy(s_prev),
+          's_prev': s_prev,
           's': probing.mask_one(s, A.shape[0]),
           'u': probing.mask_one(u, A.shape[0]),
           'v': probing.mask_one(v, A.shape[0]),
@@ -1312,13 +1414,13 @@ def dag_shortest_paths(A: _Array, s: int) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'pi_h': np.copy(pi),
-              'd': np.copy(d),
-              'mark': np.copy(mark),
-              'topo_h': np.copy(topo),
+              'pi_h': pi,
+              'd': d,
+              'mark': mark,
+              'topo_h': topo,
               'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
               'color': probing.array_cat(color, 3),
-              's_prev': np.copy(s_prev),
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -1337,13 +1439,13 @@ def dag_shortest_paths(A: _Array, s: int) -> _Out:
               probes,
               specs.Stage.HINT,
               next_probe={
-                  'pi_h': np.copy(pi),
-                  'd': np.copy(d),
-                  'mark': np.copy(mark),
-                  'topo_h': np.copy(topo),
+                  'pi_h': pi,
+                  'd': d,
+                  'mark': mark,
+                  'topo_h': topo,
                   'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
                   'color': probing.array_cat(color, 3),
-                  's_prev': np.copy(s_prev),
+                  's_prev': s_prev,
                   's': probing.mask_one(s, A.shape[0]),
                   'u': probing.mask_one(u, A.shape[0]),
                   'v': probing.mask_one(v, A.shape[0]),
@@ -1363,13 +1465,13 @@ def dag_shortest_paths(A: _Array, s: int) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'pi_h': np.copy(pi),
-              'd': np.copy(d),
-              'mark': np.copy(mark),
-              'topo_h': np.copy(topo),
+              'pi_h': pi,
+              'd': d,
+              'mark': mark,
+              'topo_h': topo,
               'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
               'color': probing.array_cat(color, 3),
-              's_prev': np.copy(s_prev),
+              's_prev': s_prev,
               's': probing.mask_one(s, A.shape[0]),
               'u': probing.mask_one(u, A.shape[0]),
               'v': probing.mask_one(v, A.shape[0]),
@@ -1398,13 +1500,13 @@ def dag_shortest_paths(A: _Array, s: int) -> _Out:
         probes,
         specs.Stage.HINT,
         next_probe={
-            'pi_h': np.copy(pi),
-            'd': np.copy(d),
-            'mark': np.copy(mark),
-            'topo_h': np.copy(topo),
+            'pi_h': pi,
+            'd': d,
+            'mark': mark,
+            'topo_h': topo,
             'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
             'color': probing.array_cat(color, 3),
-            's_prev': np.copy(s_prev),
+            's_prev': s_prev,
             's': probing.mask_one(s, A.shape[0]),
             'u': probing.mask_one(u, A.shape[0]),
             'v': probing.mask_one(v, A.shape[0]),
@@ -1425,13 +1527,13 @@ def dag_shortest_paths(A: _Array, s: int) -> _Out:
       probes,
       specs.Stage.HINT,
       next_probe={
-          'pi_h': np.copy(pi),
-          'd': np.copy(d),
-          'mark': np.copy(mark),
-          'topo_h': np.copy(topo),
+          'pi_h': pi,
+          'd': d,
+          'mark': mark,
+          'topo_h': topo,
           'topo_head_h': probing.mask_one(topo_head, A.shape[0]),
           'color': probing.array_cat(color, 3),
-          's_prev': np.copy(s_prev),
+          's_prev': s_prev,
           's': probing.mask_one(s, A.shape[0]),
           'u': probing.mask_one(u, A.shape[0]),
           'v': probing.mask_one(v, A.shape[0]),
@@ -1448,7 +1550,7 @@ def dag_shortest_paths(A: _Array, s: int) -> _Out:
 def floyd_warshall(A: _Array) -> _Out:
   """Floyd-Warshall's all-pairs shortest paths (Floyd, 1962)."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   probes = probing.initialize(specs.SPECS['floyd_warshall'])
 
   A_pos = np.arange(A.shape[0])
@@ -1466,33 +1568,27 @@ def floyd_warshall(A: _Array) -> _Out:
   Pi = np.zeros((A.shape[0], A.shape[0]))
   msk = probing.graph(np.copy(A))
 
-  for i in range(A.shape[0]):
-    for j in range(A.shape[0]):
-      Pi[i, j] = i
+  Pi[:] = A_pos[:, None]
 
   for k in range(A.shape[0]):
-    prev_D = np.copy(D)
-    prev_msk = np.copy(msk)
-
     probing.push(
         probes,
         specs.Stage.HINT,
         next_probe={
-            'Pi_h': np.copy(Pi),
-            'D': np.copy(prev_D),
-            'msk': np.copy(prev_msk),
+            'Pi_h': Pi,
+            'D': D,
+            'msk': msk,
             'k': probing.mask_one(k, A.shape[0])
         })
 
-    for i in range(A.shape[0]):
-      for j in range(A.shape[0]):
-        if prev_msk[i, k] > 0 and prev_msk[k, j] > 0:
-          if msk[i, j] == 0 or prev_D[i, k] + prev_D[k, j] < D[i, j]:
-            D[i, j] = prev_D[i, k] + prev_D[k, j]
-            Pi[i, j] = Pi[k, j]
-          else:
-            D[i, j] = prev_D[i, j]
-          msk[i, j] = 1
+    # Relax all (i, j) through k at once. Row k of Pi is never changed by this
+    # (Pi[k, j] = Pi[k, j]), so every row reads the same Pi[k].
+    via_k = (msk[:, k, None] > 0) & (msk[None, k, :] > 0)
+    D_via_k = D[:, k, None] + D[None, k, :]
+    improved = via_k & ((msk == 0) | (D_via_k < D))
+    np.copyto(D, D_via_k, where=improved)
+    np.copyto(Pi, Pi[k], where=improved)
+    msk[via_k] = 1
 
   probing.push(probes, specs.Stage.OUTPUT, next_probe={'Pi': np.copy(Pi)})
   probing.finalize(probes)
@@ -1503,7 +1599,7 @@ def floyd_warshall(A: _Array) -> _Out:
 def bipartite_matching(A: _Array, n: int, m: int, s: int, t: int) -> _Out:
   """Edmonds-Karp bipartite matching (Edmund & Karp, 1972)."""
 
-  chex.assert_rank(A, 2)
+  checks.assert_rank(A, 2)
   assert A.shape[0] == n + m + 2  # add source and sink vertices
   assert s == 0 and t == n + m + 1  # ensure for consistency
 
@@ -1539,12 +1635,12 @@ def bipartite_matching(A: _Array, n: int, m: int, s: int, t: int) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'in_matching_h': np.copy(in_matching),
-              'A_h': np.copy(A),
-              'adj_h': probing.graph(np.copy(A)),
-              'd': np.copy(prev_d),
-              'msk': np.copy(prev_mask),
-              'pi': np.copy(pi),
+              'in_matching_h': in_matching,
+              'A_h': A,
+              'adj_h': probing.graph(A),
+              'd': prev_d,
+              'msk': prev_mask,
+              'pi': pi,
               'u': probing.mask_one(u, A.shape[0]),
               'phase': 0
           })
@@ -1571,12 +1667,12 @@ def bipartite_matching(A: _Array, n: int, m: int, s: int, t: int) -> _Out:
         probes,
         specs.Stage.HINT,
         next_probe={
-            'in_matching_h': np.copy(in_matching),
-            'A_h': np.copy(A),
-            'adj_h': probing.graph(np.copy(A)),
-            'd': np.copy(prev_d),
-            'msk': np.copy(prev_mask),
-            'pi': np.copy(pi),
+            'in_matching_h': in_matching,
+            'A_h': A,
+            'adj_h': probing.graph(A),
+            'd': prev_d,
+            'msk': prev_mask,
+            'pi': pi,
             'u': probing.mask_one(u, A.shape[0]),
             'phase': 1
         })
@@ -1592,12 +1688,12 @@ def bipartite_matching(A: _Array, n: int, m: int, s: int, t: int) -> _Out:
           probes,
           specs.Stage.HINT,
           next_probe={
-              'in_matching_h': np.copy(in_matching),
-              'A_h': np.copy(A),
-              'adj_h': probing.graph(np.copy(A)),
-              'd': np.copy(prev_d),
-              'msk': np.copy(prev_mask),
-              'pi': np.copy(pi),
+              'in_matching_h': in_matching,
+              'A_h': A,
+              'adj_h': probing.graph(A),
+              'd': prev_d,
+              'msk': prev_mask,
+              'pi': pi,
               'u': probing.mask_one(u, A.shape[0]),
               'phase': 1
           })
@@ -0,0 +1,273 @@
+# Copyright 2021 DeepMind Technologies Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Batched executors of graph algorithms.
+
+Each executor runs the algorithm of the same name in `graphs.py` on a batch of
+graphs with the same number of nodes, given as a [B, N, N] adjacency array,
+updating the state of all graphs at each step at once. It returns the batched
+output and a `BatchedProbes` holding the data points of the whole batch in the
+layout produced by batching per-graph probes in `samplers.py`: inputs and
+outputs of shape [B, ...], and float64 hints of shape [T, B, ...], zero-padded
+past each graph's number of steps, which is returned in `lengths`. The data is
+identical to running the per-graph algorithm on each graph.
+
+"""
+# pylint: disable=invalid-name
+
+import collections
+from typing import Dict, List, Optional, Tuple
+
+import probing
+import specs
+import numpy as np
+
+from . import checks
+from . import graphs
+
+
+_Array = np.ndarray
+_DataPoint = probing.DataPoint
+
+BatchedProbes = collections.namedtuple(
+    'BatchedProbes', ['inputs', 'outputs', 'hints', 'lengths'])
+_BatchedOut = Tuple[_Array, BatchedProbes]
+
+
+class _HintRecorder:
+  """Records the hints of a batch whose graphs may stop at different steps."""
+
+  def __init__(self, spec: specs.Spec, batch_size: int):
+    self._spec = spec
+    self._steps = collections.defaultdict(list)
+    self._lengths = np.zeros(batch_size)
+
+  def push(self, active: _Array, next_probe: Dict[str, _Array]):
+    """Records a step of the graphs where `active` is set."""
+    for name, data in next_probe.items():
+      data = data.astype(np.float64)
+      data[~active] = 0
+      self._steps[name].append(data)
+    self._lengths += active
+
+  def finalize(self) -> Tuple[List[_DataPoint], _Array]:
+    hints = [_DataPoint(name, loc, t, np.stack(self._steps[name]))
+             for name, (stage, loc, t) in self._spec.items()
+             if stage == specs.Stage.HINT]
+    return hints, self._lengths
+
+
+def _data_points(spec: specs.Spec, stage: str,
+                 data: Dict[str, _Array]) -> List[_DataPoint]:
+  """Input or output data points; `data` is keyed by probe name."""
+  points = []
+  for name, (probe_stage, loc, t) in spec.items():
+    if probe_stage == stage:
+      # As `probing.finalize` squeezes each graph's inputs and outputs.
+      shape = (len(data[name]),) + tuple(
+          dim for dim in data[name].shape[1:] if dim != 1)
+      points.append(_DataPoint(name, loc, t, data[name].reshape(shape)))
+  return points
+
+
+def _one_hot(indices: _Array, n: int) -> _Array:
+  """Batched `probing.mask_one`."""
+  return (np.asarray(indices)[..., None] == np.arange(n)) * 1.0
+
+
+def _graph_inputs(spec: specs.Spec, A: _Array,
+                  s: Optional[_Array] = None) -> List[_DataPoint]:
+  """The `pos`, `s`, `A` and `adj` inputs of a batch of graphs."""
+  batch_size, n = A.shape[:2]
+  data = {
+      'pos': np.tile(np.arange(n) * 1.0 / n, (batch_size, 1)),
+      'A': np.copy(A),
+      'adj': ((A + np.eye(n)) != 0) * 1.0,
+  }
+  if s is not None:
+    data['s'] = _one_hot(s, n)
+  return _data_points(spec, specs.Stage.INPUT, data)
+
+
+def _extract_min(values: _Array) -> _Array:
+  """Batched `graphs._extract_min`, over the last axis."""
+  u = values.argmin(-1)
+  minima = np.take_along_axis(values, u[:, None], -1)
+  tied = np.count_nonzero(values == minima, axis=-1) > 1
+  if tied.any():
+    # `np.argsort` sorts each row as it would sort the row alone.
+    u[tied] = np.argsort(values[tied], axis=-1)[:, 0]
+  return u
+
+
+def bfs(A: _Array, s: _Array) -> _BatchedOut:
+  """Batched breadth-first search (see `graphs.bfs`)."""
+
+  checks.assert_rank(A, 3)
+  spec = specs.SPECS['bfs']
+  batch_size, n = A.shape[:2]
+  nodes = np.arange(n)
+  s = np.asarray(s)
+  inputs = _graph_inputs(spec, A, s)
+  hints = _HintRecorder(spec, batch_size)
+
+  reach = np.zeros((batch_size, n))
+  pi = np.tile(nodes, (batch_size, 1))
+  reach[np.arange(batch_size), s] = 1
+  edges = A > 0
+  active = np.ones(batch_size, dtype=bool)
+  while active.any():
+    hints.push(active, {'reach_h': reach, 'pi_h': pi})
+    # frontier[b, i, j]: an edge i -> j from a reached node i. The predecessor
+    # of a newly reached j is the lowest such i, as in `graphs.bfs`.
+    frontier = (reach == 1)[:, :, None] & edges
+    reached = frontier.any(1) & active[:, None]
+    unassigned = reached & (pi == nodes) & (nodes != s[:, None])
+    pi = np.where(unassigned, frontier.argmax(1), pi)
+    active &= (reached & (reach != 1)).any(1)
+    reach[reached] = 1
+
+  hints, lengths = hints.finalize()
+  outputs = _data_points(spec, specs.Stage.OUTPUT, {'pi': np.copy(pi)})
+  return pi, BatchedProbes(inputs, outputs, hints, lengths)
+
+
+def bellman_ford(A: _Array, s: _Array) -> _BatchedOut:
+  """Batched Bellman-Ford's single-source shortest path (see `graphs`)."""
+
+  checks.assert_rank(A, 3)
+  spec = specs.SPECS['bellman_ford']
+  batch_size, n = A.shape[:2]
+  s = np.asarray(s)
+  inputs = _graph_inputs(spec, A, s)
+  hints = _HintRecorder(spec, batch_size)
+
+  d = np.zeros((batch_size, n))
+  pi = np.tile(np.arange(n), (batch_size, 1))
+  msk = np.zeros((batch_size, n))
+  msk[np.arange(batch_size), s] = 1
+  edges = A != 0
+  active = np.ones(batch_size, dtype=bool)
+  while active.any():
+    hints.push(active, {'pi_h': pi, 'd': d, 'msk': msk})
+    # candidates[b, u, v]: the distance to v through a reached u. The argmin
+    # is the lowest u among the minima, as in `graphs.bellman_ford`.
+    valid = (msk == 1)[:, :, None] & edges
+    candidates = np.where(valid, d[:, :, None] + A, np.inf)
+    best_u = candidates.argmin(1)
+    best = np.take_along_axis(candidates, best_u[:, None], 1)[:, 0]
+    improved = (valid.any(1) & ((msk == 0) | (best < d)) &
+                active[:, None])
+    active &= (improved & (best != d)).any(1)
+    d = np.where(improved, best, d)
+    pi = np.where(improved, best_u, pi)
+    msk[improved] = 1
+
+  hints, lengths = hints.finalize()
+  outputs = _data_points(spec, specs.Stage.OUTPUT, {'pi': np.copy(pi)})
+  return pi, BatchedProbes(inputs, outputs, hints, lengths)
+
+
+def _priority_queue_search(name: str, A: _Array, s: _Array) -> _BatchedOut:
+  """Batched `graphs.dijkstra` or `graphs.mst_prim`, as given by `name`."""
+
+  checks.assert_rank(A, 3)
+  spec = specs.SPECS[name]
+  batch_size, n = A.shape[:2]
+  batch = np.arange(batch_size)
+  s = np.asarray(s)
+  inputs = _graph_inputs(spec, A, s)
+  hints = _HintRecorder(spec, batch_size)
+  d_name = 'key' if name == 'mst_prim' else 'd'
+
+  d = np.zeros((batch_size, n))
+  mark = np.zeros((batch_size, n))
+  in_queue = np.zeros((batch_size, n))
+  pi = np.tile(np.arange(n), (batch_size, 1))
+  in_queue[batch, s] = 1
+  active = np.ones(batch_size, dtype=bool)
+  hints.push(active, {'pi_h': pi, d_name: d, 'mark': mark,
+                      'in_queue': in_queue, 'u': _one_hot(s, n)})
+
+  for _ in range(n):
+    u = _extract_min(d + (1.0 - in_queue) * 1e9)
+    active &= in_queue[batch, u] != 0
+    if not active.any():
+      break
+    mark[batch[active], u[active]] = 1
+    in_queue[batch[active], u[active]] = 0
+    w = A[batch, u]
+    new_d = w if name == 'mst_prim' else d[batch, u][:, None] + w
+    relax = (active[:, None] & (w != 0) & (mark == 0) &
+             ((in_queue == 0) | (new_d < d)))
+    pi = np.where(relax, u[:, None], pi)
+    d = np.where(relax, new_d, d)
+    in_queue[relax] = 1
+    hints.push(active, {'pi_h': pi, d_name: d, 'mark': mark,
+                        'in_queue': in_queue, 'u': _one_hot(u, n)})
+
+  hints, lengths = hints.finalize()
+  outputs = _data_points(spec, specs.Stage.OUTPUT, {'pi': np.copy(pi)})
+  return pi, BatchedProbes(inputs, outputs, hints, lengths)
+
+
+def dijkstra(A: _Array, s: _Array) -> _BatchedOut:
+  """Batched Dijkstra's single-source shortest path (see `graphs.dijkstra`)."""
+  return _priority_queue_search('dijkstra', A, s)
+
+
+def mst_prim(A: _Array, s: _Array) -> _BatchedOut:
+  """Batched Prim's minimum spanning tree (see `graphs.mst_prim`)."""
+  return _priority_queue_search('mst_prim', A, s)
+
+
+def floyd_warshall(A: _Array) -> _BatchedOut:
+  """Batched Floyd-Warshall's all-pairs shortest paths (see `graphs`)."""
+
+  checks.assert_rank(A, 3)
+  spec = specs.SPECS['floyd_warshall']
+  batch_size, n = A.shape[:2]
+  inputs = _graph_inputs(spec, A)
+  hints = _HintRecorder(spec, batch_size)
+
+  D = np.copy(A)
+  Pi = np.zeros((batch_size, n, n))
+  msk = ((A + np.eye(n)) != 0) * 1.0
+  Pi[:] = np.arange(n)[:, None]
+  active = np.ones(batch_size, dtype=bool)
+
+  for k in range(n):
+    hints.push(active, {'Pi_h': Pi, 'D': D, 'msk': msk,
+                        'k': _one_hot(np.full(batch_size, k), n)})
+    via_k = (msk[:, :, k, None] > 0) & (msk[:, None, k, :] > 0)
+    D_via_k = D[:, :, k, None] + D[:, None, k, :]
+    improved = via_k & ((msk == 0) | (D_via_k < D))
+    np.copyto(D, D_via_k, where=improved)
+    np.copyto(Pi, Pi[:, None, k, :], where=improved)
+    msk[via_k] = 1
+
+  hints, lengths = hints.finalize()
+  outputs = _data_points(spec, specs.Stage.OUTPUT, {'Pi': np.copy(Pi)})
+  return Pi, BatchedProbes(inputs, outputs, hints, lengths)
+
+
+# Batched executor of each per-graph algorithm that has one.
+EXECUTORS = {
+    graphs.bfs: bfs,
+    graphs.bellman_ford: bellman_ford,
+    graphs.dijkstra: dijkstra,
+    graphs.mst_prim: mst_prim,
+    graphs.floyd_warshall: floyd_warshall,
+}
@@ -0,0 +1,92 @@
+# Copyright 2021 DeepMind Technologies Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Unit tests for `graphs_batched.py`."""
+# pylint: disable=invalid-name
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from clrs._src.algorithms import graphs
+from clrs._src.algorithms import graphs_batched
+import numpy as np
+import probing
+import specs
+
+
+def _random_graphs(seed, batch_size, n, integer):
+  """Undirected graphs of varied densities, with tied or float weights."""
+  rng = np.random.default_rng(seed)
+  weights = (rng.integers(1, 4, size=(batch_size, n, n)) * 1.0 if integer else
+             rng.uniform(0.1, 1.0, size=(batch_size, n, n)))
+  p = rng.uniform(0.1, 1.0, size=(batch_size, 1, 1))
+  edges = np.triu(rng.random((batch_size, n, n)) < p, 1)
+  edges |= np.swapaxes(edges, 1, 2)
+  weights = np.triu(weights) + np.swapaxes(np.triu(weights, 1), 1, 2)
+  return np.where(edges, weights, 0.), rng.integers(0, n, size=batch_size)
+
+
+def _per_graph_probes(algorithm, *args):
+  """Probes of `algorithm` on each graph, batched as `samplers` does."""
+  samples = []
+  outs = []
+  for sample_args in zip(*args):
+    out, probes = algorithm(*sample_args)
+    outs.append(out)
+    samples.append(probing.split_stages(probes,
+                                        specs.SPECS[algorithm.__name__]))
+  inputs, outputs = (
+      [(dp.name, np.concatenate([sample[stage][i].data for sample in samples]))
+       for i, dp in enumerate(samples[0][stage])]
+      for stage in range(2))
+  lengths = np.array([sample[2][0].data.shape[0] for sample in samples])
+  hints = []
+  for i, dp in enumerate(samples[0][2]):
+    data = np.zeros((lengths.max(), len(samples)) + dp.data.shape[2:])
+    for b, sample in enumerate(samples):
+      data[:lengths[b], b] = sample[2][i].data[:, 0]
+    hints.append((dp.name, data))
+  return np.stack(outs), inputs, outputs, hints, lengths
+
+
+class GraphsBatchedTest(parameterized.TestCase):
+
+  @parameterized.product(
+      name=['bfs', 'bellman_ford', 'dijkstra', 'mst_prim', 'floyd_warshall'],
+      n=[1, 2, 5, 9],
+      integer=[True, False],
+  )
+  def test_executors_match_per_graph_algorithms(self, name, n, integer):
+    A, s = _random_graphs(n, 16, n, integer)
+    algorithm = getattr(graphs, name)
+    args = (A,) if name == 'floyd_warshall' else (A, s)
+    out, probes = graphs_batched.EXECUTORS[algorithm](*args)
+    expected_out, inputs, outputs, hints, lengths = _per_graph_probes(
+        algorithm, *args)
+
+    np.testing.assert_array_equal(probes.lengths, lengths)
+    np.testing.assert_array_equal(out, expected_out)
+    for batched, expected in [(probes.inputs, inputs),
+                              (probes.outputs, outputs),
+                              (probes.hints, hints)]:
+      self.assertEqual([dp.name for dp in batched],
+                       [name for name, _ in expected])
+      for dp, (_, data) in zip(batched, expected):
+        self.assertEqual(dp.data.dtype, data.dtype, dp.name)
+        np.testing.assert_array_equal(dp.data, data, err_msg=dp.name)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -20,6 +20,7 @@ from absl.testing import absltest
 
 from clrs._src.algorithms import graphs
 import numpy as np
+import specs
 
 
 # Unweighted graphs.
@@ -231,5 +232,184 @@ class GraphsTest(absltest.TestCase):
     out_2, _ = graphs.bipartite_matching(BIPARTITE_2, 3, 3, 0, 7)
     np.testing.assert_array_equal(expected_2, out_2)
 
+  def test_csr_graphs_give_identical_probes(self):
+    for algorithm, A, args in [
+        (graphs.dfs, UNDIRECTED, ()),
+        (graphs.bfs, ANOTHER_UNDIRECTED, (0,)),
+        (graphs.mst_prim, WEIGHTED_UNDIRECTED, (0,)),
+        (graphs.bellman_ford, WEIGHTED_DIRECTED, (0,)),
+        (graphs.dijkstra, WEIGHTED_DIRECTED, (0,)),
+    ]:
+      csr = graphs.CSRGraph.fromdense(A)
+      np.testing.assert_array_equal(A, csr.todense())
+      out, probes = algorithm(A, *args)
+      csr_out, csr_probes = algorithm(csr, *args)
+      np.testing.assert_array_equal(out, csr_out)
+      for stage in probes:
+        for loc in probes[stage]:
+          for name in probes[stage][loc]:
+            np.testing.assert_array_equal(
+                probes[stage][loc][name]['data'],
+                csr_probes[stage][loc][name]['data'])
+      # The `A` input probe must not alias a dense graph given by the caller.
+      A_probe = probes[specs.Stage.INPUT][specs.Location.EDGE]['A']['data']
+      self.assertFalse(np.shares_memory(A_probe, A))
+
+
+def _floyd_warshall_hints(A):
+  """Hint trajectories of the element-wise Floyd-Warshall relaxation."""
+  D = np.copy(A)
+  Pi = np.zeros(A.shape)
+  msk = (A + np.eye(A.shape[0]) != 0) * 1.0
+  for i in range(A.shape[0]):
+    Pi[i, :] = i
+  trajectory = []
+  for k in range(A.shape[0]):
+    prev_D = np.copy(D)
+    prev_msk = np.copy(msk)
+    trajectory.append((np.copy(Pi), prev_D, prev_msk))
+    for i in range(A.shape[0]):
+      for j in range(A.shape[0]):
+        if prev_msk[i, k] > 0 and prev_msk[k, j] > 0:
+          if msk[i, j] == 0 or prev_D[i, k] + prev_D[k, j] < D[i, j]:
+            D[i, j] = prev_D[i, k] + prev_D[k, j]
+            Pi[i, j] = Pi[k, j]
+          msk[i, j] = 1
+  return [np.stack(x) for x in zip(*trajectory)], Pi
+
+
+def _bellman_ford_hints(A, s):
+  """Hint trajectories of the element-wise Bellman-Ford relaxation."""
+  d = np.zeros(A.shape[0])
+  pi = np.arange(A.shape[0])
+  msk = np.zeros(A.shape[0])
+  msk[s] = 1
+  trajectory = []
+  while True:
+    prev_d = np.copy(d)
+    prev_msk = np.copy(msk)
+    trajectory.append((np.copy(pi), prev_d, prev_msk))
+    for u in range(A.shape[0]):
+      for v in range(A.shape[0]):
+        if prev_msk[u] == 1 and A[u, v] != 0:
+          if msk[v] == 0 or prev_d[u] + A[u, v] < d[v]:
+            d[v] = prev_d[u] + A[u, v]
+            pi[v] = u
+          msk[v] = 1
+    if np.all(d == prev_d):
+      break
+  return [np.stack(x) for x in zip(*trajectory)], pi
+
+
+def _priority_queue_hints(A, s, prim):
+  """Hint trajectories of element-wise Dijkstra, or Prim if `prim`."""
+  d = np.zeros(A.shape[0])
+  mark = np.zeros(A.shape[0])
+  in_queue = np.zeros(A.shape[0])
+  pi = np.arange(A.shape[0])
+  in_queue[s] = 1
+  trajectory = [(np.copy(pi), np.copy(d), np.copy(mark), np.copy(in_queue), s)]
+  for _ in range(A.shape[0]):
+    u = np.argsort(d + (1.0 - in_queue) * 1e9)[0]
+    if in_queue[u] == 0:
+      break
+    mark[u] = 1
+    in_queue[u] = 0
+    for v in range(A.shape[0]):
+      if A[u, v] != 0:
+        new_d = A[u, v] if prim else d[u] + A[u, v]
+        if mark[v] == 0 and (in_queue[v] == 0 or new_d < d[v]):
+          pi[v] = u
+          d[v] = new_d
+          in_queue[v] = 1
+    trajectory.append(
+        (np.copy(pi), np.copy(d), np.copy(mark), np.copy(in_queue), u))
+  return [np.stack(x) for x in zip(*trajectory)], pi
+
+
+def _bfs_hints(A, s):
+  """Hint trajectories of the element-wise breadth-first search."""
+  reach = np.zeros(A.shape[0])
+  pi = np.arange(A.shape[0])
+  reach[s] = 1
+  trajectory = []
+  while True:
+    prev_reach = np.copy(reach)
+    trajectory.append((prev_reach, np.copy(pi)))
+    for i in range(A.shape[0]):
+      for j in range(A.shape[0]):
+        if prev_reach[i] == 1 and A[i, j] > 0:
+          if pi[j] == j and j != s:
+            pi[j] = i
+          reach[j] = 1
+    if np.all(reach == prev_reach):
+      break
+  return [np.stack(x) for x in zip(*trajectory)], pi
+
+
+def _random_weighted_graphs(seed):
+  """Sparse to dense random graphs, with tied integer or float weights."""
+  rng = np.random.default_rng(seed)
+  for n in [1, 2, 5, 8, 13]:
+    for p in [0.1, 0.3, 0.7, 1.0]:
+      for integer in [True, False]:
+        weights = (rng.integers(1, 4, size=(n, n)) if integer else
+                   rng.uniform(0.1, 1.0, size=(n, n)))
+        yield n, np.where(rng.random((n, n)) < p, weights, 0.)
+
+
+class VectorizedGraphsTest(absltest.TestCase):
+
+  def test_floyd_warshall_matches_elementwise(self):
+    for n, A in [*_random_weighted_graphs(0), (5, WEIGHTED_DIRECTED),
+                 (5, WEIGHTED_UNDIRECTED)]:
+      (Pi_h, D, msk), Pi = _floyd_warshall_hints(A)
+      out, probes = graphs.floyd_warshall(A)
+      hints = probes['hint']
+      np.testing.assert_array_equal(out, Pi, err_msg=f'{n}')
+      np.testing.assert_array_equal(hints['edge']['Pi_h']['data'], Pi_h)
+      np.testing.assert_array_equal(hints['edge']['D']['data'], D)
+      np.testing.assert_array_equal(hints['edge']['msk']['data'], msk)
+
+  def test_bellman_ford_matches_elementwise(self):
+    for n, A in [*_random_weighted_graphs(1), (5, WEIGHTED_DIRECTED),
+                 (5, WEIGHTED_UNDIRECTED)]:
+      (pi_h, d, msk), pi = _bellman_ford_hints(A, n - 1)
+      for graph in [A, graphs.CSRGraph.fromdense(A)]:
+        out, probes = graphs.bellman_ford(graph, n - 1)
+        hints = probes['hint']['node']
+        np.testing.assert_array_equal(out, pi, err_msg=f'{n}')
+        np.testing.assert_array_equal(hints['pi_h']['data'], pi_h)
+        np.testing.assert_array_equal(hints['d']['data'], d)
+        np.testing.assert_array_equal(hints['msk']['data'], msk)
+
+  def test_dijkstra_and_prim_match_elementwise(self):
+    for n, A in [*_random_weighted_graphs(2), (5, WEIGHTED_DIRECTED),
+                 (5, WEIGHTED_UNDIRECTED)]:
+      for algorithm, d_name, prim in [(graphs.dijkstra, 'd', False),
+                                      (graphs.mst_prim, 'key', True)]:
+        (pi_h, d, mark, in_queue, u), pi = _priority_queue_hints(A, 0, prim)
+        for graph in [A, graphs.CSRGraph.fromdense(A)]:
+          out, probes = algorithm(graph, 0)
+          hints = probes['hint']['node']
+          np.testing.assert_array_equal(out, pi, err_msg=f'{n}')
+          np.testing.assert_array_equal(hints['pi_h']['data'], pi_h)
+          np.testing.assert_array_equal(hints[d_name]['data'], d)
+          np.testing.assert_array_equal(hints['mark']['data'], mark)
+          np.testing.assert_array_equal(hints['in_queue']['data'], in_queue)
+          np.testing.assert_array_equal(hints['u']['data'].argmax(-1), u)
+
+  def test_bfs_matches_elementwise(self):
+    for n, A in [*_random_weighted_graphs(3), (5, UNDIRECTED), (6, DIRECTED)]:
+      for s in {0, n - 1}:
+        (reach_h, pi_h), pi = _bfs_hints(A, s)
+        for graph in [A, graphs.CSRGraph.fromdense(A)]:
+          out, probes = graphs.bfs(graph, s)
+          hints = probes['hint']['node']
+          np.testing.assert_array_equal(out, pi, err_msg=f'{n}')
+          np.testing.assert_array_equal(hints['reach_h']['data'], reach_h)
+          np.testing.assert_array_equal(hints['pi_h']['data'], pi_h)
+
+
 if __name__ == "__main__":
   absltest.main()
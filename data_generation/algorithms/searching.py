@@ -28,11 +28,12 @@ See "Introduction to Algorithms" 3ed (CLRS3) for more information.
 
 from typing import Tuple, Union
 
-import chex
 import probing
 import specs
 import numpy as np
 
+from . import checks
+
 
 _Array = np.ndarray
 _Numeric = Union[int, float]
@@ -42,7 +43,7 @@ _Out = Tuple[int, probing.ProbesDict]
 def minimum(A: _Array) -> _Out:
   """Minimum."""
 
-  chex.assert_rank(A, 1)
+  checks.assert_rank(A, 1)
   probes = probing.initialize(specs.SPECS['minimum'])
 
   A_pos = np.arange(A.shape[0])
@@ -91,7 +92,7 @@ def minimum(A: _Array) -> _Out:
 def binary_search(x: _Numeric, A: _Array) -> _Out:
   """Binary search."""
 
-  chex.assert_rank(A, 1)
+  checks.assert_rank(A, 1)
   probes = probing.initialize(specs.SPECS['binary_search'])
 
   T_pos = np.arange(A.shape[0])
@@ -154,7 +155,7 @@ def quickselect(
 ) -> _Out:
   """Quickselect (Hoare, 1961)."""
 
-  chex.assert_rank(A, 1)
+  checks.assert_rank(A, 1)
 
   def partition(A, A_pos, p, r, target, probes):
     x = A[r]
@@ -1,15 +1,116 @@
 import os
+import hashlib
+import pickle
 import samplers as smp
 import numpy as np
 from collections import deque
 import json
 import dill
 import data_utils
-from datasets import Dataset, DatasetDict
+
+# Number of trajectories drawn at once from a sharded sampler (see `--num_workers`).
+SAMPLER_CHUNK_SIZE = 1000
+# Number of trajectories per sampler whose probes are checked with `--validation sampled`.
+VALIDATION_SAMPLES = 100
+# Hint probes read by `translate_hints` for each algorithm.
+TRANSLATED_HINTS = {
+    "bfs": ["reach_h", "pi_h"],
+    "dfs": ["pi_h", "color", "s"],
+    "floyd_warshall": ["D"],
+    "dijkstra": ["d", "mark", "in_queue", "u"],
+    "mst_prim": ["key", "pi_h", "mark", "in_queue", "u"],
+    "bellman_ford": ["d", "pi_h", "msk"],
+}
        
 def _iterate_sampler(sampler, batch_size):
-        while True:
-            yield sampler.next(batch_size)
+        try:
+            while True:
+                yield sampler.next(batch_size)
+        finally:
+            sampler.close()
+
+def _slice_feedback(feedback, idx):
+    ''' Returns the `idx`-th trajectory of a batch as a batch of one. '''
+    features = feedback.features
+    inputs = [dp.with_data(dp.data[idx:idx + 1]) for dp in features.inputs]
+    hints = [dp.with_data(dp.data[:, idx:idx + 1]) for dp in features.hints]
+    outputs = [dp.with_data(dp.data[idx:idx + 1]) for dp in feedback.outputs]
+    return smp.Feedback(smp.Features(inputs, hints, features.lengths[idx:idx + 1]), outputs)
+
+def _iterate_chunks(chunks, sampler):
+    ''' Yields the trajectories of each chunk (a batch of trajectories) one at a time.
+        Closing it stops `chunks` and then the sampler's worker pool. '''
+    try:
+        for chunk in chunks:
+            for idx in range(len(chunk.features.lengths)):
+                yield _slice_feedback(chunk, idx)
+    finally:
+        chunks.close()
+        sampler.close()
+
+def _build_sampler_iterator(args, graph_size):
+    ''' Iterator over single trajectories. A sharded sampler (`--num_workers`) is asked for
+        `SAMPLER_CHUNK_SIZE` trajectories at a time, so that it can spread them over its workers,
+        and so is a sampler with `--batched_executors`, so that it can unroll them together.
+        With `--prefetch_depth`, batches are sampled ahead in a background worker; the sharded
+        sampler's pool cannot be started from a worker process, so it is prefetched in a thread.
+        Hints are padded to the sampler's `max_steps` whatever the chunk: the dijkstra, mst_prim
+        and bellman_ford translators emit their termination line from the first padding step. '''
+    data_smp, spec = smp.build_sampler(args.algorithm, num_samples=-1, length=graph_size, seed=args.seed,
+                                       num_workers=args.num_workers,
+                                       validation=args.validation, validation_samples=VALIDATION_SAMPLES,
+                                       hints=TRANSLATED_HINTS[args.algorithm] if args.translated_hints_only else None,
+                                       batched=args.batched_executors, delta_hints=args.delta_hints,
+                                       pad_to_max_steps=True)
+    chunked = args.num_workers is not None or args.batched_executors
+    batch_size = SAMPLER_CHUNK_SIZE if chunked else 1
+    if args.prefetch_depth > 0:
+        batches = smp.PrefetchIterator(data_smp, batch_size, depth=args.prefetch_depth,
+                                       use_process=args.num_workers is None)
+    else:
+        batches = _iterate_sampler(data_smp, batch_size)
+    if not chunked:
+        return batches
+    return _iterate_chunks(batches, data_smp)
+
+def _trajectory_cache_path(args, graph_size, split_sizes):
+    ''' Cache file of the trajectories sampled for one graph size, keyed by a hash of everything that
+        determines them: the algorithm, graph size, seed, split sizes, sampling options and sampling code. '''
+    config = (args.algorithm, graph_size, args.seed, tuple(split_sizes), args.num_workers is None,
+              args.batched_executors, args.translated_hints_only, args.validation)
+    digest = hashlib.sha256((smp.source_version(args.algorithm) + repr(config)).encode()).hexdigest()
+    return os.path.join(args.cache_dir, f"{args.algorithm}_{graph_size}_{digest}.pkl")
+
+def _cached_sampler_iterator(args, graph_size, split_sizes):
+    ''' Like `_build_sampler_iterator`, but with `--cache_dir` the trajectories are first replayed from the
+        graph size's cache file. Past its end, the sampler is built, skips the cached trajectories and
+        continues; the file is then rewritten with every trajectory drawn when the iterator is closed. '''
+    if args.cache_dir is None:
+        yield from _build_sampler_iterator(args, graph_size)
+        return
+    path = _trajectory_cache_path(args, graph_size, split_sizes)
+    cached = []
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            cached = pickle.load(f)
+    yield from cached
+
+    sampled = list(cached)
+    samples = _build_sampler_iterator(args, graph_size)
+    try:
+        for _ in cached:
+            next(samples)
+        for sample in samples:
+            sampled.append(sample)
+            yield sample
+    finally:
+        samples.close()
+        if len(sampled) > len(cached):
+            os.makedirs(args.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(sampled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
             
 def _preprocess_hint_matrix(alg, matrix_h):
     ''' For graph-based approaches (ex. BFS), the hint matrices are actually 2D lists.
@@ -358,12 +459,14 @@ def _datapoints_list_to_dict(dp_list):
     return dp_dict
 
 def _write_data(output_formats, clrs_data_dir, dict_llm_data_dir, clrs_training_data, clrs_validation_data, clrs_testing_data, trans_training_data, trans_validation_data, trans_testing_data):
+    # Imported here rather than at the top, as sampler worker processes re-import this module.
+    from datasets import Dataset, DatasetDict
     
     #Writing CLRS data
     
-    data_utils.write_clrs_format(os.path.join(clrs_data_dir, "training" + ".pkl"), clrs_training_data)
-    data_utils.write_clrs_format(os.path.join(clrs_data_dir, "validation" + ".pkl"), clrs_validation_data)
-    data_utils.write_clrs_format(os.path.join(clrs_data_dir, "testing" + ".pkl"), clrs_testing_data)
+    data_utils.write_clrs_format(os.path.join(clrs_data_dir, "training"), clrs_training_data)
+    data_utils.write_clrs_format(os.path.join(clrs_data_dir, "validation"), clrs_validation_data)
+    data_utils.write_clrs_format(os.path.join(clrs_data_dir, "testing"), clrs_testing_data)
     
     #Writing LMM data
     for output_format in output_formats:
@@ -497,9 +600,7 @@ def sample_data(args):
         training_instances = data_utils.TRAIN_TEST_SPLIT[graph_size][0] if graph_size in data_utils.TRAIN_TEST_SPLIT else args.train_test_split[0]
         evaluation_instances = data_utils.TRAIN_TEST_SPLIT[graph_size][1] if graph_size in data_utils.TRAIN_TEST_SPLIT else args.train_test_split[1]
         
-        data_smp, spec = smp.build_sampler(args.algorithm, num_samples=-1, length=graph_size, seed=args.seed)
-    
-        data_smp_iter = _iterate_sampler(data_smp, batch_size=1)
+        data_smp_iter = _cached_sampler_iterator(args, graph_size, (training_instances, evaluation_instances))
         
         valid_train_idx = 0
         valid_eval_idx = 0
@@ -568,6 +669,7 @@ def sample_data(args):
             
             unique_graphs.add(edgelist_hash)
             valid_eval_idx += 1
+        data_smp_iter.close()
         print(f"Sampling complete for graph size: {graph_size}")
         
         _write_data(args.output_formats, clrs_data_dir, dict_llm_data_dir, clrs_training_data, clrs_validation_data, clrs_testing_data, trans_training_data, trans_validation_data, trans_testing_data)
@@ -599,8 +701,7 @@ def debug_sample_data(args, debug_mode=True):
             training_instances = debug_training_instances
             evaluation_instances = debug_evaluation_instances
         
-        data_smp, spec = smp.build_sampler(args.algorithm, num_samples=-1, length=graph_size, seed=args.seed)
-        data_smp_iter = _iterate_sampler(data_smp, batch_size=1)
+        data_smp_iter = _build_sampler_iterator(args, graph_size)
         
         valid_train_idx = 0
         valid_eval_idx = 0
@@ -675,6 +776,7 @@ def debug_sample_data(args, debug_mode=True):
             
             unique_graphs.add(edgelist_hash)
             valid_eval_idx += 1
+        data_smp_iter.close()
         print(f"Sampling complete for graph size: {graph_size}")
         
         _write_data(args.output_formats, clrs_data_dir, dict_llm_data_dir, clrs_training_data, clrs_validation_data, clrs_testing_data, trans_training_data, trans_validation_data, trans_testing_data)
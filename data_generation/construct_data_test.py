@@ -0,0 +1,91 @@
+"""Unit tests for the sampling and hint translation of `construct_data.py`."""
+
+import argparse
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+import numpy as np
+import construct_data
+
+TERMINATION_LINES = {
+    "dijkstra": "Queue is empty.",
+    "mst_prim": "Queue is empty.",
+    "bellman_ford": "No more edges to relax.",
+}
+
+
+def _args(algorithm, **kwargs):
+    args = dict(algorithm=algorithm, seed=3, num_workers=None, cache_dir=None, validation="off",
+                translated_hints_only=False, batched_executors=False, delta_hints=False, prefetch_depth=0)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+class TranslateHintsTest(parameterized.TestCase):
+
+    @parameterized.product(algorithm=list(TERMINATION_LINES), batched_executors=[False, True])
+    def test_short_trajectories_terminate(self, algorithm, batched_executors):
+        graph_size = 8
+        samples = construct_data._build_sampler_iterator(_args(algorithm, batched_executors=batched_executors),
+                                                         graph_size)
+        num_short = 0
+        for _ in range(20):
+            sample = next(samples)
+            # A trajectory that is shorter than the longest possible one, n (+ 1 for dijkstra and prim).
+            if sample.features.lengths[0] >= graph_size:
+                continue
+            num_short += 1
+            inputs = construct_data._translate_inputs(algorithm, sample.features.inputs)
+            hints, _ = construct_data.translate_hints(algorithm, True, set(inputs[1]), sample.features.hints,
+                                                      source=inputs[2])
+            self.assertIn(TERMINATION_LINES[algorithm], hints[-1])
+        samples.close()
+        self.assertGreater(num_short, 0)
+
+
+
+class TrajectoryCacheTest(absltest.TestCase):
+
+    def _stream(self, args, num_samples):
+        samples = construct_data._cached_sampler_iterator(args, 6, (3, 2))
+        stream = [next(samples) for _ in range(num_samples)]
+        samples.close()
+        return stream
+
+    def _assert_same_stream(self, expected, actual):
+        self.assertEqual(len(actual), len(expected))
+        for x, y in zip(expected, actual):
+            for dp, other in zip(x.features.inputs + x.features.hints + x.outputs,
+                                 y.features.inputs + y.features.hints + y.outputs):
+                np.testing.assert_array_equal(dp.data, other.data)
+
+    def test_replays_and_extends_the_cached_stream(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        expected = self._stream(_args("dijkstra"), 12)
+
+        self._assert_same_stream(expected[:5], self._stream(_args("dijkstra", cache_dir=cache_dir), 5))
+        self.assertLen(os.listdir(cache_dir), 1)
+        with mock.patch.object(construct_data, "_build_sampler_iterator",
+                               side_effect=AssertionError("Trajectories should come from the cache.")):
+            self._assert_same_stream(expected[:5], self._stream(_args("dijkstra", cache_dir=cache_dir), 5))
+        # Past the cached trajectories, sampling resumes where the cache stopped.
+        self._assert_same_stream(expected, self._stream(_args("dijkstra", cache_dir=cache_dir), 12))
+        self._assert_same_stream(expected, self._stream(_args("dijkstra", cache_dir=cache_dir), 12))
+        self.assertLen(os.listdir(cache_dir), 1)
+
+    def test_key_covers_validation(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self._stream(_args("dijkstra", cache_dir=cache_dir, validation="off"), 2)
+        self._stream(_args("dijkstra", cache_dir=cache_dir, validation="full"), 2)
+        self.assertLen(os.listdir(cache_dir), 2)
+
+
+if __name__ == "__main__":
+    absltest.main()
@@ -3,6 +3,9 @@ import os
 import json
 import dill
 import yaml
+import numpy as np
+import probing
+import samplers as smp
 
 OUTPUT_FORMATS = ["chat", "chat_mistral", "chat_gpt"] #["chat_rerun_ralpha_8", "chat_rerun_ralpha_32"]#["chat", "chat_mistral", "chat_gpt"]
 # REASONING_STRATEGIES = ["IO_no_chat"]#, "IO", "Int_Steps"]
@@ -89,8 +92,97 @@ def write_json(outfile, data):
 def write_pickle(outfile, data):
     dill.dump(data, open(outfile, 'wb'))
 
-def write_clrs_format(outfile, data):
-    write_pickle(outfile, data)
+CLRS_SECTIONS = ["inputs", "outputs", "hints"]
+CLRS_INDEX_FILE = "index.json"
+
+def _clrs_section(feedback, section):
+    if section == "outputs":
+        return feedback.outputs
+    return getattr(feedback.features, section)
+
+def _compact_fields(dp):
+    ''' The fields a `CompactDataPoint` adds to a `DataPoint`, or None for a plain one. '''
+    if isinstance(dp, probing.CompactDataPoint):
+        return {"num_classes": int(dp.num_classes), "dtype": str(dp.dtype)}
+    return None
+
+def write_clrs_format(outdir, data):
+    ''' Writes a dict of CLRS `Feedback`s (one trajectory each) as a columnar store: one .npy file per
+        probe holding the data of every sample concatenated along the leading axis, plus per-section
+        offsets locating each sample. The files can be read lazily with `read_clrs_probe`, or
+        loaded back into `Feedback`s with `load_clrs_format`. Compact probes (see `probing.compact`)
+        stay compact if all samples were compacted alike, and are expanded otherwise. '''
+    os.makedirs(outdir, exist_ok=True)
+    keys = list(data)
+    feedbacks = [data[key] for key in keys]
+    index = {"keys": keys, "probes": {section: [] for section in CLRS_SECTIONS}}
+
+    for section in CLRS_SECTIONS:
+        if not feedbacks:
+            break
+        offsets = np.zeros(len(feedbacks) + 1, dtype=np.int64)
+        for i, dp in enumerate(_clrs_section(feedbacks[0], section)):
+            dps = [_clrs_section(feedback, section)[i] for feedback in feedbacks]
+            compact_fields = _compact_fields(dp)
+            if any(_compact_fields(sample_dp) != compact_fields for sample_dp in dps):
+                dps = [probing.expand(sample_dp) for sample_dp in dps]
+                compact_fields = None
+            arrays = [sample_dp.data for sample_dp in dps]
+            np.cumsum([array.shape[0] for array in arrays], out=offsets[1:])
+            filename = f"{section}_{i}.npy"
+            np.save(os.path.join(outdir, filename), np.concatenate(arrays))
+            probe = {"name": dp.name, "location": dp.location, "type_": dp.type_, "file": filename}
+            if compact_fields is not None:
+                probe["compact"] = compact_fields
+            index["probes"][section].append(probe)
+        np.save(os.path.join(outdir, f"{section}_offsets.npy"), offsets)
+
+    if feedbacks:
+        np.save(os.path.join(outdir, "lengths.npy"), np.concatenate([feedback.features.lengths for feedback in feedbacks]))
+    write_json(os.path.join(outdir, CLRS_INDEX_FILE), index)
+
+def _load_clrs_index(path):
+    return load_json(os.path.join(path, CLRS_INDEX_FILE))
+
+def read_clrs_probe(path, section, name, start=0, stop=None):
+    ''' Memory-maps the `section` probe `name` of samples [start, stop) without loading the rest of the store.
+        Returns the concatenated data of those samples and their offsets into it. '''
+    index = _load_clrs_index(path)
+    probe, = [probe for probe in index["probes"][section] if probe["name"] == name]
+    offsets = np.load(os.path.join(path, f"{section}_offsets.npy"))
+    stop = len(index["keys"]) if stop is None else stop
+    data = np.load(os.path.join(path, probe["file"]), mmap_mode="r")
+    return data[offsets[start]:offsets[stop]], offsets[start:stop + 1] - offsets[start]
+
+def load_clrs_format(path, mmap_mode=None):
+    ''' Inverse of `write_clrs_format`; also reads the legacy dill pickles. With `mmap_mode="r"`, the
+        `DataPoint`s hold read-only views into the memory-mapped files. '''
+    if os.path.isfile(path):
+        return dill.load(open(path, 'rb'))
+
+    index = _load_clrs_index(path)
+    keys = index["keys"]
+    sections = {}
+    for section in CLRS_SECTIONS:
+        offsets = np.load(os.path.join(path, f"{section}_offsets.npy")) if keys else None
+        probes = []
+        for probe in index["probes"][section]:
+            data = np.load(os.path.join(path, probe["file"]), mmap_mode=mmap_mode)
+            probes.append((probe, data))
+        sections[section] = [
+            [probing.CompactDataPoint(probe["name"], probe["location"], probe["type_"],
+                                      data[offsets[i]:offsets[i + 1]], **probe["compact"])
+             if "compact" in probe else
+             probing.DataPoint(probe["name"], probe["location"], probe["type_"], data[offsets[i]:offsets[i + 1]])
+             for probe, data in probes]
+            for i in range(len(keys))]
+    lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode=mmap_mode) if keys else None
+
+    data = {}
+    for i, key in enumerate(keys):
+        features = smp.Features(sections["inputs"][i], sections["hints"][i], lengths[i:i + 1])
+        data[key] = smp.Feedback(features, sections["outputs"][i])
+    return data
     
 def write_data_config_readme(outfile):
     dump_yml(outfile, YML_OUTFILE)
@@ -244,6 +336,13 @@ def parse_args():
     parser.add_argument("-num_samples", "--num_samples", type=int, default=-1, help="Number of data samples to generate.")
     parser.add_argument("-neg_edges", "--neg_edges", type=bool, default=True, help="Include negative edges, ex. '0 is not reachable from 1'.")
     parser.add_argument("-seed", "--seed", type=int, default=100898, help="Random seed used in constructing the CLRS sampler; the default is 10081998.")
+    parser.add_argument("-num_workers", "--num_workers", type=int, default=None, help="If set, CLRS trajectories are sampled in shards over this many processes. Results only depend on the seed, not on the number of workers.")
+    parser.add_argument("-prefetch_depth", "--prefetch_depth", type=int, default=2, help="Number of CLRS batches sampled ahead in a background worker, overlapping sampling with translation. 0 samples synchronously. Results do not depend on it.")
+    parser.add_argument("-validation", "--validation", type=str, default="sampled", choices=["off", "sampled", "full"], help="Checks of the CLRS probe data: none, only the first trajectories of each sampler, or all of them.")
+    parser.add_argument("-translated_hints_only", "--translated_hints_only", action="store_true", help="Only record the CLRS hints used by the LLM translation. The others are then also missing from the CLRS-format output.")
+    parser.add_argument("-batched_executors", "--batched_executors", action="store_true", help="Unroll the CLRS algorithms that have a batched executor (bfs, bellman_ford, dijkstra, mst_prim, floyd_warshall) on chunks of graphs at once. The graphs are then sampled in chunks too, so the dataset differs from the default one (but not between runs).")
+    parser.add_argument("-delta_hints", "--delta_hints", action="store_true", help="Record CLRS hints as sparse per-step updates until trajectories are batched. Lowers peak memory when trajectories are sampled in chunks (--num_workers); the data is unchanged.")
+    parser.add_argument("-cache_dir", "--cache_dir", type=str, default=None, help="If set, the CLRS trajectories sampled for each graph size are cached in this directory, one file per graph size, and replayed when the algorithm, graph size, seed, split sizes, sampling options and sampling code are unchanged.")
     # parser.add_argument("-output_dir", "--output_dir", type=str, default="/local/ataylor2/algorithmic_reasoning", help="Output directory. Will create folders named after the algorithm for which data is generated.")
     parser.add_argument("-output_dir", "--output_dir", type=str, default="C:/Users/wangb/OneDrive/Desktop/wbc2048_llm_algorithmic_reasoning/data_generation", help="Output directory. Will create folders named after the algorithm for which data is generated.")
     parser.add_argument("-train_test_split", "--train_test_split", type=list, default=[1000,250], help="Training/Testing split ratios. The Test set will be equally split into Validation and Test.")
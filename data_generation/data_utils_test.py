@@ -0,0 +1,98 @@
+"""Unit tests for the CLRS columnar store of `data_utils.py`."""
+
+import os
+import shutil
+import tempfile
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+import numpy as np
+import data_utils
+import probing
+import samplers
+
+
+def _sample_data(num_samples, **kwargs):
+    ''' Trajectories keyed like construct_data's, sampled one at a time so that their lengths differ. '''
+    sampler, _ = samplers.build_sampler("bfs", num_samples=-1, length=6, seed=4, **kwargs)
+    return {idx: sampler.next(1) for idx in range(num_samples)}
+
+
+def _trajectory(feedback):
+    return feedback.features.inputs + feedback.outputs + feedback.features.hints
+
+
+class ClrsFormatTest(parameterized.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._dir)
+
+    def _assert_same_data(self, expected, loaded):
+        self.assertEqual(list(loaded), list(expected))
+        for key in expected:
+            np.testing.assert_array_equal(loaded[key].features.lengths, expected[key].features.lengths)
+            self.assertEqual(loaded[key].features.lengths.dtype, expected[key].features.lengths.dtype)
+            for x, y in zip(_trajectory(expected[key]), _trajectory(loaded[key]), strict=True):
+                self.assertIs(type(y), type(x))
+                self.assertEqual((y.name, y.location, y.type_), (x.name, x.location, x.type_))
+                self.assertEqual(y.data.dtype, x.data.dtype, x.name)
+                self.assertEqual(y.data.shape, x.data.shape, x.name)
+                np.testing.assert_array_equal(y.data, x.data, err_msg=x.name)
+
+    @parameterized.parameters(None, "r")
+    def test_round_trip(self, mmap_mode):
+        data = _sample_data(5)
+        self.assertGreater(len({feedback.features.lengths[0] for feedback in data.values()}), 1)
+        path = os.path.join(self._dir, "training")
+        data_utils.write_clrs_format(path, data)
+        loaded = data_utils.load_clrs_format(path, mmap_mode=mmap_mode)
+        self._assert_same_data(data, loaded)
+        if mmap_mode == "r":
+            self.assertFalse(loaded[0].features.hints[0].data.flags.writeable)
+
+    def test_read_probe(self):
+        data = _sample_data(5)
+        path = os.path.join(self._dir, "training")
+        data_utils.write_clrs_format(path, data)
+        probe, offsets = data_utils.read_clrs_probe(path, "hints", "pi_h", start=1, stop=4)
+        expected = [data[idx].features.hints[1].data for idx in range(1, 4)]
+        np.testing.assert_array_equal(probe, np.concatenate(expected))
+        np.testing.assert_array_equal(offsets, np.cumsum([0] + [hint.shape[0] for hint in expected]))
+
+    def test_compact_round_trip(self):
+        data = _sample_data(4, compact=True)
+        self.assertTrue(any(isinstance(dp, probing.CompactDataPoint) for dp in _trajectory(data[0])))
+        path = os.path.join(self._dir, "training")
+        data_utils.write_clrs_format(path, data)
+        loaded = data_utils.load_clrs_format(path)
+        self._assert_same_data(data, loaded)
+        for key in data:
+            for x, y in zip(_trajectory(data[key]), _trajectory(loaded[key])):
+                if isinstance(x, probing.CompactDataPoint):
+                    self.assertEqual((y.num_classes, y.dtype), (x.num_classes, x.dtype))
+                np.testing.assert_array_equal(probing.expand(y).data, probing.expand(x).data)
+
+    def test_mixed_compaction_is_expanded(self):
+        data = _sample_data(3)
+        compacted = _sample_data(3, compact=True)
+        data[1] = compacted[1]
+        path = os.path.join(self._dir, "training")
+        data_utils.write_clrs_format(path, data)
+        loaded = data_utils.load_clrs_format(path)
+        for key in data:
+            for x, y in zip(_trajectory(data[key]), _trajectory(loaded[key])):
+                self.assertNotIsInstance(y, probing.CompactDataPoint)
+                np.testing.assert_array_equal(y.data, probing.expand(x).data)
+
+    def test_legacy_pickle(self):
+        data = _sample_data(3)
+        path = os.path.join(self._dir, "training.pkl")
+        data_utils.write_pickle(path, data)
+        self._assert_same_data(data, data_utils.load_clrs_format(path))
+
+
+if __name__ == "__main__":
+    absltest.main()
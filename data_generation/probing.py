@@ -21,17 +21,22 @@ The dataflow for an algorithm is represented by `(stage, loc, type, data)`
 When constructing probes, it is convenient to represent these fields in a nested
 format (`ProbesDict`) to facilate efficient contest-based look-up.
 
+JAX and TensorFlow are optional and never imported here: `DataPoint`s are
+registered as JAX pytrees if JAX is already imported (else call
+`register_pytree`), and `predecessor_to_cyclic_predecessor_and_first` only
+uses JAX if it is already imported with an accelerator backend.
+
 """
 
+import contextlib
 import functools
-from typing import Dict, List, Tuple, Union
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-import attr
 import specs
-import jax
-import jax.numpy as jnp
 import numpy as np
-import tensorflow as tf
 
 
 _Location = specs.Location
@@ -40,7 +45,7 @@ _Type = specs.Type
 _OutputClass = specs.OutputClass
 
 _Array = np.ndarray
-_Data = Union[_Array, List[_Array]]
+_Data = Union[_Array, 'ProbeBuffer']
 _DataOrType = Union[_Data, str]
 
 ProbesDict = Dict[
@@ -48,7 +53,8 @@ ProbesDict = Dict[
 
 
 def _convert_to_str(element):
-  if isinstance(element, tf.Tensor):
+  tf = sys.modules.get('tensorflow')  # A TF tensor implies TF was imported.
+  if tf is not None and isinstance(element, tf.Tensor):
     return element.numpy().decode('utf-8')
   elif isinstance(element, (np.ndarray, bytes)):
     return element.decode('utf-8')
@@ -56,63 +62,528 @@ def _convert_to_str(element):
     return element
 
 
-# First anotation makes this object jax.jit/pmap friendly, second one makes this
-# tf.data.Datasets friendly.
-@jax.tree_util.register_pytree_node_class
-@attr.define
+# Registering as a pytree (see `register_pytree`) makes this object
+# jax.jit/pmap friendly.
 class DataPoint:
-  """Describes a data point."""
+  """Describes a data point.
 
-  _name: str
-  _location: str
-  _type_: str
-  data: _Array
+  Metadata strings are converted (from bytes or TF tensors) and interned once at
+  construction, so reading `name`, `location` and `type_` is a plain attribute
+  access.
+  """
 
-  @property
-  def name(self):
-    return _convert_to_str(self._name)
+  __slots__ = ('name', 'location', 'type_', 'data')
 
-  @property
-  def location(self):
-    return _convert_to_str(self._location)
-
-  @property
-  def type_(self):
-    return _convert_to_str(self._type_)
+  def __init__(self, name: str, location: str, type_: str, data: _Array):
+    self.name = sys.intern(_convert_to_str(name))
+    self.location = sys.intern(_convert_to_str(location))
+    self.type_ = sys.intern(_convert_to_str(type_))
+    self.data = data
 
   def __repr__(self):
     s = f'DataPoint(name="{self.name}",\tlocation={self.location},\t'
     return s + f'type={self.type_},\tdata=Array{self.data.shape})'
 
+  def _fields(self) -> Tuple:
+    return (self.name, self.location, self.type_, self.data)
+
+  def __getstate__(self):
+    return self._fields()
+
+  def __setstate__(self, state):
+    # Pickles of the former `attr.define` class hold either the field tuple or
+    # a dict keyed by the private attribute names (`_name`, ...).
+    if isinstance(state, dict):
+      state = [state[k] for k in ('_name', '_location', '_type_', 'data',
+                                  'num_classes', 'dtype') if k in state]
+    self.__init__(*state)
+
   def tree_flatten(self):
     data = (self.data,)
-    meta = (self.name, self.location, self.type_)
+    meta = self._fields()[:3]
     return data, meta
 
   @classmethod
   def tree_unflatten(cls, meta, data):
-    name, location, type_ = meta
     subdata, = data
-    return DataPoint(name, location, type_, subdata)
+    return cls(*meta[:3], subdata, *meta[3:])
+
+  def with_data(self, data: _Array) -> 'DataPoint':
+    """Copy of this data point (of the same class) holding `data`."""
+    return type(self)(*self._fields()[:3], data, *self._fields()[4:])
+
+
+class CompactDataPoint(DataPoint):
+  """A `DataPoint` whose data is stored in a compact dtype (see `compact`).
+
+  If `num_classes` is positive, the one-hot last axis of the data (of that
+  size) has been replaced by the index of the hot class, or -1 for an all-zero
+  row. Otherwise the data has only been cast. `dtype` is the original dtype,
+  restored by `expand`.
+  """
+
+  __slots__ = ('num_classes', 'dtype')
+
+  def __init__(self, name: str, location: str, type_: str, data: _Array,
+               num_classes: int = 0, dtype: str = 'float64'):
+    super().__init__(name, location, type_, data)
+    self.num_classes = num_classes
+    self.dtype = dtype
+
+  def _fields(self) -> Tuple:
+    return super()._fields() + (self.num_classes, self.dtype)
+
+  def tree_flatten(self):
+    fields = self._fields()
+    return (self.data,), fields[:3] + fields[4:]
+
+
+@functools.lru_cache(maxsize=None)
+def register_pytree() -> None:
+  """Registers `DataPoint` classes as JAX pytrees; imports JAX."""
+  import jax  # pylint: disable=g-import-not-at-top
+  jax.tree_util.register_pytree_node_class(DataPoint)
+  jax.tree_util.register_pytree_node_class(CompactDataPoint)
+
+
+if 'jax' in sys.modules:
+  register_pytree()
+
+
+def _index_dtype(max_value: int) -> np.dtype:
+  return np.dtype(np.int16 if max_value < np.iinfo(np.int16).max else np.int32)
+
+
+def compact(dp: DataPoint) -> DataPoint:
+  """Stores the data of a mask, mask_one, categorical or pointer probe compactly.
+
+  Masks become int8. Mask_one and categorical probes become class indices
+  (int16, or int32 for many classes) if they are strictly one-hot (or
+  all-zero, as padded steps are), else int8. Pointers become int16/int32.
+  Other types, and data that would not round-trip exactly, are kept as is.
+
+  Args:
+    dp: The data point to compact.
+
+  Returns:
+    A `CompactDataPoint`, or `dp` itself if it cannot be compacted.
+  """
+  if isinstance(dp, CompactDataPoint):
+    return dp
+  data = np.asarray(dp.data)
+  if dp.type_ in [_Type.MASK, _Type.MASK_ONE, _Type.CATEGORICAL]:
+    if not ((data == 0) | (data == 1) | (data == -1)).all():
+      return dp
+    num_classes = data.shape[-1] if data.ndim else 0
+    if (dp.type_ != _Type.MASK and num_classes and
+        ((data == 0) | (data == 1)).all() and (data.sum(-1) <= 1).all()):
+      indices = np.where(data.any(-1), np.argmax(data, -1), -1)
+      return CompactDataPoint(dp.name, dp.location, dp.type_,
+                              indices.astype(_index_dtype(num_classes)),
+                              num_classes, data.dtype.str)
+    return CompactDataPoint(dp.name, dp.location, dp.type_,
+                            data.astype(np.int8), 0, data.dtype.str)
+  if dp.type_ == _Type.POINTER:
+    if ((data != np.round(data)) | (data < 0)).any():
+      return dp
+    max_value = int(data.max()) if data.size else 0
+    if max_value >= np.iinfo(np.int32).max:
+      return dp
+    return CompactDataPoint(dp.name, dp.location, dp.type_,
+                            data.astype(_index_dtype(max_value)), 0,
+                            data.dtype.str)
+  return dp
+
+
+def expand(dp: DataPoint) -> DataPoint:
+  """Inverse of `compact`: a `DataPoint` with the original data."""
+  if not isinstance(dp, CompactDataPoint):
+    return dp
+  data = dp.data
+  if dp.num_classes:
+    data = data[..., None] == np.arange(dp.num_classes)
+  return DataPoint(dp.name, dp.location, dp.type_,
+                   data.astype(np.dtype(dp.dtype)))
 
 
 class ProbeError(Exception):
   pass
 
 
+class Validation:
+  """How thoroughly probe data is checked (see `split_stages`).
+
+  With `SAMPLED`, a `Sampler` only checks its first few samples.
+  """
+  OFF = 'off'
+  SAMPLED = 'sampled'
+  FULL = 'full'
+
+
+class ProbeBuffer:
+  """Growable array holding the values pushed to a probe, one per step.
+
+  Storage is allocated on the first push, from the shape and dtype of the
+  pushed value, and doubles whenever it is full. Pushed values are copied in
+  place, so later changes to them do not affect the probe, and the dtype is
+  promoted if needed (as `np.stack` would do).
+  """
+
+  def __init__(self, capacity: int = 1):
+    self._capacity = capacity
+    self._data = None
+    self._size = 0
+
+  def __len__(self) -> int:
+    return self._size
+
+  def append(self, value) -> None:
+    value = np.asarray(value)
+    if self._data is None:
+      self._data = np.empty((self._capacity,) + value.shape, value.dtype)
+    elif value.shape != self._data.shape[1:]:
+      raise ProbeError(f'Pushed shape {value.shape} to a probe of shape '
+                       f'{self._data.shape[1:]}.')
+    elif not np.can_cast(value.dtype, self._data.dtype):
+      self._data = self._data.astype(
+          np.result_type(self._data, value.dtype))
+    if self._size == self._data.shape[0]:
+      grown = np.empty((2 * self._size,) + self._data.shape[1:],
+                       self._data.dtype)
+      grown[:self._size] = self._data
+      self._data = grown
+    self._data[self._size] = value
+    self._size += 1
+
+  def view(self) -> _Array:
+    """The pushed values, stacked along a leading axis, without copying."""
+    if self._data is None:
+      return np.array([])
+    return self._data[:self._size]
+
+
+class DeltaTrajectory:
+  """A hint trajectory stored as a keyframe plus sparse per-step updates.
+
+  Step 0 is `keyframe`. Step `t` is step `t - 1` with the flat (row-major)
+  entries `indices[offsets[t - 1]:offsets[t]]` set to the matching `values`.
+  Storage therefore grows with the number of changed entries rather than with
+  the number of steps times the step size.
+
+  It behaves like a read-only array of shape `(T,) + keyframe.shape`: integer
+  indexing reconstructs a single step in O(changes up to that step), other
+  indexing and `np.asarray` reconstruct the dense trajectory.
+  """
+
+  def __init__(self, keyframe: _Array, indices: _Array, values: _Array,
+               offsets: _Array):
+    self.keyframe = keyframe
+    self.indices = indices
+    self.values = values
+    self.offsets = offsets
+
+  @property
+  def shape(self) -> Tuple[int, ...]:
+    return (len(self.offsets),) + self.keyframe.shape
+
+  @property
+  def ndim(self) -> int:
+    return self.keyframe.ndim + 1
+
+  @property
+  def dtype(self) -> np.dtype:
+    return self.keyframe.dtype
+
+  @property
+  def nbytes(self) -> int:
+    return (self.keyframe.nbytes + self.indices.nbytes + self.values.nbytes +
+            self.offsets.nbytes)
+
+  def __len__(self) -> int:
+    return len(self.offsets)
+
+  def __repr__(self):
+    return (f'DeltaTrajectory(shape={self.shape}, dtype={self.dtype}, '
+            f'changes={len(self.indices)})')
+
+  def step(self, t: int) -> _Array:
+    """Reconstructs step `t`."""
+    if not -len(self) <= t < len(self):
+      raise IndexError(f'Step {t} out of range for {len(self)} steps.')
+    end = self.offsets[t]
+    data = self.keyframe.copy()
+    # Updates are applied in order, so the last write to an entry wins.
+    data.reshape(-1)[self.indices[:end]] = self.values[:end]
+    return data
+
+  def __getitem__(self, key):
+    if isinstance(key, (int, np.integer)):
+      return self.step(key)
+    return np.asarray(self)[key]
+
+  def __array__(self, dtype=None, copy=None):  # pylint: disable=unused-argument
+    out = np.empty(self.shape, dtype=self.dtype)
+    self.copyto(out)
+    return out if dtype is None else out.astype(dtype, copy=False)
+
+  def copyto(self, out: _Array) -> None:
+    """Writes the dense trajectory into `out`, of shape `self.shape`."""
+    data = self.keyframe.copy()
+    flat = data.reshape(-1)
+    start = 0
+    for t, end in enumerate(self.offsets):
+      flat[self.indices[start:end]] = self.values[start:end]
+      out[t] = data
+      start = end
+
+  def expand_dims(self, axis: int) -> 'DeltaTrajectory':
+    """Inserts a unit axis at `axis >= 1` (flat step indices are unchanged)."""
+    if axis < 1:
+      raise ValueError('Cannot insert an axis before the step axis.')
+    return DeltaTrajectory(np.expand_dims(self.keyframe, axis - 1),
+                           self.indices, self.values, self.offsets)
+
+
+class DeltaBuffer:
+  """Records pushed values as a `DeltaTrajectory` (see `ProbeBuffer`)."""
+
+  def __init__(self):
+    self._previous = None
+    self._keyframe = None
+    self._indices = []
+    self._values = []
+    self._offsets = []
+    self._num_changes = 0
+
+  def __len__(self) -> int:
+    return len(self._offsets)
+
+  def append(self, value) -> None:
+    value = np.array(value)  # A copy, as the previous step is kept.
+    if self._previous is None:
+      self._keyframe = value
+      self._previous = value.copy()
+      self._offsets.append(0)
+      return
+    if value.shape != self._previous.shape:
+      raise ProbeError(f'Pushed shape {value.shape} to a probe of shape '
+                       f'{self._previous.shape}.')
+    if not np.can_cast(value.dtype, self._previous.dtype):
+      dtype = np.result_type(self._previous, value.dtype)
+      self._keyframe = self._keyframe.astype(dtype)
+      self._previous = self._previous.astype(dtype)
+    changed = value != self._previous
+    if np.issubdtype(value.dtype, np.inexact):
+      changed &= ~(np.isnan(value) & np.isnan(self._previous))
+    changed = np.flatnonzero(changed)
+    self._indices.append(changed)
+    self._values.append(value.reshape(-1)[changed])
+    self._previous[...] = value
+    self._num_changes += len(changed)
+    self._offsets.append(self._num_changes)
+
+  def view(self) -> Union[DeltaTrajectory, _Array]:
+    """The recorded `DeltaTrajectory`."""
+    if self._keyframe is None:
+      return np.array([])
+    dtype = self._keyframe.dtype
+    return DeltaTrajectory(
+        self._keyframe,
+        np.concatenate([np.zeros(0, dtype=np.int64)] + self._indices),
+        np.concatenate([np.zeros(0, dtype=dtype)] + self._values).astype(
+            dtype, copy=False),
+        np.asarray(self._offsets, dtype=np.int64))
+
+
+def _is_finalized(data) -> bool:
+  return isinstance(data, (_Array, DeltaTrajectory))
+
+
+# Per-thread recording options, set by `recording`.
+_recording = threading.local()
+
+
+@contextlib.contextmanager
+def recording(hints: Optional[Iterable[str]] = None, delta: bool = False):
+  """Context setting how `initialize` records probes.
+
+  Algorithms still pass every hint to `push`, which ignores the ones without a
+  probe, so hints outside `hints` are neither copied nor stored. Use
+  `filter_hints` to get the matching spec for `split_stages`.
+
+  Args:
+    hints: Names of the hint probes to record, or None to record all of them.
+    delta: Whether hints are finalized as `DeltaTrajectory`s instead of arrays.
+
+  Yields:
+    None.
+  """
+  previous = (getattr(_recording, 'hints', None),
+              getattr(_recording, 'delta', False))
+  _recording.hints = None if hints is None else frozenset(hints)
+  _recording.delta = delta
+  try:
+    yield
+  finally:
+    _recording.hints, _recording.delta = previous
+
+
+class ProbeStats:
+  """Recording statistics of one probe, accumulated over runs."""
+
+  __slots__ = ('stage', 'pushes', 'bytes_pushed', 'push_time', 'finalize_time',
+               'split_time', 'final_bytes')
+
+  def __init__(self, stage: str):
+    self.stage = stage
+    self.pushes = 0
+    self.bytes_pushed = 0
+    self.push_time = 0.
+    self.finalize_time = 0.
+    self.split_time = 0.
+    self.final_bytes = 0
+
+
+class AlgorithmStats:
+  """Recording statistics of one algorithm, accumulated over runs.
+
+  `time` runs from `initialize` to `finalize`, so it includes `push` and
+  excludes `finalize` and `split_stages`.
+  """
+
+  __slots__ = ('runs', 'time', 'probes')
+
+  def __init__(self):
+    self.runs = 0
+    self.time = 0.
+    self.probes: Dict[str, ProbeStats] = {}
+
+
+class ProbeProfile:
+  """Statistics of the probes recorded within `profiling`, per algorithm."""
+
+  def __init__(self):
+    self.algorithms: Dict[str, AlgorithmStats] = {}
+
+  def report(self) -> str:
+    """Formats the statistics as one table per algorithm.
+
+    Times are totals in milliseconds and sizes totals in KiB, over all runs.
+    Probes are sorted by the time spent recording them.
+    """
+    header = (f'{"probe":<28}{"stage":<8}{"pushes":>8}{"pushed KiB":>12}'
+              f'{"push ms":>10}{"final. ms":>10}{"split ms":>10}'
+              f'{"final KiB":>11}')
+    lines = []
+    for name, alg in sorted(self.algorithms.items()):
+      push_time = sum(p.push_time for p in alg.probes.values())
+      lines.append(f'{name}: {alg.runs} runs, {alg.time * 1e3:.1f} ms, of '
+                   f'which {push_time * 1e3:.1f} ms in push')
+      lines.append(header)
+      for probe, p in sorted(
+          alg.probes.items(),
+          key=lambda x: -(x[1].push_time + x[1].finalize_time +
+                          x[1].split_time)):
+        lines.append(
+            f'{probe:<28}{p.stage:<8}{p.pushes:>8}'
+            f'{p.bytes_pushed / 1024:>12.1f}{p.push_time * 1e3:>10.2f}'
+            f'{p.finalize_time * 1e3:>10.2f}{p.split_time * 1e3:>10.2f}'
+            f'{p.final_bytes / 1024:>11.1f}')
+      lines.append('')
+    return '\n'.join(lines)
+
+
+class _ProfiledRun:
+  """Profile state of one `ProbesDict`, shared by its probes."""
+
+  __slots__ = ('algorithm', 'start', 'finalized')
+
+  def __init__(self, algorithm: AlgorithmStats):
+    self.algorithm = algorithm
+    self.start = time.perf_counter()
+    self.finalized = False
+
+
+@contextlib.contextmanager
+def profiling(profile: ProbeProfile):
+  """Context in which `initialize`d probes record statistics into `profile`.
+
+  Probes keep recording into `profile` when pushed, finalized or split outside
+  of the context. Algorithms are named after their spec in `specs.SPECS`. Only
+  the current thread is profiled, so sharded sampling (`num_workers`) is not.
+
+  Args:
+    profile: The profile to accumulate into.
+
+  Yields:
+    `profile`.
+  """
+  previous = getattr(_recording, 'profile', None)
+  _recording.profile = profile
+  try:
+    yield profile
+  finally:
+    _recording.profile = previous
+
+
+@functools.lru_cache(maxsize=None)
+def _spec_names() -> Dict[int, str]:
+  return {id(spec): name for name, spec in specs.SPECS.items()}
+
+
+def filter_hints(spec: specs.Spec,
+                 hints: Optional[Iterable[str]]) -> specs.Spec:
+  """The spec without the hint probes that are not in `hints` (if not None)."""
+  if hints is None:
+    return spec
+  hints = frozenset(hints)
+  spec_hints = {name for name, (stage, _, _) in spec.items()
+                if stage == _Stage.HINT}
+  if not hints <= spec_hints:
+    raise ProbeError(f'Unknown hints {sorted(hints - spec_hints)}.')
+  if not hints:
+    raise ProbeError('At least one hint is needed for trajectory lengths.')
+  return {name: value for name, value in spec.items()
+          if value[0] != _Stage.HINT or name in hints}
+
+
 def initialize(spec: specs.Spec) -> ProbesDict:
-  """Initializes an empty `ProbesDict` corresponding with the provided spec."""
+  """Initializes an empty `ProbesDict` corresponding with the provided spec.
+
+  Within `recording(hints=...)`, only the given hint probes are created, and
+  within `recording(delta=True)`, hints are recorded as `DeltaTrajectory`s.
+  """
   probes = dict()
   for stage in [_Stage.INPUT, _Stage.OUTPUT, _Stage.HINT]:
     probes[stage] = {}
     for loc in [_Location.NODE, _Location.EDGE, _Location.GRAPH]:
       probes[stage][loc] = {}
 
+  recorded_hints = getattr(_recording, 'hints', None)
+  delta = getattr(_recording, 'delta', False)
+  profile = getattr(_recording, 'profile', None)
+  if profile is not None:
+    algorithm = profile.algorithms.setdefault(
+        _spec_names().get(id(spec), 'unknown'), AlgorithmStats())
+    algorithm.runs += 1
+    run = _ProfiledRun(algorithm)
   for name in spec:
     stage, loc, t = spec[name]
+    if (stage == _Stage.HINT and recorded_hints is not None and
+        name not in recorded_hints):
+      continue
     probes[stage][loc][name] = {}
-    probes[stage][loc][name]['data'] = []
+    # Inputs and outputs are pushed once; hints once per step.
+    if stage == _Stage.HINT:
+      buffer = DeltaBuffer() if delta else ProbeBuffer(capacity=16)
+    else:
+      buffer = ProbeBuffer(capacity=1)
+    probes[stage][loc][name]['data'] = buffer
     probes[stage][loc][name]['type_'] = t
+    if profile is not None:
+      if name not in algorithm.probes:
+        algorithm.probes[name] = ProbeStats(stage)
+      probes[stage][loc][name]['profile'] = (run, algorithm.probes[name])
   # Pytype thinks initialize() returns a ProbesDict with a str for all final
   # values instead of _DataOrType.
   return probes  # pytype: disable=bad-return-type
@@ -124,11 +595,17 @@ def push(probes: ProbesDict, stage: str, next_probe):
     for name in probes[stage][loc]:
       if name not in next_probe:
         raise ProbeError(f'Missing probe for {name}.')
-      if isinstance(probes[stage][loc][name]['data'], _Array):
+      if _is_finalized(probes[stage][loc][name]['data']):
         raise ProbeError('Attemping to push to finalized `ProbesDict`.')
-      # Pytype thinks initialize() returns a ProbesDict with a str for all final
-      # values instead of _DataOrType.
+      if 'profile' not in probes[stage][loc][name]:
+        probes[stage][loc][name]['data'].append(next_probe[name])  # pytype: disable=attribute-error
+        continue
+      _, stats = probes[stage][loc][name]['profile']
+      start = time.perf_counter()
       probes[stage][loc][name]['data'].append(next_probe[name])  # pytype: disable=attribute-error
+      stats.push_time += time.perf_counter() - start
+      stats.pushes += 1
+      stats.bytes_pushed += np.asarray(next_probe[name]).nbytes
 
 
 def finalize(probes: ProbesDict):
@@ -136,29 +613,52 @@ def finalize(probes: ProbesDict):
   for stage in [_Stage.INPUT, _Stage.OUTPUT, _Stage.HINT]:
     for loc in [_Location.NODE, _Location.EDGE, _Location.GRAPH]:
       for name in probes[stage][loc]:
-        if isinstance(probes[stage][loc][name]['data'], _Array):
+        if _is_finalized(probes[stage][loc][name]['data']):
           raise ProbeError('Attemping to re-finalize a finalized `ProbesDict`.')
+        buffer = probes[stage][loc][name]['data']
+        if 'profile' in probes[stage][loc][name]:
+          run, stats = probes[stage][loc][name]['profile']
+          start = time.perf_counter()
+          if not run.finalized:
+            run.finalized = True
+            run.algorithm.time += start - run.start
         if stage == _Stage.HINT:
-          # Hints are provided for each timestep. Stack them here.
-          probes[stage][loc][name]['data'] = np.stack(
-              probes[stage][loc][name]['data'])
+          # Hints are provided for each timestep, already stacked in the buffer.
+          if not buffer:
+            raise ProbeError(f'No hint pushed for probe {name}.')
+          probes[stage][loc][name]['data'] = buffer.view()
         else:
           # Only one instance of input/output exist. Remove leading axis.
-          probes[stage][loc][name]['data'] = np.squeeze(
-              np.array(probes[stage][loc][name]['data']))
+          probes[stage][loc][name]['data'] = np.squeeze(buffer.view())
+        if 'profile' in probes[stage][loc][name]:
+          stats.finalize_time += time.perf_counter() - start
+          stats.final_bytes += probes[stage][loc][name]['data'].nbytes
 
 
 def split_stages(
     probes: ProbesDict,
     spec: specs.Spec,
+    validate: bool = True,
 ) -> Tuple[List[DataPoint], List[DataPoint], List[DataPoint]]:
-  """Splits contents of `ProbesDict` into `DataPoint`s by stage."""
+  """Splits contents of `ProbesDict` into `DataPoint`s by stage.
+
+  Args:
+    probes: The finalized probes.
+    spec: The algorithm spec.
+    validate: Whether to check that mask, mask_one and categorical data is
+      0|1|-1 and one-hot as required. These are full passes over the data;
+      the structure of `probes` is always checked.
+
+  Returns:
+    The input, output and hint `DataPoint`s.
+  """
 
   inputs = []
   outputs = []
   hints = []
 
   for name in spec:
+    start = time.perf_counter()
     stage, loc, t = spec[name]
 
     if stage not in probes:
@@ -175,11 +675,13 @@ def split_stages(
       raise ProbeError(f'Probe {name} of incorrect type {t}.')
 
     data = probes[stage][loc][name]['data']
-    if not isinstance(probes[stage][loc][name]['data'], _Array):
+    if not _is_finalized(probes[stage][loc][name]['data']):
       raise ProbeError((f'Invalid `data` for probe "{name}". ' +
                         'Did you forget to call `probing.finalize`?'))
 
-    if t in [_Type.MASK, _Type.MASK_ONE, _Type.CATEGORICAL]:
+    if validate and t in [_Type.MASK, _Type.MASK_ONE, _Type.CATEGORICAL]:
+      if isinstance(data, DeltaTrajectory):
+        data = np.asarray(data)
       # pytype: disable=attribute-error
       if not ((data == 0) | (data == 1) | (data == -1)).all():
         raise ProbeError(f'0|1|-1 `data` for probe "{name}"')
@@ -188,9 +690,13 @@ def split_stages(
               ] and not np.all(np.sum(np.abs(data), -1) == 1):
         raise ProbeError(f'Expected one-hot `data` for probe "{name}"')
 
-    dim_to_expand = 1 if stage == _Stage.HINT else 0
-    data_point = DataPoint(name=name, location=loc, type_=t,
-                           data=np.expand_dims(data, dim_to_expand))
+    # Validation may have densified `data`; keep delta trajectories compact.
+    data = probes[stage][loc][name]['data']
+    if isinstance(data, DeltaTrajectory):
+      data = data.expand_dims(1)
+    else:
+      data = np.expand_dims(data, 1 if stage == _Stage.HINT else 0)
+    data_point = DataPoint(name=name, location=loc, type_=t, data=data)
 
     if stage == _Stage.INPUT:
       inputs.append(data_point)
@@ -199,6 +705,10 @@ def split_stages(
     else:
       hints.append(data_point)
 
+    if 'profile' in probes[stage][loc][name]:
+      _, stats = probes[stage][loc][name]['profile']
+      stats.split_time += time.perf_counter() - start
+
   return inputs, outputs, hints
 
 
@@ -208,8 +718,7 @@ def split_stages(
 def array(A_pos: np.ndarray) -> np.ndarray:
   """Constructs an `array` probe."""
   probe = np.arange(A_pos.shape[0])
-  for i in range(1, A_pos.shape[0]):
-    probe[A_pos[i]] = A_pos[i - 1]
+  probe[A_pos[1:]] = A_pos[:-1]
   return probe
 
 
@@ -217,8 +726,7 @@ def array_cat(A: np.ndarray, n: int) -> np.ndarray:
   """Constructs an `array_cat` probe."""
   assert n > 0
   probe = np.zeros((A.shape[0], n))
-  for i in range(A.shape[0]):
-    probe[i, A[i]] = 1
+  probe[np.arange(A.shape[0]), A] = 1
   return probe
 
 
@@ -226,8 +734,8 @@ def heap(A_pos: np.ndarray, heap_size: int) -> np.ndarray:
   """Constructs a `heap` probe."""
   assert heap_size > 0
   probe = np.arange(A_pos.shape[0])
-  for i in range(1, heap_size):
-    probe[A_pos[i]] = A_pos[(i - 1) // 2]
+  children = np.arange(1, heap_size)
+  probe[A_pos[children]] = A_pos[(children - 1) // 2]
   return probe
 
 
@@ -258,9 +766,7 @@ def strings_pair(pair_probe: np.ndarray) -> np.ndarray:
   n = pair_probe.shape[0]
   m = pair_probe.shape[1]
   probe_ret = np.zeros((n + m, n + m))
-  for i in range(0, n):
-    for j in range(0, m):
-      probe_ret[i, j + n] = pair_probe[i, j]
+  probe_ret[:n, n:] = pair_probe
   return probe_ret
 
 
@@ -272,17 +778,12 @@ def strings_pair_cat(pair_probe: np.ndarray, nb_classes: int) -> np.ndarray:
 
   # Add an extra class for 'this cell left blank.'
   probe_ret = np.zeros((n + m, n + m, nb_classes + 1))
-  for i in range(0, n):
-    for j in range(0, m):
-      probe_ret[i, j + n, int(pair_probe[i, j])] = _OutputClass.POSITIVE
+  rows, cols = np.indices((n, m))
+  probe_ret[rows, cols + n, pair_probe.astype(int)] = _OutputClass.POSITIVE
 
   # Fill the blank cells.
-  for i_1 in range(0, n):
-    for i_2 in range(0, n):
-      probe_ret[i_1, i_2, nb_classes] = _OutputClass.MASKED
-  for j_1 in range(0, m):
-    for x in range(0, n + m):
-      probe_ret[j_1 + n, x, nb_classes] = _OutputClass.MASKED
+  probe_ret[:n, :n, nb_classes] = _OutputClass.MASKED
+  probe_ret[n:, :, nb_classes] = _OutputClass.MASKED
   return probe_ret
 
 
@@ -290,8 +791,7 @@ def strings_pi(T_pos: np.ndarray, P_pos: np.ndarray,
                pi: np.ndarray) -> np.ndarray:
   """Constructs a `strings_pi` probe."""
   probe = np.arange(T_pos.shape[0] + P_pos.shape[0])
-  for j in range(P_pos.shape[0]):
-    probe[T_pos.shape[0] + P_pos[j]] = T_pos.shape[0] + pi[P_pos[j]]
+  probe[T_pos.shape[0] + P_pos] = T_pos.shape[0] + pi[P_pos]
   return probe
 
 
@@ -305,16 +805,13 @@ def strings_pos(T_pos: np.ndarray, P_pos: np.ndarray) -> np.ndarray:
 def strings_pred(T_pos: np.ndarray, P_pos: np.ndarray) -> np.ndarray:
   """Constructs a `strings_pred` probe."""
   probe = np.arange(T_pos.shape[0] + P_pos.shape[0])
-  for i in range(1, T_pos.shape[0]):
-    probe[T_pos[i]] = T_pos[i - 1]
-  for j in range(1, P_pos.shape[0]):
-    probe[T_pos.shape[0] + P_pos[j]] = T_pos.shape[0] + P_pos[j - 1]
+  probe[T_pos[1:]] = T_pos[:-1]
+  probe[T_pos.shape[0] + P_pos[1:]] = T_pos.shape[0] + P_pos[:-1]
   return probe
 
 
-@functools.partial(jnp.vectorize, signature='(n)->(n,n),(n)')
 def predecessor_to_cyclic_predecessor_and_first(
-    pointers: jnp.ndarray) -> Tuple[jnp.ndarray, jnp.ndarray]:
+    pointers: _Array) -> Tuple[_Array, _Array]:
   """Converts predecessor pointers to cyclic predecessor + first node mask.
 
   This function assumes that the pointers represent a linear order of the nodes
@@ -331,21 +828,58 @@ def predecessor_to_cyclic_predecessor_and_first(
   M = [0, 1, 0]
   ```
 
+  This runs in NumPy, unless JAX is already imported with an accelerator as its
+  default backend.
+
   Args:
     pointers: array of shape [N] containing pointers. The pointers are assumed
       to describe a linear order such that `pointers[i]` is the predecessor
-      of node `i`.
+      of node `i`. Any leading axes are batch axes.
 
   Returns:
-    Permutation pointers `P` of shape [N] and one-hot vector `M` of shape [N].
+    Permutation pointers `P` of shape [N, N] and one-hot vector `M` of shape
+    [N], as float32.
   """
-  nb_nodes = pointers.shape[-1]
-  pointers_one_hot = jax.nn.one_hot(pointers, nb_nodes)
-  # Find the index of the last node: it's the node that no other node points to.
-  last = pointers_one_hot.sum(-2).argmin()
-  # Find the first node: should be the only one pointing to itself.
-  first = pointers_one_hot.diagonal().argmax()
-  mask = jax.nn.one_hot(first, nb_nodes)
-  pointers_one_hot += mask[..., None] * jax.nn.one_hot(last, nb_nodes)
-  pointers_one_hot -= mask[..., None] * mask
+  jax = sys.modules.get('jax')
+  if jax is not None and jax.default_backend() != 'cpu':
+    return _jax_predecessor_to_cyclic_predecessor_and_first()(pointers)
+  return _np_predecessor_to_cyclic_predecessor_and_first(np.asarray(pointers))
+
+
+def _np_predecessor_to_cyclic_predecessor_and_first(
+    pointers: _Array) -> Tuple[_Array, _Array]:
+  """NumPy implementation, vectorised over the leading axes of `pointers`."""
+  nodes = np.arange(pointers.shape[-1])
+  pointers_one_hot = (pointers[..., None] == nodes).astype(np.float32)
+  # As in the JAX version: the last node is the one no other node points to,
+  # the first the only one pointing to itself.
+  last = pointers_one_hot.sum(-2).argmin(-1)
+  first = np.diagonal(pointers_one_hot, axis1=-2, axis2=-1).argmax(-1)
+  mask = (first[..., None] == nodes).astype(np.float32)
+  pointers_one_hot += mask[..., None] * (last[..., None] == nodes)[..., None, :]
+  pointers_one_hot -= mask[..., None] * mask[..., None, :]
   return pointers_one_hot, mask
+
+
+@functools.lru_cache(maxsize=None)
+def _jax_predecessor_to_cyclic_predecessor_and_first():
+  """Vectorised JAX implementation, built on first use."""
+  import jax  # pylint: disable=g-import-not-at-top
+  import jax.numpy as jnp  # pylint: disable=g-import-not-at-top
+  register_pytree()
+
+  @functools.partial(jnp.vectorize, signature='(n)->(n,n),(n)')
+  def convert(pointers):
+    nb_nodes = pointers.shape[-1]
+    pointers_one_hot = jax.nn.one_hot(pointers, nb_nodes)
+    # Find the index of the last node: it's the node that no other node points
+    # to.
+    last = pointers_one_hot.sum(-2).argmin()
+    # Find the first node: should be the only one pointing to itself.
+    first = pointers_one_hot.diagonal().argmax()
+    mask = jax.nn.one_hot(first, nb_nodes)
+    pointers_one_hot += mask[..., None] * jax.nn.one_hot(last, nb_nodes)
+    pointers_one_hot -= mask[..., None] * mask
+    return pointers_one_hot, mask
+
+  return convert
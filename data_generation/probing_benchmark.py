@@ -0,0 +1,158 @@
+# Copyright 2021 DeepMind Technologies Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Benchmarks the probe helpers in `probing.py` against loop references.
+
+The references are the element-wise implementations the helpers replaced; the
+unit tests check both give identical outputs.
+
+With `--profile`, instead samples each algorithm and prints the
+`probing.ProbeProfile` report of where probe recording time and memory go.
+
+Usage: python probing_benchmark.py [--lengths 16 64 256] [--repeats 20]
+       python probing_benchmark.py --profile [--algorithms bfs dfs ...]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import probing
+import samplers
+import specs
+
+
+def array(A_pos):
+  probe = np.arange(A_pos.shape[0])
+  for i in range(1, A_pos.shape[0]):
+    probe[A_pos[i]] = A_pos[i - 1]
+  return probe
+
+
+def array_cat(A, n):
+  probe = np.zeros((A.shape[0], n))
+  for i in range(A.shape[0]):
+    probe[i, A[i]] = 1
+  return probe
+
+
+def heap(A_pos, heap_size):
+  probe = np.arange(A_pos.shape[0])
+  for i in range(1, heap_size):
+    probe[A_pos[i]] = A_pos[(i - 1) // 2]
+  return probe
+
+
+def strings_pair(pair_probe):
+  n, m = pair_probe.shape
+  probe_ret = np.zeros((n + m, n + m))
+  for i in range(0, n):
+    for j in range(0, m):
+      probe_ret[i, j + n] = pair_probe[i, j]
+  return probe_ret
+
+
+def strings_pair_cat(pair_probe, nb_classes):
+  n, m = pair_probe.shape
+  probe_ret = np.zeros((n + m, n + m, nb_classes + 1))
+  for i in range(0, n):
+    for j in range(0, m):
+      probe_ret[i, j + n, int(pair_probe[i, j])] = specs.OutputClass.POSITIVE
+  for i_1 in range(0, n):
+    for i_2 in range(0, n):
+      probe_ret[i_1, i_2, nb_classes] = specs.OutputClass.MASKED
+  for j_1 in range(0, m):
+    for x in range(0, n + m):
+      probe_ret[j_1 + n, x, nb_classes] = specs.OutputClass.MASKED
+  return probe_ret
+
+
+def strings_pi(T_pos, P_pos, pi):
+  probe = np.arange(T_pos.shape[0] + P_pos.shape[0])
+  for j in range(P_pos.shape[0]):
+    probe[T_pos.shape[0] + P_pos[j]] = T_pos.shape[0] + pi[P_pos[j]]
+  return probe
+
+
+def strings_pred(T_pos, P_pos):
+  probe = np.arange(T_pos.shape[0] + P_pos.shape[0])
+  for i in range(1, T_pos.shape[0]):
+    probe[T_pos[i]] = T_pos[i - 1]
+  for j in range(1, P_pos.shape[0]):
+    probe[T_pos.shape[0] + P_pos[j]] = T_pos.shape[0] + P_pos[j - 1]
+  return probe
+
+
+def make_args(length, rng):
+  """Arguments for each helper, as `lcs_length` and friends would pass them."""
+  A_pos = rng.permutation(length)
+  T_pos, P_pos = np.arange(length), np.arange(length // 2)
+  return {
+      'array': (A_pos,),
+      'array_cat': (rng.integers(0, 3, size=length), 3),
+      'heap': (A_pos, length),
+      'strings_pair': (rng.random((length, length)),),
+      'strings_pair_cat': (rng.integers(0, 3, size=(length, length)), 3),
+      'strings_pi': (T_pos, P_pos, rng.integers(0, length // 2, size=length)),
+      'strings_pred': (T_pos, P_pos),
+  }
+
+
+def profile_algorithms(algorithms, length, num_samples):
+  """Profiles probe recording while sampling a batch of each algorithm."""
+  profile = probing.ProbeProfile()
+  with probing.profiling(profile):
+    for name in algorithms:
+      sampler, _ = samplers.build_sampler(
+          name, num_samples=num_samples, length=length, seed=0)
+      sampler.next()
+  return profile
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--lengths', type=int, nargs='+', default=[16, 64, 256])
+  parser.add_argument('--repeats', type=int, default=20)
+  parser.add_argument('--profile', action='store_true')
+  parser.add_argument('--algorithms', nargs='+', default=specs.CLRS_30_ALGS)
+  parser.add_argument('--num_samples', type=int, default=32)
+  args = parser.parse_args()
+
+  if args.profile:
+    for length in args.lengths:
+      print(f'Length {length}\n')
+      print(profile_algorithms(args.algorithms, length,
+                               args.num_samples).report())
+    return
+
+  rng = np.random.default_rng(0)
+  print(f'{"helper":<18}{"length":>8}{"loop (ms)":>12}{"numpy (ms)":>12}'
+        f'{"speedup":>10}')
+  for length in args.lengths:
+    for name, fn_args in make_args(length, rng).items():
+      reference = globals()[name]
+      vectorized = getattr(probing, name)
+      np.testing.assert_array_equal(reference(*fn_args), vectorized(*fn_args))
+      times = [
+          min(timeit.repeat(lambda f=f: f(*fn_args), number=1,
+                            repeat=args.repeats)) * 1e3
+          for f in (reference, vectorized)
+      ]
+      print(f'{name:<18}{length:>8}{times[0]:>12.3f}{times[1]:>12.3f}'
+            f'{times[0] / times[1]:>9.1f}x')
+
+
+if __name__ == '__main__':
+  main()
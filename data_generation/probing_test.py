@@ -0,0 +1,335 @@
+# Copyright 2021 DeepMind Technologies Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Unit tests for `probing.py`."""
+
+import pickle
+import sys
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from algorithms import graphs
+import numpy as np
+import probing
+import probing_benchmark
+import samplers
+import specs
+
+
+_SPEC = {
+    'x': (specs.Stage.INPUT, specs.Location.NODE, specs.Type.SCALAR),
+    'h': (specs.Stage.HINT, specs.Location.NODE, specs.Type.SCALAR),
+    'y': (specs.Stage.OUTPUT, specs.Location.GRAPH, specs.Type.SCALAR),
+}
+
+
+class ProbeRecorderTest(absltest.TestCase):
+
+  def test_hints_are_stacked_copies(self):
+    probes = probing.initialize(_SPEC)
+    h = np.zeros(3)
+    for step in range(40):  # Beyond the initial capacity.
+      h[0] = step
+      probing.push(probes, specs.Stage.HINT, next_probe={'h': h})
+    probing.finalize(probes)
+    data = probes[specs.Stage.HINT][specs.Location.NODE]['h']['data']
+    self.assertEqual(data.shape, (40, 3))
+    np.testing.assert_array_equal(data[:, 0], np.arange(40))
+
+  def test_inputs_and_outputs_are_squeezed(self):
+    probes = probing.initialize(_SPEC)
+    probing.push(probes, specs.Stage.INPUT, next_probe={'x': np.ones(4)})
+    probing.push(probes, specs.Stage.HINT, next_probe={'h': np.ones(4)})
+    probing.push(probes, specs.Stage.OUTPUT, next_probe={'y': 2.})
+    probing.finalize(probes)
+    x = probes[specs.Stage.INPUT][specs.Location.NODE]['x']['data']
+    y = probes[specs.Stage.OUTPUT][specs.Location.GRAPH]['y']['data']
+    self.assertEqual(x.shape, (4,))
+    self.assertEqual(y.shape, ())
+
+  def test_dtype_is_promoted(self):
+    probes = probing.initialize(_SPEC)
+    probing.push(probes, specs.Stage.HINT, next_probe={'h': 0})
+    probing.push(probes, specs.Stage.HINT, next_probe={'h': 0.5})
+    probing.finalize(probes)
+    data = probes[specs.Stage.HINT][specs.Location.NODE]['h']['data']
+    np.testing.assert_array_equal(data, np.stack([0, 0.5]))
+    self.assertEqual(data.dtype, np.float64)
+
+  def test_shape_mismatch_raises(self):
+    probes = probing.initialize(_SPEC)
+    probing.push(probes, specs.Stage.HINT, next_probe={'h': np.zeros(3)})
+    with self.assertRaises(probing.ProbeError):
+      probing.push(probes, specs.Stage.HINT, next_probe={'h': np.zeros(4)})
+
+  def test_push_after_finalize_raises(self):
+    probes = probing.initialize(_SPEC)
+    probing.push(probes, specs.Stage.HINT, next_probe={'h': np.zeros(3)})
+    probing.finalize(probes)
+    with self.assertRaises(probing.ProbeError):
+      probing.push(probes, specs.Stage.HINT, next_probe={'h': np.zeros(3)})
+
+
+class RecordingTest(absltest.TestCase):
+
+  def test_only_selected_hints_are_recorded(self):
+    spec = dict(_SPEC, g=(specs.Stage.HINT, specs.Location.GRAPH,
+                          specs.Type.SCALAR))
+    with probing.recording(hints=['h']):
+      probes = probing.initialize(spec)
+    probing.push(probes, specs.Stage.INPUT, next_probe={'x': np.ones(2)})
+    probing.push(probes, specs.Stage.HINT, next_probe={'h': 1., 'g': 2.})
+    probing.push(probes, specs.Stage.OUTPUT, next_probe={'y': 3.})
+    probing.finalize(probes)
+    self.assertEmpty(probes[specs.Stage.HINT][specs.Location.GRAPH])
+    _, _, hints = probing.split_stages(probes,
+                                       probing.filter_hints(spec, ['h']))
+    self.assertEqual([dp.name for dp in hints], ['h'])
+
+  def test_unknown_hints_raise(self):
+    with self.assertRaises(probing.ProbeError):
+      probing.filter_hints(_SPEC, ['x'])
+
+
+class DeltaTrajectoryTest(absltest.TestCase):
+
+  def _record(self, steps):
+    with probing.recording(delta=True):
+      probes = probing.initialize(_SPEC)
+    for h in steps:
+      probing.push(probes, specs.Stage.HINT, next_probe={'h': h})
+    probing.finalize(probes)
+    return probes[specs.Stage.HINT][specs.Location.NODE]['h']['data']
+
+  def test_steps_are_reconstructed(self):
+    rng = np.random.default_rng(0)
+    steps = [rng.integers(0, 3, size=(4, 5)).astype(float) for _ in range(10)]
+    steps[3][0, 0] = np.nan
+    steps[4][0, 0] = np.nan
+    data = self._record(steps)
+    self.assertIsInstance(data, probing.DeltaTrajectory)
+    self.assertEqual(data.shape, (10, 4, 5))
+    for t in [0, 4, 9, -1]:
+      np.testing.assert_array_equal(data[t], steps[t])
+    np.testing.assert_array_equal(np.asarray(data), np.stack(steps))
+    np.testing.assert_array_equal(data[2:5, 1], np.stack(steps)[2:5, 1])
+
+  def test_storage_grows_with_changes(self):
+    h = np.zeros(1000)
+    steps = []
+    for t in range(100):
+      h[t] = 1
+      steps.append(h.copy())
+    data = self._record(steps)
+    self.assertLen(data.values, 99)
+    self.assertLess(data.nbytes, np.stack(steps).nbytes // 20)
+
+  def test_split_stages_keeps_trajectory(self):
+    with probing.recording(delta=True):
+      probes = probing.initialize(_SPEC)
+    probing.push(probes, specs.Stage.INPUT, next_probe={'x': np.ones(3)})
+    for step in range(3):
+      probing.push(probes, specs.Stage.HINT, next_probe={'h': np.full(3, step)})
+    probing.push(probes, specs.Stage.OUTPUT, next_probe={'y': 1.})
+    probing.finalize(probes)
+    _, _, hints = probing.split_stages(probes, _SPEC)
+    self.assertIsInstance(hints[0].data, probing.DeltaTrajectory)
+    self.assertEqual(hints[0].data.shape, (3, 1, 3))
+    np.testing.assert_array_equal(
+        np.asarray(hints[0].data)[:, 0],
+        np.repeat(np.arange(3)[:, None], 3, axis=1))
+
+  def test_algorithm_hints_match_dense(self):
+    graph = np.random.default_rng(0).integers(0, 2, size=(8, 8)).astype(float)
+    _, dense = graphs.bfs(graph, 0)
+    with probing.recording(delta=True):
+      _, delta = graphs.bfs(graph, 0)
+    _, _, dense_hints = probing.split_stages(dense, specs.SPECS['bfs'])
+    _, _, delta_hints = probing.split_stages(delta, specs.SPECS['bfs'])
+    batched, _ = samplers._batch_hints([delta_hints], 0)
+    for x, y, z in zip(dense_hints, delta_hints, batched):
+      np.testing.assert_array_equal(x.data, np.asarray(y.data))
+      np.testing.assert_array_equal(x.data, z.data)
+
+
+class ProbeHelpersTest(parameterized.TestCase):
+
+  @parameterized.parameters(2, 5, 16, 64)
+  def test_helpers_match_loop_references(self, length):
+    rng = np.random.default_rng(length)
+    for name, args in probing_benchmark.make_args(length, rng).items():
+      expected = getattr(probing_benchmark, name)(*args)
+      actual = getattr(probing, name)(*args)
+      self.assertEqual(actual.dtype, expected.dtype, name)
+      np.testing.assert_array_equal(actual, expected, err_msg=name)
+
+  def test_partial_heap_and_non_square_pairs(self):
+    A_pos = np.random.default_rng(0).permutation(10)
+    np.testing.assert_array_equal(probing.heap(A_pos, 4),
+                                  probing_benchmark.heap(A_pos, 4))
+    pair = np.random.default_rng(0).integers(0, 3, size=(3, 7)).astype(float)
+    np.testing.assert_array_equal(probing.strings_pair_cat(pair, 3),
+                                  probing_benchmark.strings_pair_cat(pair, 3))
+    np.testing.assert_array_equal(probing.strings_pair(pair),
+                                  probing_benchmark.strings_pair(pair))
+
+
+class ProfilingTest(absltest.TestCase):
+
+  def test_statistics_are_recorded_per_algorithm_and_probe(self):
+    graph = np.ones((4, 4))
+    profile = probing.ProbeProfile()
+    with probing.profiling(profile):
+      _, probes = graphs.bfs(graph, 0)
+    probing.split_stages(probes, specs.SPECS['bfs'])
+    self.assertEqual(list(profile.algorithms), ['bfs'])
+    bfs = profile.algorithms['bfs']
+    self.assertEqual(bfs.runs, 1)
+    self.assertGreater(bfs.time, 0)
+    hint = bfs.probes['reach_h']
+    num_steps = probes[specs.Stage.HINT][specs.Location.NODE]['reach_h'][
+        'data'].shape[0]
+    self.assertEqual(hint.pushes, num_steps)
+    self.assertEqual(hint.bytes_pushed, num_steps * 4 * 8)
+    self.assertEqual(hint.final_bytes, num_steps * 4 * 8)
+    self.assertGreater(hint.split_time, 0)
+    self.assertIn('reach_h', profile.report())
+
+  def test_probes_outside_the_context_are_not_profiled(self):
+    probes = probing.initialize(_SPEC)
+    entry = probes[specs.Stage.HINT][specs.Location.NODE]['h']
+    self.assertNotIn('profile', entry)
+
+
+class SplitStagesTest(absltest.TestCase):
+
+  def test_validation_can_be_skipped(self):
+    spec = {'m': (specs.Stage.INPUT, specs.Location.NODE, specs.Type.MASK)}
+    probes = probing.initialize(spec)
+    probing.push(probes, specs.Stage.INPUT, next_probe={'m': np.full(3, 0.5)})
+    probing.finalize(probes)
+    with self.assertRaises(probing.ProbeError):
+      probing.split_stages(probes, spec)
+    inputs, _, _ = probing.split_stages(probes, spec, validate=False)
+    self.assertEqual(inputs[0].data.shape, (1, 3))
+
+
+class DataPointTest(absltest.TestCase):
+
+  def test_metadata_is_interned(self):
+    dp = probing.DataPoint(b'pi', specs.Location.NODE, specs.Type.POINTER,
+                           np.zeros(3))
+    self.assertIs(dp.name, sys.intern('pi'))
+    self.assertIs(dp.location, specs.Location.NODE)
+
+  def test_pickles_round_trip(self):
+    dp = probing.CompactDataPoint('i', specs.Location.NODE, specs.Type.MASK_ONE,
+                                  np.arange(3), 5, 'float32')
+    loaded = pickle.loads(pickle.dumps(dp))
+    self.assertIsInstance(loaded, probing.CompactDataPoint)
+    self.assertEqual((loaded.name, loaded.num_classes, loaded.dtype),
+                     ('i', 5, 'float32'))
+    np.testing.assert_array_equal(loaded.data, dp.data)
+
+  def test_legacy_attr_state_is_restored(self):
+    for state in [('x', 'node', 'scalar', np.ones(2)),
+                  {'_name': 'x', '_location': 'node', '_type_': 'scalar',
+                   'data': np.ones(2)}]:
+      dp = probing.DataPoint.__new__(probing.DataPoint)
+      dp.__setstate__(state)
+      self.assertEqual((dp.name, dp.location, dp.type_),
+                       ('x', 'node', 'scalar'))
+      np.testing.assert_array_equal(dp.data, np.ones(2))
+
+  def test_with_data_keeps_class(self):
+    dp = probing.CompactDataPoint('i', specs.Location.NODE, specs.Type.MASK_ONE,
+                                  np.arange(3), 5)
+    copy = dp.with_data(np.zeros(3))
+    self.assertIsInstance(copy, probing.CompactDataPoint)
+    self.assertEqual(copy.num_classes, 5)
+    np.testing.assert_array_equal(dp.data, np.arange(3))
+
+
+class CompactTest(absltest.TestCase):
+
+  def test_mask_one_becomes_indices(self):
+    data = np.zeros((3, 2, 5))
+    data[0, :, 1] = 1
+    data[1, :, 4] = 1  # The last step is all-zero, as padding is.
+    dp = probing.DataPoint('i', specs.Location.NODE, specs.Type.MASK_ONE, data)
+    compact = probing.compact(dp)
+    self.assertIsInstance(compact, probing.CompactDataPoint)
+    self.assertEqual(compact.data.dtype, np.int16)
+    np.testing.assert_array_equal(compact.data, [[1, 1], [4, 4], [-1, -1]])
+    expanded = probing.expand(compact)
+    self.assertEqual(expanded.data.dtype, data.dtype)
+    np.testing.assert_array_equal(expanded.data, data)
+
+  def test_masks_and_pointers_are_cast(self):
+    mask = probing.DataPoint('m', specs.Location.NODE, specs.Type.MASK,
+                             np.array([0., 1., -1.]))
+    pointer = probing.DataPoint('p', specs.Location.NODE, specs.Type.POINTER,
+                                np.array([0., 2., 1.]))
+    self.assertEqual(probing.compact(mask).data.dtype, np.int8)
+    self.assertEqual(probing.compact(pointer).data.dtype, np.int16)
+    for dp in [mask, pointer]:
+      np.testing.assert_array_equal(probing.expand(probing.compact(dp)).data,
+                                    dp.data)
+
+  def test_scalars_are_unchanged(self):
+    dp = probing.DataPoint('x', specs.Location.NODE, specs.Type.SCALAR,
+                           np.array([0.5, 1.]))
+    self.assertIs(probing.compact(dp), dp)
+
+
+class PermutationTest(absltest.TestCase):
+
+  def test_example(self):
+    P, M = probing.predecessor_to_cyclic_predecessor_and_first(
+        np.array([2., 1., 1.]))
+    np.testing.assert_array_equal(P, [[0, 0, 1], [1, 0, 0], [0, 1, 0]])
+    np.testing.assert_array_equal(M, [0, 1, 0])
+    self.assertEqual(P.dtype, np.float32)
+
+  def test_numpy_matches_jax_on_batches(self):
+    rng = np.random.default_rng(0)
+    pointers = np.zeros((3, 5, 7))
+    for index in np.ndindex(pointers.shape[:-1]):
+      order = rng.permutation(7)
+      pointers[index][order] = np.concatenate([order[:1], order[:-1]])
+    pointers[0, 0] = rng.integers(0, 7, size=7)  # Not a linear order.
+    expected = probing._jax_predecessor_to_cyclic_predecessor_and_first()(
+        pointers)
+    actual = probing._np_predecessor_to_cyclic_predecessor_and_first(pointers)
+    for x, y in zip(actual, expected):
+      self.assertEqual(x.dtype, y.dtype)
+      np.testing.assert_array_equal(x, y)
+
+
+class PytreeTest(absltest.TestCase):
+
+  def test_data_points_are_pytrees(self):
+    import jax  # pylint: disable=g-import-not-at-top
+    probing.register_pytree()
+    dp = probing.DataPoint('x', specs.Location.NODE, specs.Type.SCALAR,
+                           np.ones(3))
+    doubled = jax.tree_util.tree_map(lambda x: 2 * x, [dp])
+    self.assertEqual(doubled[0].name, 'x')
+    np.testing.assert_array_equal(doubled[0].data, 2 * np.ones(3))
+
+
+if __name__ == '__main__':
+  absltest.main()
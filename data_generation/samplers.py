@@ -17,16 +17,24 @@
 
 import abc
 import collections
+import copy
+import functools
+import hashlib
 import inspect
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
 import types
 
-from typing import Any, Callable, List, Optional, Tuple
+from typing import Any, Callable, List, Optional, Tuple, Union
 from absl import logging
 
 import algorithms
+from algorithms import graphs_batched
 import probing
 import specs
-import jax
 import numpy as np
 
 
@@ -41,6 +49,30 @@ Features = collections.namedtuple('Features', ['inputs', 'hints', 'lengths'])
 FeaturesChunked = collections.namedtuple(
     'Features', ['inputs', 'hints', 'is_first', 'is_last'])
 Feedback = collections.namedtuple('Feedback', ['features', 'outputs'])
+# Unpadded hints of a batch: the `data` of each hint `DataPoint` holds the
+# trajectories of all samples concatenated along the time axis (with no batch
+# axis), and the steps of sample `i` are `data[offsets[i]:offsets[i + 1]]`.
+RaggedHints = collections.namedtuple('RaggedHints', ['hints', 'offsets'])
+
+# Upper bounds on the number of hint steps of an algorithm, as a function of the
+# number of nodes. Used instead of an empirical estimate of `max_steps` when
+# sampling on the fly; batches are only padded to it with `pad_to_max_steps`.
+# The bounds for shortest paths assume non-negative edge weights.
+_MAX_HINT_STEPS = types.MappingProxyType({
+    'dfs': lambda n: 3 * n,  # one push per root, discovery, visit and finish
+    'bfs': lambda n: n,
+    'bellman_ford': lambda n: n,
+    'dijkstra': lambda n: n + 1,
+    'mst_prim': lambda n: n + 1,
+    'floyd_warshall': lambda n: n,
+})
+
+# Number of samples per shard when sampling with `num_workers`. This must not
+# depend on the number of workers, so that sharded datasets are reproducible.
+_SHARD_SIZE = 100
+
+# How often `PrefetchIterator` checks that its worker is alive while waiting.
+_PREFETCH_POLL_SECONDS = 1.0
 
 # CLRS-30 baseline spec.
 CLRS30 = types.MappingProxyType({
@@ -72,6 +104,17 @@ class Sampler(abc.ABC):
       num_samples: int,
       *args,
       seed: Optional[int] = None,
+      num_workers: Optional[int] = None,
+      ragged_hints: bool = False,
+      epoch_shuffle: bool = False,
+      cache_dir: Optional[str] = None,
+      compact: bool = False,
+      validation: str = probing.Validation.FULL,
+      validation_samples: int = 100,
+      hints: Optional[List[str]] = None,
+      batched: bool = False,
+      pad_to_max_steps: bool = False,
+      delta_hints: bool = False,
       **kwargs,
   ):
     """Initializes a `Sampler`.
@@ -85,88 +128,350 @@ class Sampler(abc.ABC):
         If -1, samples are generated on the fly with each call to `next`.
       *args: Algorithm args.
       seed: RNG seed.
+      num_workers: If set, batches are split into shards of `_SHARD_SIZE`
+        samples, each sampled with its own RNG seeded from the sampler's RNG,
+        and shards are processed by a pool of `num_workers` processes. The
+        samples only depend on `seed`, not on `num_workers`; they differ from
+        the ones obtained with `num_workers=None`. The pool is started on
+        first use and kept until `close` is called (or the sampler is used as
+        a context manager).
+      ragged_hints: If True, hints are stored and returned as `RaggedHints`
+        instead of being zero-padded to the longest trajectory. Use
+        `pad_ragged_hints` to pad a batch when needed.
+      epoch_shuffle: If True (and `num_samples` is positive), the dataset is
+        shuffled once per epoch and `next` returns consecutive slices of it,
+        which are views rather than copies. Each sample is then returned once
+        per epoch, and the last incomplete batch of an epoch is dropped.
+      cache_dir: If set (which requires a positive `num_samples`), the dataset
+        is stored in this directory as one file, keyed by a hash of the
+        sampler configuration, the RNG state and the source code of the
+        algorithm, sampler and probing modules, and is reloaded (advancing the
+        RNG as if it had been sampled) by samplers with the same key. Samples
+        drawn on the fly are not cached, as each call to `next` would make a
+        file; cache the whole stream instead (see `construct_data.py`).
+      compact: If True, mask, mask_one, categorical and pointer probes are
+        stored and returned as `probing.CompactDataPoint`s with small integer
+        dtypes (see `probing.compact`). Use `expand_feedback` to recover the
+        one-hot float data.
+      validation: A `probing.Validation` level for the probe data checks of
+        `probing.split_stages`.
+      validation_samples: With `probing.Validation.SAMPLED`, only the first
+        `validation_samples` samples of the sampler are checked.
+      hints: If set, only these hint probes are recorded and returned (see
+        `probing.recording`); the others are neither copied nor stored.
+      batched: If True and the algorithm has a batched executor (see
+        `algorithms.graphs_batched`), each batch is unrolled by the executor at
+        once instead of graph by graph. The data is identical, but probes are
+        not validated. Sharded (`num_workers`) and ragged sampling still
+        unroll graph by graph.
+      pad_to_max_steps: If True, batches sampled on the fly have their hints
+        padded to `max_steps` rather than to their longest trajectory, so
+        that all batches have the same shape (e.g. for jitted consumers).
+        Algorithms with no known bound on their hint length are always padded
+        to the empirical estimate of `max_steps`.
+      delta_hints: If True, hints are recorded as `probing.DeltaTrajectory`s
+        (see `probing.recording`), which keep the trajectories of a batch
+        small until they are batched (and while they are sent back from
+        shards). Batches are the same as without it. Batched executors do
+        not record per-graph trajectories, so this has no effect there.
       **kwargs: Algorithm kwargs.
     """
 
     # Use `RandomState` to ensure deterministic sampling across Numpy versions.
     self._rng = np.random.RandomState(seed)
+    spec = probing.filter_hints(spec, hints)
+    self._hint_names = hints
     self._spec = spec
     self._num_samples = num_samples
     self._algorithm = algorithm
     self._args = args
     self._kwargs = kwargs
+    self._num_workers = num_workers
+    self._pool = None
+    if cache_dir is not None and num_samples < 0:
+      raise ValueError('cache_dir requires a pre-generated dataset; samples '
+                       'drawn on the fly are not cached.')
+    self._ragged_hints = ragged_hints
+    self._epoch_shuffle = epoch_shuffle
+    self._cache_dir = cache_dir
+    self._compact = compact
+    self._validation = validation
+    self._validation_samples = validation_samples
+    self._batched = batched
+    self._pad_to_max_steps = pad_to_max_steps
+    self._delta_hints = delta_hints
+    self._num_unrolled = 0  # Samples unrolled so far, to decide validation.
 
     if num_samples < 0:
       logging.warning('Sampling dataset on-the-fly, unlimited samples.')
-      # Just get an initial estimate of max hint length
-      self.max_steps = -1
-      for _ in range(1000):
-        data = self._sample_data(*args, **kwargs)
-        _, probes = algorithm(*data)
-        _, _, hint = probing.split_stages(probes, spec)
-        for dp in hint:
-          assert dp.data.shape[1] == 1  # batching axis
-          if dp.data.shape[0] > self.max_steps:
-            self.max_steps = dp.data.shape[0]
+      self.max_steps = self._max_hint_steps(*args, **kwargs)
+      if self.max_steps is None:
+        # Just get an initial estimate of max hint length
+        self._pad_to_max_steps = True
+        self.max_steps = -1
+        for _ in range(1000):
+          data = self._sample_data(*args, **kwargs)
+          with probing.recording(hints=hints):
+            _, probes = algorithm(*data)
+          _, _, hint = probing.split_stages(probes, spec,
+                                            validate=self._next_validate())
+          for dp in hint:
+            assert dp.data.shape[1] == 1  # batching axis
+            if dp.data.shape[0] > self.max_steps:
+              self.max_steps = dp.data.shape[0]
     else:
       logging.info('Creating a dataset with %i samples.', num_samples)
       (self._inputs, self._outputs, self._hints,
        self._lengths) = self._make_batch(num_samples, spec, 0, algorithm, *args,
                                          **kwargs)
+      # Position of the next batch in the current epoch; starting past the
+      # end makes the first call to `next` shuffle the dataset.
+      self._epoch_pos = num_samples
+
+  def _max_hint_steps(self, *args, **kwargs) -> Optional[int]:
+    """Known upper bound on the hint length, or `None` if there is none."""
+    bound = _MAX_HINT_STEPS.get(getattr(self._algorithm, '__name__', None))
+    if bound is None:
+      return None
+    length = inspect.signature(self._sample_data).bind(
+        *args, **kwargs).arguments['length']
+    return bound(length)
 
   def _make_batch(self, num_samples: int, spec: specs.Spec, min_length: int,
                   algorithm: Algorithm, *args, **kwargs):
+    """Generate a batch of data, or load it from `cache_dir`."""
+    if self._cache_dir is None:
+      return self._make_batch_uncached(num_samples, spec, min_length,
+                                       algorithm, *args, **kwargs)
+
+    key = self._batch_cache_key(num_samples, spec, min_length, algorithm,
+                                *args, **kwargs)
+    path = os.path.join(self._cache_dir, key + '.pkl')
+    if os.path.exists(path):
+      with open(path, 'rb') as f:
+        batch, rng_state = pickle.load(f)
+      self._rng.set_state(rng_state)
+      self._num_unrolled += num_samples
+      return batch
+
+    batch = self._make_batch_uncached(num_samples, spec, min_length, algorithm,
+                                      *args, **kwargs)
+    os.makedirs(self._cache_dir, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+      pickle.dump((batch, self._rng.get_state()), f,
+                  protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return batch
+
+  def _batch_cache_key(self, num_samples: int, spec: specs.Spec,
+                       min_length: int, algorithm: Algorithm, *args,
+                       **kwargs) -> str:
+    """Hash of everything that determines the output of `_make_batch`."""
+    _, rng_keys, rng_pos, has_gauss, cached_gaussian = self._rng.get_state()
+    config = (
+        type(self).__qualname__, algorithm.__name__, sorted(spec.items()),
+        num_samples, min_length, args, sorted(kwargs.items()),
+        self._num_workers is None, self._ragged_hints, self._compact,
+        self._validation, self._validation_samples, self._num_unrolled,
+        rng_pos, has_gauss, cached_gaussian,
+    )
+    digest = hashlib.sha256()
+    digest.update(_source_version(algorithm, type(self)).encode())
+    digest.update(repr(config).encode())
+    digest.update(rng_keys.tobytes())
+    return digest.hexdigest()
+
+  def _make_batch_uncached(self, num_samples: int, spec: specs.Spec,
+                           min_length: int, algorithm: Algorithm, *args,
+                           **kwargs):
     """Generate a batch of data."""
+    executor = graphs_batched.EXECUTORS.get(algorithm) if self._batched else None
+    if (executor is not None and self._num_workers is None and
+        not self._ragged_hints):
+      inputs, outputs, hints, lengths = self._unroll_batched(
+          num_samples, spec, min_length, executor, *args, **kwargs)
+    else:
+      if self._num_workers is None:
+        inputs, outputs, hints = self._sample_trajectories(
+            num_samples, spec, algorithm, *args, **kwargs)
+      else:
+        inputs, outputs, hints = self._sample_trajectories_sharded(
+            num_samples, spec, algorithm, *args, **kwargs)
+
+      # Batch and pad trajectories to max(T).
+      inputs = _batch_io(inputs)
+      outputs = _batch_io(outputs)
+      if self._ragged_hints:
+        hints, lengths = _batch_hints_ragged(hints)
+      else:
+        hints, lengths = _batch_hints(hints, min_length)
+    if self._compact:
+      inputs = [probing.compact(dp) for dp in inputs]
+      outputs = [probing.compact(dp) for dp in outputs]
+      if self._ragged_hints:
+        hints = RaggedHints([probing.compact(dp) for dp in hints.hints],
+                            hints.offsets)
+      else:
+        hints = [probing.compact(dp) for dp in hints]
+    return inputs, outputs, hints, lengths
+
+  def _unroll_batched(self, num_samples: int, spec: specs.Spec,
+                      min_length: int, executor: Algorithm, *args, **kwargs):
+    """Samples a batch and unrolls it with a `graphs_batched` executor."""
+    samples = self._sample_batch(num_samples, *args, **kwargs)
+    batch = [np.stack([x.todense() if isinstance(x, algorithms.CSRGraph) else x
+                       for x in arg]) for arg in zip(*samples)]
+    _, probes = executor(*batch)
+    self._num_unrolled += num_samples
+    inputs, outputs, hints = ([dp for dp in dps if dp.name in spec]
+                              for dps in probes[:3])
+    num_steps = max(min_length, int(probes.lengths.max()))
+    hints = [dp.with_data(np.pad(
+        dp.data, [(0, num_steps - dp.data.shape[0])] + [(0, 0)] *
+        (dp.data.ndim - 1))) for dp in hints]
+    return inputs, outputs, hints, probes.lengths
+
+  def _sample_trajectories(
+      self, num_samples: int, spec: specs.Spec, algorithm: Algorithm, *args,
+      **kwargs) -> Tuple[Trajectories, Trajectories, Trajectories]:
+    """Samples and unrolls the algorithm, without batching the results."""
     inputs = []
     outputs = []
     hints = []
 
-    for _ in range(num_samples):
-      data = self._sample_data(*args, **kwargs)
-      _, probes = algorithm(*data)
-      inp, outp, hint = probing.split_stages(probes, spec)
+    for data in self._sample_batch(num_samples, *args, **kwargs):
+      with probing.recording(hints=self._hint_names, delta=self._delta_hints):
+        _, probes = algorithm(*data)
+      inp, outp, hint = probing.split_stages(
+          probes, spec, validate=self._next_validate())
       inputs.append(inp)
       outputs.append(outp)
       hints.append(hint)
       if len(hints) % 1000 == 0:
         logging.info('%i samples created', len(hints))
-
-    # Batch and pad trajectories to max(T).
-    inputs = _batch_io(inputs)
-    outputs = _batch_io(outputs)
-    hints, lengths = _batch_hints(hints, min_length)
-    return inputs, outputs, hints, lengths
-
-  def next(self, batch_size: Optional[int] = None) -> Feedback:
+    return inputs, outputs, hints
+
+  def _next_validate(self) -> bool:
+    """Whether to validate the probes of the next unrolled sample."""
+    validate = (self._validation == probing.Validation.FULL or
+                (self._validation == probing.Validation.SAMPLED and
+                 self._num_unrolled < self._validation_samples))
+    self._num_unrolled += 1
+    return validate
+
+  def _sample_trajectories_sharded(
+      self, num_samples: int, spec: specs.Spec, algorithm: Algorithm, *args,
+      **kwargs) -> Tuple[Trajectories, Trajectories, Trajectories]:
+    """Like `_sample_trajectories`, but over shards with derived seeds."""
+    shard_sizes = [min(_SHARD_SIZE, num_samples - start)
+                   for start in range(0, num_samples, _SHARD_SIZE)]
+    base_seed = self._rng.randint(2**32, dtype=np.uint32)
+    shard_seeds = [int(seq.generate_state(1)[0]) for seq in
+                   np.random.SeedSequence(base_seed).spawn(len(shard_sizes))]
+    shard_args = [(self, shard_seed, shard_size, spec, algorithm, args, kwargs,
+                   start)
+                  for shard_seed, shard_size, start in zip(
+                      shard_seeds, shard_sizes,
+                      range(0, num_samples, _SHARD_SIZE))]
+
+    if self._num_workers > 1 and len(shard_args) > 1:
+      shards = self._worker_pool().starmap(_sample_shard, shard_args)
+    else:
+      shards = [_sample_shard(*x) for x in shard_args]
+
+    self._num_unrolled += num_samples
+    inputs, outputs, hints = [], [], []
+    for shard_inputs, shard_outputs, shard_hints in shards:
+      inputs.extend(shard_inputs)
+      outputs.extend(shard_outputs)
+      hints.extend(shard_hints)
+    return inputs, outputs, hints
+
+  def _worker_pool(self):
+    """The pool of `num_workers` processes, started on first use."""
+    if self._pool is None:
+      # Spawn rather than fork, as forking a process that has initialised JAX
+      # or TensorFlow may deadlock.
+      context = multiprocessing.get_context('spawn')
+      self._pool = context.Pool(self._num_workers)
+    return self._pool
+
+  def close(self) -> None:
+    """Stops the worker pool of a sharded sampler, if it was started."""
+    pool = getattr(self, '_pool', None)
+    if pool is not None:
+      self._pool = None
+      pool.terminate()
+      pool.join()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def __del__(self):
+    self.close()
+
+  def __getstate__(self):
+    # The pool stays in this process; copies (e.g. in shards) do not own it.
+    state = self.__dict__.copy()
+    state['_pool'] = None
+    return state
+
+  def next(self, batch_size: Optional[int] = None,
+           out: Optional[Feedback] = None) -> Feedback:
     """Subsamples trajectories from the pre-generated dataset.
 
     Args:
       batch_size: Optional batch size. If `None`, returns entire dataset.
+      out: Optional buffers from `allocate_batch(batch_size)`. If given, the
+        batch is written into them instead of newly allocated arrays.
 
     Returns:
-      Subsampled trajectories.
+      Subsampled trajectories. Hints are `RaggedHints` if the sampler was
+      built with `ragged_hints`.
     """
+    if out is not None:
+      return self._next_into(batch_size, out)
+
     if batch_size:
       if self._num_samples < 0:  # generate on the fly
         inputs, outputs, hints, lengths = self._make_batch(
-            batch_size, self._spec, self.max_steps,
+            batch_size, self._spec,
+            self.max_steps if self._pad_to_max_steps else 0,
             self._algorithm, *self._args, **self._kwargs)
-        if hints[0].data.shape[0] > self.max_steps:
+        if np.max(lengths) > self.max_steps:
           logging.warning('Increasing hint lengh from %i to %i',
-                          self.max_steps, hints[0].data.shape[0])
-          self.max_steps = hints[0].data.shape[0]
+                          self.max_steps, np.max(lengths))
+          self.max_steps = int(np.max(lengths))
       else:
         if batch_size > self._num_samples:
           raise ValueError(
               f'Batch size {batch_size} > dataset size {self._num_samples}.')
 
-        # Returns a fixed-size random batch.
-        indices = self._rng.choice(self._num_samples, (batch_size,),
-                                   replace=True)
-        inputs = _subsample_data(self._inputs, indices, axis=0)
-        outputs = _subsample_data(self._outputs, indices, axis=0)
-        hints = _subsample_data(self._hints, indices, axis=1)
-        lengths = self._lengths[indices]
+        if self._epoch_shuffle:
+          # Returns the next slice of the shuffled dataset.
+          start, stop = self._next_epoch_slice(batch_size)
+          inputs = _slice_data(self._inputs, start, stop, axis=0)
+          outputs = _slice_data(self._outputs, start, stop, axis=0)
+          if self._ragged_hints:
+            hints = _slice_ragged_hints(self._hints, start, stop)
+          else:
+            hints = _slice_data(self._hints, start, stop, axis=1)
+          lengths = self._lengths[start:stop]
+        else:
+          # Returns a fixed-size random batch.
+          indices = self._rng.choice(self._num_samples, (batch_size,),
+                                     replace=True)
+          inputs = _subsample_data(self._inputs, indices, axis=0)
+          outputs = _subsample_data(self._outputs, indices, axis=0)
+          if self._ragged_hints:
+            hints = _subsample_ragged_hints(self._hints, indices)
+          else:
+            hints = _subsample_data(self._hints, indices, axis=1)
+          lengths = self._lengths[indices]
 
     else:
       # Returns the full dataset.
@@ -178,10 +483,111 @@ class Sampler(abc.ABC):
 
     return Feedback(Features(inputs, hints, lengths), outputs)
 
+  def allocate_batch(self, batch_size: int) -> Feedback:
+    """Allocates buffers for `batch_size` samples, to be passed to `next`."""
+    if self._num_samples < 0 or self._ragged_hints:
+      raise ValueError('Preallocated batches require a pre-generated dataset '
+                       'with padded hints.')
+
+    def _allocate(trajectory, axis):
+      allocated = []
+      for dp in trajectory:
+        shape = list(dp.data.shape)
+        shape[axis] = batch_size
+        allocated.append(dp.with_data(np.empty(shape, dtype=dp.data.dtype)))
+      return allocated
+
+    return Feedback(
+        Features(_allocate(self._inputs, 0), _allocate(self._hints, 1),
+                 np.empty(batch_size, dtype=self._lengths.dtype)),
+        _allocate(self._outputs, 0))
+
+  def _next_into(self, batch_size: int, out: Feedback) -> Feedback:
+    """Like `next`, but writes the batch into preallocated buffers."""
+    if self._num_samples < 0 or self._ragged_hints:
+      raise ValueError('Preallocated batches require a pre-generated dataset '
+                       'with padded hints.')
+    if batch_size != len(out.features.lengths):
+      raise ValueError(f'Batch size {batch_size} does not match the '
+                       f'preallocated size {len(out.features.lengths)}.')
+    if batch_size > self._num_samples:
+      raise ValueError(
+          f'Batch size {batch_size} > dataset size {self._num_samples}.')
+
+    if self._epoch_shuffle:
+      start, stop = self._next_epoch_slice(batch_size)
+      indices = slice(start, stop)
+    else:
+      indices = self._rng.choice(self._num_samples, (batch_size,),
+                                 replace=True)
+    _subsample_data(self._inputs, indices, axis=0, out=out.features.inputs)
+    _subsample_data(self._outputs, indices, axis=0, out=out.outputs)
+    _subsample_data(self._hints, indices, axis=1, out=out.features.hints)
+    out.features.lengths[:] = self._lengths[indices]
+    return out
+
+  def _next_epoch_slice(self, batch_size: int) -> Tuple[int, int]:
+    """Returns the next batch's range, reshuffling at the end of an epoch."""
+    if self._epoch_pos + batch_size > self._num_samples:
+      perm = self._rng.permutation(self._num_samples)
+      self._inputs = _subsample_data(self._inputs, perm, axis=0)
+      self._outputs = _subsample_data(self._outputs, perm, axis=0)
+      if self._ragged_hints:
+        self._hints = _subsample_ragged_hints(self._hints, perm)
+      else:
+        self._hints = _subsample_data(self._hints, perm, axis=1)
+      self._lengths = self._lengths[perm]
+      self._epoch_pos = 0
+    start = self._epoch_pos
+    self._epoch_pos += batch_size
+    return start, self._epoch_pos
+
   @abc.abstractmethod
   def _sample_data(self, length: int, *args, **kwargs) -> List[_Array]:
     pass
 
+  def _sample_batch(self, num_samples: int, *args,
+                    **kwargs) -> List[List[_Array]]:
+    """Samples the algorithm args for `num_samples` unrolls.
+
+    Subclasses whose inputs can be drawn for a whole batch at once (e.g. with
+    `_random_er_graph_batch`) should override this; it must accept the same
+    arguments as `_sample_data`.
+
+    Args:
+      num_samples: Number of samples to draw.
+      *args: `_sample_data` args.
+      **kwargs: `_sample_data` kwargs.
+
+    Returns:
+      A |num_samples| list of algorithm args.
+    """
+    return [self._sample_data(*args, **kwargs) for _ in range(num_samples)]
+
+  def _rejection_sample(self, num_samples: int, draw: Callable[[int], _Array],
+                        accept: Callable[[_Array], _Array],
+                        min_block_size: int = 64) -> _Array:
+    """Vectorised rejection sampling.
+
+    Args:
+      num_samples: Number of accepted candidates to return.
+      draw: Draws `n` candidates, stacked along the leading axis.
+      accept: Vectorised predicate, returning a boolean mask over the leading
+        axis of a block of candidates.
+      min_block_size: Minimum number of candidates drawn at once.
+
+    Returns:
+      The first `num_samples` accepted candidates, in the order drawn.
+    """
+    accepted = [draw(0)]
+    num_accepted = 0
+    while num_accepted < num_samples:
+      block = draw(max(min_block_size, 4 * (num_samples - num_accepted)))
+      block = block[accept(block)]
+      accepted.append(block)
+      num_accepted += block.shape[0]
+    return np.concatenate(accepted)[:num_samples]
+
   def _random_sequence(self, length, low=0.0, high=1.0):
     """Random sequence."""
     return self._rng.uniform(low=low, high=high, size=(length,))
@@ -191,8 +597,14 @@ class Sampler(abc.ABC):
     return self._rng.randint(0, high=chars, size=(length,))
 
   def _random_er_graph(self, nb_nodes, p=0.5, directed=False, acyclic=False,
-                       weighted=False, low=0, high=10, integer_based=True, self_edges_weighted=False):
-    """Random Erdos-Renyi graph."""
+                       weighted=False, low=0, high=10, integer_based=True, self_edges_weighted=False,
+                       sparse=False):
+    """Random Erdos-Renyi graph; an `algorithms.CSRGraph` if `sparse`."""
+    if sparse:
+      return self._random_er_graph_sparse(
+          nb_nodes, p=p, directed=directed, acyclic=acyclic,
+          weighted=weighted, low=low, high=high, integer_based=integer_based,
+          self_edges_weighted=self_edges_weighted)
 
     mat = self._rng.binomial(1, p, size=(nb_nodes, nb_nodes))
     if not directed:
@@ -220,6 +632,162 @@ class Sampler(abc.ABC):
 
     return mat
 
+  def _random_positions(self, num_positions, p):
+    """Sorted positions in `range(num_positions)`, each kept with prob. `p`.
+
+    Draws the gaps between kept positions from a geometric distribution, so
+    the cost is proportional to the number of positions kept rather than to
+    `num_positions`.
+
+    Args:
+      num_positions: Number of candidate positions.
+      p: Probability of keeping each position.
+
+    Returns:
+      A sorted integer array of the kept positions.
+    """
+    if p <= 0 or num_positions == 0:
+      return np.zeros(0, dtype=np.int64)
+    if p >= 1:
+      return np.arange(num_positions)
+    blocks = []
+    last = -1
+    while last < num_positions:
+      expected = p * (num_positions - last)
+      gaps = self._rng.geometric(p, size=int(expected + 4 * np.sqrt(expected)) + 16)
+      block = last + np.cumsum(gaps)
+      blocks.append(block[block < num_positions])
+      last = block[-1]
+    return np.concatenate(blocks)
+
+  def _random_er_graph_sparse(self, nb_nodes, p=0.5, directed=False,
+                              acyclic=False, weighted=False, low=0, high=10,
+                              integer_based=True, self_edges_weighted=False):
+    """Random Erdos-Renyi graph in CSR form, in O(nodes + edges).
+
+    Follows the same distribution as the dense `_random_er_graph`: an
+    undirected edge needs both of its directed draws (probability `p**2`),
+    self-loops have probability `p`, and zero-weight edges are dropped.
+
+    Args:
+      nb_nodes: Number of nodes N.
+      p: Edge probability.
+      directed: Whether the graph is directed.
+      acyclic: Whether a directed graph should be acyclic.
+      weighted: Whether to multiply edges by random integer weights.
+      low: Lowest weight.
+      high: Highest weight.
+      integer_based: Whether undirected weights are symmetrised with `max`
+        (as opposed to a geometric mean).
+      self_edges_weighted: Whether to keep weights on the diagonal.
+
+    Returns:
+      An `algorithms.CSRGraph` with N nodes.
+    """
+    n = nb_nodes
+    if directed and not acyclic:
+      rows, cols = np.divmod(self._random_positions(n * n, p), n)
+    else:
+      # Pairs i < j, enumerated row by row.
+      row_sizes = np.arange(n - 1, -1, -1)
+      row_starts = np.cumsum(row_sizes) - row_sizes
+      pos = self._random_positions(n * (n - 1) // 2, p if directed else p * p)
+      rows = np.searchsorted(row_starts, pos, side='right') - 1
+      cols = pos - row_starts[rows] + rows + 1
+
+    if weighted:
+      weights = self._rng.random_integers(low=low, high=high, size=rows.shape)
+      if not directed:
+        other = self._rng.random_integers(low=low, high=high, size=rows.shape)
+        if not integer_based:
+          weights = np.sqrt(weights * other + 1e-3)  # Protect underflow
+        else:
+          weights = np.maximum(weights, other)
+    else:
+      weights = np.ones(rows.shape, dtype=int)
+
+    if not directed:
+      loops, = np.nonzero(self._rng.binomial(1, p, size=n))
+      if not weighted:
+        loop_weights = np.ones(loops.shape, dtype=weights.dtype)
+      elif self_edges_weighted:
+        loop_weights = self._rng.random_integers(
+            low=low, high=high, size=loops.shape)
+        if not integer_based:
+          loop_weights = np.sqrt(loop_weights * loop_weights + 1e-3)
+      else:
+        loop_weights = np.zeros(loops.shape, dtype=weights.dtype)
+      rows, cols = (np.concatenate([rows, cols, loops]),
+                    np.concatenate([cols, rows, loops]))
+      weights = np.concatenate([weights, weights, loop_weights])
+    elif acyclic:
+      # To allow nontrivial solutions
+      inv_perm = np.argsort(self._rng.permutation(n))
+      rows, cols = inv_perm[rows], inv_perm[cols]
+    elif weighted and not self_edges_weighted:
+      weights[rows == cols] = 0
+    if weighted and not self_edges_weighted:
+      weights = weights.astype(float)  # As the dense diagonal mask does.
+
+    keep = weights != 0
+    rows, cols, weights = rows[keep], cols[keep], weights[keep]
+    order = np.lexsort((cols, rows))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))])
+    return algorithms.CSRGraph(indptr, cols[order], weights[order])
+
+  def _random_er_graph_batch(self, batch_size, nb_nodes, p=0.5,
+                             directed=False, acyclic=False, weighted=False,
+                             low=0, high=10, integer_based=True,
+                             self_edges_weighted=False):
+    """Batch of random Erdos-Renyi graphs, of shape [B, N, N].
+
+    Follows the same rules as `_random_er_graph`, but draws the edges (and
+    weights) of every graph in the batch with a single RNG call.
+
+    Args:
+      batch_size: Number of graphs B.
+      nb_nodes: Number of nodes N per graph.
+      p: Edge probability; either a scalar or one value per graph.
+      directed: Whether the graphs are directed.
+      acyclic: Whether directed graphs should be acyclic.
+      weighted: Whether to multiply edges by random integer weights.
+      low: Lowest weight.
+      high: Highest weight.
+      integer_based: Whether undirected weights are symmetrised with `max`
+        (as opposed to a geometric mean).
+      self_edges_weighted: Whether to keep weights on the diagonal.
+
+    Returns:
+      An array of shape [B, N, N] of adjacency (or weight) matrices.
+    """
+    p = np.reshape(p, (-1, 1, 1))
+    mat = self._rng.binomial(1, p, size=(batch_size, nb_nodes, nb_nodes))
+    if not directed:
+      mat *= np.transpose(mat, (0, 2, 1))
+    elif acyclic:
+      mat = np.triu(mat, k=1)
+      # To allow nontrivial solutions
+      perm = np.argsort(self._rng.uniform(size=(batch_size, nb_nodes)), axis=1)
+      batch_idx = np.arange(batch_size)[:, None, None]
+      mat = mat[batch_idx, perm[:, :, None], perm[:, None, :]]
+    if weighted:
+      weights = self._rng.random_integers(
+          low=low, high=high, size=(batch_size, nb_nodes, nb_nodes))
+
+      if not directed:
+        if not integer_based:
+          weights *= np.transpose(weights, (0, 2, 1))
+          weights = np.sqrt(weights + 1e-3)  # Add epsilon to protect underflow
+        else:
+          weights = np.maximum(weights, np.transpose(weights, (0, 2, 1)))
+
+      if not self_edges_weighted:
+        weights = (np.ones((nb_nodes, nb_nodes)) - np.eye(nb_nodes)) * weights
+
+      mat = mat.astype(int) * weights
+
+    return mat
+
   def _random_community_graph(self, nb_nodes, k=4, p=0.5, eps=0.01,
                               directed=False, acyclic=False, weighted=False,
                               low=0.0, high=1.0):
@@ -267,14 +835,59 @@ class Sampler(abc.ABC):
     return mat
 
 
+@functools.lru_cache(maxsize=None)
+def _source_version(algorithm: Algorithm, sampler_class: type) -> str:
+  """Hash of the code that samples, unrolls and batches `algorithm`."""
+  digest = hashlib.sha256()
+  for obj in (inspect.getmodule(algorithm), graphs_batched,
+              inspect.getmodule(sampler_class), probing):
+    digest.update(inspect.getsource(obj).encode())
+  return digest.hexdigest()
+
+
+def source_version(name: str) -> str:
+  """Hash of the code that samples, unrolls and batches algorithm `name`."""
+  return _source_version(getattr(algorithms, name), SAMPLERS[name])
+
+
+def _sample_shard(
+    sampler: Sampler, seed: int, num_samples: int, spec: specs.Spec,
+    algorithm: Algorithm, args, kwargs, start: int,
+) -> Tuple[Trajectories, Trajectories, Trajectories]:
+  """Samples one shard of trajectories, with the shard's own RNG.
+
+  `start` is the position of the shard's first sample in the batch, so that
+  shards validate the same samples as a serial unroll would.
+  """
+  sampler = copy.copy(sampler)
+  sampler._rng = np.random.RandomState(seed)  # pylint:disable=protected-access
+  sampler._num_unrolled += start  # pylint:disable=protected-access
+  return sampler._sample_trajectories(  # pylint:disable=protected-access
+      num_samples, spec, algorithm, *args, **kwargs)
+
+
 def build_sampler(
     name: str,
     num_samples: int,
     *args,
     seed: Optional[int] = None,
+    num_workers: Optional[int] = None,
+    ragged_hints: bool = False,
+    epoch_shuffle: bool = False,
+    cache_dir: Optional[str] = None,
+    compact: bool = False,
+    validation: str = probing.Validation.FULL,
+    validation_samples: int = 100,
+    hints: Optional[List[str]] = None,
+    batched: bool = False,
+    pad_to_max_steps: bool = False,
+    delta_hints: bool = False,
     **kwargs,
 ) -> Tuple[Sampler, specs.Spec]:
-  """Builds a sampler. See `Sampler` documentation."""
+  """Builds a sampler. See `Sampler` documentation.
+
+  The returned spec only has the sampled hints, if `hints` is set.
+  """
 
   if name not in specs.SPECS or name not in SAMPLERS:
     raise NotImplementedError(f'No implementation of algorithm {name}.')
@@ -288,8 +901,109 @@ def build_sampler(
     logging.warning('Ignoring kwargs %s when building sampler class %s',
                     set(kwargs).difference(clean_kwargs), sampler_class)
   sampler = sampler_class(algorithm, spec, num_samples, seed=seed,
-                          *args, **clean_kwargs)
-  return sampler, spec
+                          num_workers=num_workers, ragged_hints=ragged_hints,
+                          epoch_shuffle=epoch_shuffle, cache_dir=cache_dir,
+                          compact=compact, validation=validation,
+                          validation_samples=validation_samples, hints=hints,
+                          batched=batched, pad_to_max_steps=pad_to_max_steps,
+                          delta_hints=delta_hints, *args, **clean_kwargs)
+  return sampler, probing.filter_hints(spec, hints)
+
+
+def _prefetch_worker(sampler: Sampler, batch_size: Optional[int], out_queue,
+                     stop) -> None:
+  """Puts `(True, sampler.next(batch_size))` in `out_queue` until `stop`."""
+  try:
+    while not stop.is_set():
+      batch = sampler.next(batch_size)
+      while not stop.is_set():
+        try:
+          out_queue.put((True, batch), timeout=0.1)
+          break
+        except queue.Full:
+          pass
+  except Exception as e:  # pylint: disable=broad-except
+    out_queue.put((False, e))
+
+
+class PrefetchIterator:
+  """Iterator over `sampler.next(batch_size)` batches, sampled ahead of time.
+
+  A single background worker (a thread, or a process if `use_process`) calls
+  `sampler.next` and keeps up to `depth` batches in a queue, so that sampling
+  overlaps with the consumer's work. As there is only one producer, batches
+  come in the same order as with serial calls to `sampler.next`.
+
+  The sampler must not be used directly while it is being prefetched from. In
+  a process, the worker samples from a copy of the sampler, whose RNG is then
+  not advanced in the parent. A sharded sampler (see `num_workers`) cannot be
+  prefetched in a process, as it starts its own worker pool.
+
+  Exceptions raised by `sampler.next` are re-raised by `next`; if the worker
+  dies without raising (e.g. a killed process), `next` raises `RuntimeError`.
+  """
+
+  def __init__(self, sampler: Sampler, batch_size: Optional[int] = None,
+               depth: int = 2, use_process: bool = False):
+    if depth < 1:
+      raise ValueError(f'Prefetch depth must be positive, got {depth}.')
+    if use_process:
+      ctx = multiprocessing.get_context('spawn')
+      self._queue = ctx.Queue(depth)
+      self._stop = ctx.Event()
+      self._worker = ctx.Process(
+          target=_prefetch_worker,
+          args=(sampler, batch_size, self._queue, self._stop), daemon=True)
+    else:
+      self._queue = queue.Queue(depth)
+      self._stop = threading.Event()
+      self._worker = threading.Thread(
+          target=_prefetch_worker,
+          args=(sampler, batch_size, self._queue, self._stop), daemon=True)
+    self._worker.start()
+
+  def __iter__(self):
+    return self
+
+  def __next__(self) -> Feedback:
+    if self._stop.is_set():
+      raise StopIteration
+    while True:
+      try:
+        ok, value = self._queue.get(timeout=_PREFETCH_POLL_SECONDS)
+        break
+      except queue.Empty:
+        if self._worker.is_alive():
+          continue
+      try:
+        # The worker may have put a last item just before exiting.
+        ok, value = self._queue.get(timeout=_PREFETCH_POLL_SECONDS)
+        break
+      except queue.Empty:
+        exitcode = getattr(self._worker, 'exitcode', None)
+        self.close()
+        raise RuntimeError(
+            f'Prefetch worker exited unexpectedly (exit code {exitcode}).'
+        ) from None
+    if not ok:
+      self.close()
+      raise value
+    return value
+
+  def close(self) -> None:
+    """Stops the worker and discards the prefetched batches."""
+    self._stop.set()
+    if isinstance(self._worker, threading.Thread):
+      self._worker.join()
+    else:
+      self._worker.terminate()
+      self._worker.join()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
 
 
 class SortingSampler(Sampler):
@@ -404,12 +1118,27 @@ class DfsSampler(Sampler):
       self,
       length: int,
       p: Tuple[float, ...] = (0.5,),
+      sparse: bool = False,
   ):
     graph = self._random_er_graph(
         nb_nodes=length, p=self._rng.choice(p),
-        directed=False, acyclic=False, weighted=False)
+        directed=False, acyclic=False, weighted=False, sparse=sparse)
     return [graph]
 
+  def _sample_batch(
+      self,
+      num_samples: int,
+      length: int,
+      p: Tuple[float, ...] = (0.5,),
+      sparse: bool = False,
+  ):
+    if sparse:
+      return super()._sample_batch(num_samples, length, p, sparse)
+    graphs = self._random_er_graph_batch(
+        num_samples, nb_nodes=length, p=self._rng.choice(p, (num_samples,)),
+        directed=False, acyclic=False, weighted=False)
+    return [[graph] for graph in graphs]
+
 
 class BfsSampler(Sampler):
   """BFS sampler."""
@@ -418,13 +1147,30 @@ class BfsSampler(Sampler):
       self,
       length: int,
       p: Tuple[float, ...] = (0.5,),
+      sparse: bool = False,
   ):
     graph = self._random_er_graph(
         nb_nodes=length, p=self._rng.choice(p),
-        directed=False, acyclic=False, weighted=False)
+        directed=False, acyclic=False, weighted=False, sparse=sparse)
     source_node = self._rng.choice(length)
     return [graph, source_node]
 
+  def _sample_batch(
+      self,
+      num_samples: int,
+      length: int,
+      p: Tuple[float, ...] = (0.5,),
+      sparse: bool = False,
+  ):
+    if sparse:
+      return super()._sample_batch(num_samples, length, p, sparse)
+    graphs = self._random_er_graph_batch(
+        num_samples, nb_nodes=length, p=self._rng.choice(p, (num_samples,)),
+        directed=False, acyclic=False, weighted=False)
+    source_nodes = self._rng.choice(length, (num_samples,))
+    return [[graph, source_node]
+            for graph, source_node in zip(graphs, source_nodes)]
+
 
 class TopoSampler(Sampler):
   """Topological Sorting sampler."""
@@ -484,6 +1230,7 @@ class BellmanFordSampler(Sampler):
       p: Tuple[float, ...] = (0.5,),
       low: float = 0,
       high: float = 10,
+      sparse: bool = False,
   ):
     graph = self._random_er_graph(
         nb_nodes=length,
@@ -492,10 +1239,35 @@ class BellmanFordSampler(Sampler):
         acyclic=False,
         weighted=True,
         low=low,
-        high=high)
+        high=high,
+        sparse=sparse)
     source_node = self._rng.choice(length)
     return [graph, source_node]
 
+  def _sample_batch(
+      self,
+      num_samples: int,
+      length: int,
+      p: Tuple[float, ...] = (0.5,),
+      low: float = 0,
+      high: float = 10,
+      sparse: bool = False,
+  ):
+    if sparse:
+      return super()._sample_batch(num_samples, length, p, low, high, sparse)
+    graphs = self._random_er_graph_batch(
+        num_samples,
+        nb_nodes=length,
+        p=self._rng.choice(p, (num_samples,)),
+        directed=False,
+        acyclic=False,
+        weighted=True,
+        low=low,
+        high=high)
+    source_nodes = self._rng.choice(length, (num_samples,))
+    return [[graph, source_node]
+            for graph, source_node in zip(graphs, source_nodes)]
+
 
 class DAGPathSampler(Sampler):
   """Sampler for DAG shortest paths."""
@@ -539,6 +1311,25 @@ class FloydWarshallSampler(Sampler):
         high=high)
     return [graph]
 
+  def _sample_batch(
+      self,
+      num_samples: int,
+      length: int,
+      p: Tuple[float, ...] = (0.5,),
+      low: float = 0,
+      high: float = 10,
+  ):
+    graphs = self._random_er_graph_batch(
+        num_samples,
+        nb_nodes=length,
+        p=self._rng.choice(p, (num_samples,)),
+        directed=False,
+        acyclic=False,
+        weighted=True,
+        low=low,
+        high=high)
+    return [[graph] for graph in graphs]
+
 
 class SccSampler(Sampler):
   """Sampler for strongly connected component (SCC) tasks."""
@@ -597,33 +1388,67 @@ class MatcherSampler(Sampler):
     haystack[embed_pos:embed_pos + length_needle] = needle
     return [haystack, needle]
 
+  def _sample_batch(
+      self,
+      num_samples: int,
+      length: int,
+      length_needle: Optional[int] = None,
+      chars: int = 4,
+  ):
+    if length_needle is not None and length_needle < 0:
+      # Needle lengths differ between samples.
+      return super()._sample_batch(num_samples, length, length_needle, chars)
+    if length_needle is None:
+      if length < 5:
+        length_needle = 1
+      else:
+        length_needle = length // 5
+    length_haystack = length - length_needle
+    needles = self._rng.randint(0, high=chars,
+                                size=(num_samples, length_needle))
+    haystacks = self._rng.randint(0, high=chars,
+                                  size=(num_samples, length_haystack))
+    embed_pos = self._rng.choice(length_haystack - length_needle,
+                                 (num_samples,))
+    haystacks[np.arange(num_samples)[:, None],
+              embed_pos[:, None] + np.arange(length_needle)] = needles
+    return [[haystack, needle]
+            for haystack, needle in zip(haystacks, needles)]
+
 
 class SegmentsSampler(Sampler):
   """Two-segment sampler of points from (U[0, 1], U[0, 1])."""
 
   def _sample_data(self, length: int, low: float = 0., high: float = 1.):
+    return self._sample_batch(1, length, low=low, high=high)[0]
+
+  def _sample_batch(self, num_samples: int, length: int, low: float = 0.,
+                    high: float = 1.):
     del length  # There are exactly four endpoints.
 
-    # Quick CCW check (ignoring collinearity) for rejection sampling
+    # Quick CCW check (ignoring collinearity) for rejection sampling,
+    # vectorised over the leading axis.
     def ccw(x_a, y_a, x_b, y_b, x_c, y_c):
       return (y_c - y_a) * (x_b - x_a) > (y_b - y_a) * (x_c - x_a)
-    def intersect(xs, ys):
-      return ccw(xs[0], ys[0], xs[2], ys[2], xs[3], ys[3]) != ccw(
-          xs[1], ys[1], xs[2], ys[2], xs[3], ys[3]) and ccw(
+    def intersect(points):
+      xs, ys = points[:, 0].T, points[:, 1].T
+      return (ccw(xs[0], ys[0], xs[2], ys[2], xs[3], ys[3]) != ccw(
+          xs[1], ys[1], xs[2], ys[2], xs[3], ys[3])) & (ccw(
               xs[0], ys[0], xs[1], ys[1], xs[2], ys[2]) != ccw(
-                  xs[0], ys[0], xs[1], ys[1], xs[3], ys[3])
+                  xs[0], ys[0], xs[1], ys[1], xs[3], ys[3]))
+    def draw(n):  # [n, 2 (x, y), 4 (endpoints)]
+      return self._rng.uniform(low=low, high=high, size=(n, 2, 4))
 
-    # Decide (with uniform probability) should this sample intersect
-    coin_flip = self._rng.binomial(1, 0.5)
+    # Decide (with uniform probability) should each sample intersect
+    coin_flips = self._rng.binomial(1, 0.5, size=(num_samples,))
 
-    xs = self._random_sequence(length=4, low=low, high=high)
-    ys = self._random_sequence(length=4, low=low, high=high)
+    points = np.empty((num_samples, 2, 4))
+    points[coin_flips == 1] = self._rejection_sample(
+        int(np.sum(coin_flips == 1)), draw, intersect)
+    points[coin_flips == 0] = self._rejection_sample(
+        int(np.sum(coin_flips == 0)), draw, lambda x: ~intersect(x))
 
-    while intersect(xs, ys) != coin_flip:
-      xs = self._random_sequence(length=4, low=low, high=high)
-      ys = self._random_sequence(length=4, low=low, high=high)
-
-    return [xs, ys]
+    return [[xs, ys] for xs, ys in points]
 
 
 class ConvexHullSampler(Sampler):
@@ -694,7 +1519,9 @@ def _batch_io(traj_io: Trajectories) -> Trajectory:
       assert dp.data.shape[0] == 1  # batching axis
       assert traj_io[0][i].name == dp.name
 
-  return jax.tree_util.tree_map(lambda *x: np.concatenate(x), *traj_io)
+  return [dp.with_data(np.concatenate([sample_io[i].data
+                                       for sample_io in traj_io]))
+          for i, dp in enumerate(traj_io[0])]
 
 
 def _batch_hints(
@@ -725,9 +1552,8 @@ def _batch_hints(
 
   # Create zero-filled space for the batched hints, then copy each hint
   # up to the corresponding length.
-  batched_traj = jax.tree_util.tree_map(
-      lambda x: np.zeros(time_and_batch + x.shape[2:]),
-      traj_hints[0])
+  batched_traj = [dp.with_data(np.zeros(time_and_batch + dp.data.shape[2:]))
+                  for dp in traj_hints[0]]
   hint_lengths = np.zeros(len(traj_hints))
 
   for sample_idx, cur_sample in enumerate(traj_hints):
@@ -735,7 +1561,11 @@ def _batch_hints(
       assert batched_traj[i].name == cur_sample[i].name
       cur_data = cur_sample[i].data
       cur_length = cur_data.shape[0]
-      batched_traj[i].data[:cur_length, sample_idx:sample_idx+1] = cur_data
+      if isinstance(cur_data, probing.DeltaTrajectory):
+        cur_data.copyto(
+            batched_traj[i].data[:cur_length, sample_idx:sample_idx+1])
+      else:
+        batched_traj[i].data[:cur_length, sample_idx:sample_idx+1] = cur_data
       if i > 0:
         assert hint_lengths[sample_idx] == cur_length
       else:
@@ -743,20 +1573,154 @@ def _batch_hints(
   return batched_traj, hint_lengths
 
 
+def _batch_hints_ragged(
+    traj_hints: Trajectories) -> Tuple[RaggedHints, _Array]:
+  """Batches a trajectory of hints samples without padding.
+
+  Args:
+    traj_hints: A hint trajectory of `DataPoints`s indexed by time then probe
+
+  Returns:
+    A `RaggedHints` holding a |num probes| list of `DataPoint`s with the
+    trajectories concatenated along the time axis, and a |sample| array
+    containing the length of each trajectory.
+  """
+
+  assert traj_hints  # non-empty
+  hint_lengths = np.zeros(len(traj_hints))
+  for sample_idx, cur_sample in enumerate(traj_hints):
+    for i, dp in enumerate(cur_sample):
+      assert dp.data.shape[1] == 1  # batching axis
+      assert traj_hints[0][i].name == dp.name
+      if i > 0:
+        assert hint_lengths[sample_idx] == dp.data.shape[0]
+      else:
+        hint_lengths[sample_idx] = dp.data.shape[0]
+
+  offsets = np.concatenate([[0], np.cumsum(hint_lengths, dtype=int)])
+  batched_traj = []
+  for i, dp in enumerate(traj_hints[0]):
+    data = np.concatenate([sample[i].data[:, 0] for sample in traj_hints])
+    batched_traj.append(
+        probing.DataPoint(dp.name, dp.location, dp.type_, data))
+  return RaggedHints(batched_traj, offsets), hint_lengths
+
+
+def pad_ragged_hints(
+    ragged: RaggedHints, min_steps: int = 0) -> Tuple[Trajectory, _Array]:
+  """Pads `RaggedHints` into the layout produced by `_batch_hints`.
+
+  Args:
+    ragged: The hints to pad.
+    min_steps: Hints will be padded at least to this length - if any hint is
+      longer than this, the greater length will be used.
+
+  Returns:
+    A |num probes| list of `DataPoint`s with data of shape [T, B, ...], and a
+    |sample| array containing the length of each trajectory.
+  """
+  hint_lengths = np.diff(ragged.offsets)
+  max_steps = max(min_steps, np.max(hint_lengths))
+  sample_idx = np.repeat(np.arange(len(hint_lengths)), hint_lengths)
+  step_idx = np.arange(ragged.offsets[-1]) - np.repeat(ragged.offsets[:-1],
+                                                       hint_lengths)
+  padded_traj = []
+  for dp in ragged.hints:
+    shape = (max_steps, len(hint_lengths)) + dp.data.shape[1:]
+    if isinstance(dp, probing.CompactDataPoint):
+      # Padded steps of class indices have no hot class. Padded data expands
+      # to float, as in the uncompacted case.
+      data = np.full(shape, -1 if dp.num_classes else 0, dp.data.dtype)
+      data[step_idx, sample_idx] = dp.data
+      padded_traj.append(probing.CompactDataPoint(
+          dp.name, dp.location, dp.type_, data, dp.num_classes, 'float64'))
+    else:
+      data = np.zeros(shape)
+      data[step_idx, sample_idx] = dp.data
+      padded_traj.append(dp.with_data(data))
+  return padded_traj, hint_lengths.astype(float)
+
+
+def _subsample_ragged_hints(ragged: RaggedHints, idx: List[int]) -> RaggedHints:
+  """New `RaggedHints` holding the trajectories of samples `idx`, in order."""
+  starts = ragged.offsets[idx]
+  hint_lengths = ragged.offsets[np.asarray(idx) + 1] - starts
+  offsets = np.concatenate([[0], np.cumsum(hint_lengths)])
+  steps = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - starts,
+                                             hint_lengths)
+  return RaggedHints(_subsample_data(ragged.hints, steps, axis=0), offsets)
+
+
 def _subsample_data(
     trajectory: Trajectory,
-    idx: List[int],
+    idx: Union[List[int], slice],
     axis: int = 0,
+    out: Optional[Trajectory] = None,
 ) -> Trajectory:
-  """New `Trajectory` where each `DataPoint`'s data is subsampled along axis."""
+  """New `Trajectory` where each `DataPoint`'s data is subsampled along axis.
+
+  Args:
+    trajectory: The trajectory to subsample.
+    idx: Indices (or a slice) to take along `axis`.
+    axis: The batch axis.
+    out: Optional trajectory with matching shapes. If given, the subsampled
+      data is written into its `DataPoint`s, which are returned.
+
+  Returns:
+    The subsampled trajectory.
+  """
+  if out is not None:
+    for dp, out_dp in zip(trajectory, out):
+      assert dp.name == out_dp.name
+      if isinstance(idx, slice):
+        np.copyto(out_dp.data, _slice_axis(dp.data, idx, axis))
+      else:
+        np.take(dp.data, idx, axis=axis, out=out_dp.data)
+    return out
+
   sampled_traj = []
   for dp in trajectory:
-    sampled_data = np.take(dp.data, idx, axis=axis)
-    sampled_traj.append(
-        probing.DataPoint(dp.name, dp.location, dp.type_, sampled_data))
+    sampled_traj.append(dp.with_data(np.take(dp.data, idx, axis=axis)))
   return sampled_traj
 
 
+def _slice_axis(data: _Array, idx: slice, axis: int) -> _Array:
+  return data[(slice(None),) * axis + (idx,)]
+
+
+def _slice_data(
+    trajectory: Trajectory,
+    start: int,
+    stop: int,
+    axis: int = 0,
+) -> Trajectory:
+  """New `Trajectory` of views of each `DataPoint`'s data[start:stop]."""
+  return [dp.with_data(_slice_axis(dp.data, slice(start, stop), axis))
+          for dp in trajectory]
+
+
+def _slice_ragged_hints(
+    ragged: RaggedHints, start: int, stop: int) -> RaggedHints:
+  """New `RaggedHints` of views of samples start:stop."""
+  offsets = ragged.offsets[start:stop + 1]
+  return RaggedHints(_slice_data(ragged.hints, offsets[0], offsets[-1]),
+                     offsets - offsets[0])
+
+
+def expand_feedback(feedback: Feedback) -> Feedback:
+  """Restores the one-hot float data of a batch from a `compact` sampler."""
+  features = feedback.features
+  if isinstance(features.hints, RaggedHints):
+    hints = RaggedHints([probing.expand(dp) for dp in features.hints.hints],
+                        features.hints.offsets)
+  else:
+    hints = [probing.expand(dp) for dp in features.hints]
+  return Feedback(
+      features._replace(inputs=[probing.expand(dp) for dp in features.inputs],
+                        hints=hints),
+      [probing.expand(dp) for dp in feedback.outputs])
+
+
 def _preprocess_permutations(probes, enforce_permutations):
   """Replace should-be permutations with proper permutation pointer + mask."""
   output = []
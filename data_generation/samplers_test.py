@@ -0,0 +1,504 @@
+# Copyright 2021 DeepMind Technologies Limited. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Unit tests for `samplers.py`."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+import numpy as np
+import samplers
+
+
+class ImportTest(absltest.TestCase):
+
+  def test_import_does_not_load_jax_or_tensorflow(self):
+    loaded = subprocess.run(
+        [sys.executable, '-c',
+         'import sys, samplers; '
+         'print([m for m in ("jax", "tensorflow", "chex") if m in sys.modules])'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        capture_output=True, text=True).stdout
+    self.assertEqual(loaded.strip(), '[]')
+
+
+class RandomErGraphBatchTest(absltest.TestCase):
+
+  def _sampler(self, seed=0):
+    sampler, _ = samplers.build_sampler('bfs', num_samples=1, length=4,
+                                        seed=seed)
+    return sampler
+
+  def test_undirected_is_symmetric(self):
+    sampler = self._sampler()
+    mat = sampler._random_er_graph_batch(  # pylint:disable=protected-access
+        16, 7, p=0.5, directed=False, weighted=True)
+    self.assertEqual(mat.shape, (16, 7, 7))
+    np.testing.assert_array_equal(mat, np.transpose(mat, (0, 2, 1)))
+    np.testing.assert_array_equal(
+        np.diagonal(mat, axis1=1, axis2=2), np.zeros((16, 7)))
+
+  def test_directed_acyclic_is_permuted_dag(self):
+    sampler = self._sampler()
+    mat = sampler._random_er_graph_batch(  # pylint:disable=protected-access
+        16, 7, p=0.8, directed=True, acyclic=True)
+    for graph in mat:
+      # A graph is acyclic iff its adjacency matrix is nilpotent.
+      np.testing.assert_array_equal(
+          np.linalg.matrix_power(graph, 7), np.zeros((7, 7)))
+
+  def test_per_graph_edge_probability(self):
+    sampler = self._sampler()
+    mat = sampler._random_er_graph_batch(  # pylint:disable=protected-access
+        2, 9, p=np.array([0.0, 1.0]), directed=True)
+    np.testing.assert_array_equal(mat[0], np.zeros((9, 9)))
+    np.testing.assert_array_equal(mat[1], np.ones((9, 9)))
+
+
+class SparseErGraphTest(parameterized.TestCase):
+
+  def _sampler(self, seed=0):
+    sampler, _ = samplers.build_sampler('bfs', num_samples=1, length=4,
+                                        seed=seed)
+    return sampler
+
+  def test_undirected_is_symmetric_and_sorted(self):
+    sampler = self._sampler()
+    for _ in range(8):
+      graph = sampler._random_er_graph(  # pylint:disable=protected-access
+          30, p=0.5, directed=False, weighted=True, sparse=True)
+      mat = graph.todense()
+      np.testing.assert_array_equal(mat, mat.T)
+      np.testing.assert_array_equal(np.diagonal(mat), np.zeros(30))
+      for u in range(30):
+        nbrs = graph.indices[graph.indptr[u]:graph.indptr[u + 1]]
+        self.assertTrue(np.all(np.diff(nbrs) > 0))
+
+  def test_directed_acyclic(self):
+    sampler = self._sampler()
+    mat = sampler._random_er_graph(  # pylint:disable=protected-access
+        12, p=0.8, directed=True, acyclic=True, sparse=True).todense()
+    np.testing.assert_array_equal(
+        np.linalg.matrix_power(mat, 12), np.zeros((12, 12)))
+
+  def test_edge_density_matches_dense(self):
+    sampler = self._sampler()
+    dense = np.mean([
+        np.count_nonzero(sampler._random_er_graph(  # pylint:disable=protected-access
+            40, p=0.3)) for _ in range(200)])
+    sparse = np.mean([
+        len(sampler._random_er_graph(  # pylint:disable=protected-access
+            40, p=0.3, sparse=True).indices) for _ in range(200)])
+    self.assertAlmostEqual(sparse / dense, 1.0, delta=0.05)
+
+  @parameterized.parameters('bfs', 'dfs', 'bellman_ford', 'dijkstra',
+                            'mst_prim')
+  def test_sparse_sampler_matches_dense_layout(self, name):
+    dense, _ = samplers.build_sampler(name, num_samples=4, length=10, seed=0)
+    sparse, _ = samplers.build_sampler(name, num_samples=4, length=10, seed=0,
+                                       sparse=True)
+    for x, y in zip(dense.next().features.inputs,
+                    sparse.next().features.inputs):
+      self.assertEqual(x.name, y.name)
+      self.assertEqual(x.data.shape, y.data.shape)
+      self.assertEqual(x.data.dtype, y.data.dtype)
+
+
+class SamplerBatchTest(parameterized.TestCase):
+
+  @parameterized.parameters('bfs', 'dfs', 'bellman_ford', 'floyd_warshall')
+  def test_batched_samplers_are_deterministic(self, name):
+    first, _ = samplers.build_sampler(name, num_samples=8, length=6, seed=1)
+    second, _ = samplers.build_sampler(name, num_samples=8, length=6, seed=1)
+    for x, y in zip(first.next().features.inputs,
+                    second.next().features.inputs):
+      np.testing.assert_array_equal(x.data, y.data)
+
+
+class ShardedSamplerTest(absltest.TestCase):
+
+  def test_output_does_not_depend_on_num_workers(self):
+    num_samples = 2 * samplers._SHARD_SIZE + 10  # pylint:disable=protected-access
+    serial, _ = samplers.build_sampler('bfs', num_samples=num_samples,
+                                       length=5, seed=3, num_workers=1)
+    parallel, _ = samplers.build_sampler('bfs', num_samples=num_samples,
+                                         length=5, seed=3, num_workers=2)
+    serial, parallel = serial.next(), parallel.next()
+    for x, y in zip(serial.features.inputs + serial.features.hints +
+                    serial.outputs,
+                    parallel.features.inputs + parallel.features.hints +
+                    parallel.outputs):
+      self.assertEqual(x.name, y.name)
+      np.testing.assert_array_equal(x.data, y.data)
+    np.testing.assert_array_equal(serial.features.lengths,
+                                  parallel.features.lengths)
+
+  def test_pool_is_reused_until_closed(self):
+    num_samples = samplers._SHARD_SIZE + 10  # pylint:disable=protected-access
+    serial, _ = samplers.build_sampler('bfs', num_samples=-1, length=5, seed=3,
+                                       num_workers=1)
+    parallel, _ = samplers.build_sampler('bfs', num_samples=-1, length=5,
+                                         seed=3, num_workers=2)
+    with parallel:
+      serial.next(num_samples)
+      parallel.next(num_samples)
+      pool = parallel._pool  # pylint:disable=protected-access
+      self.assertIsNotNone(pool)
+      expected, actual = serial.next(num_samples), parallel.next(num_samples)
+      self.assertIs(parallel._pool, pool)  # pylint:disable=protected-access
+    self.assertIsNone(parallel._pool)  # pylint:disable=protected-access
+    for x, y in zip(expected.features.hints, actual.features.hints):
+      np.testing.assert_array_equal(x.data, y.data)
+
+
+class PrefetchIteratorTest(parameterized.TestCase):
+
+  @parameterized.parameters(False, True)
+  def test_same_batches_as_serial_sampling(self, use_process):
+    serial, _ = samplers.build_sampler('bfs', num_samples=-1, length=6, seed=3)
+    prefetched, _ = samplers.build_sampler('bfs', num_samples=-1, length=6,
+                                           seed=3)
+    with samplers.PrefetchIterator(prefetched, 2, depth=3,
+                                   use_process=use_process) as batches:
+      for _ in range(5):
+        expected, actual = serial.next(2), next(batches)
+        for x, y in zip(expected.features.inputs, actual.features.inputs):
+          np.testing.assert_array_equal(x.data, y.data)
+        np.testing.assert_array_equal(expected.features.lengths,
+                                      actual.features.lengths)
+
+  def test_raises_sampling_errors(self):
+    sampler, _ = samplers.build_sampler('bfs', num_samples=4, length=6, seed=3)
+    batches = samplers.PrefetchIterator(sampler, batch_size=8)
+    with self.assertRaises(ValueError):
+      next(batches)
+
+  def test_raises_if_worker_dies(self):
+    sampler, _ = samplers.build_sampler('bfs', num_samples=-1, length=6, seed=3)
+    with samplers.PrefetchIterator(sampler, 2, depth=1,
+                                   use_process=True) as batches:
+      next(batches)
+      batches._worker.kill()  # pylint:disable=protected-access
+      with self.assertRaisesRegex(RuntimeError, 'exited unexpectedly'):
+        for _ in range(3):  # Batches already in the queue may come first.
+          next(batches)
+
+
+class ValidationTest(parameterized.TestCase):
+
+  def _count_validated(self, validation, num_workers=None):
+    validated = []
+    split_stages = samplers.probing.split_stages
+
+    def spy(probes, spec, validate=True):
+      validated.append(validate)
+      return split_stages(probes, spec, validate)
+
+    with mock.patch.object(samplers.probing, 'split_stages', spy):
+      samplers.build_sampler('bfs', num_samples=250, length=5, seed=0,
+                             num_workers=num_workers, validation=validation,
+                             validation_samples=120)
+    return sum(validated)
+
+  @parameterized.parameters(
+      ('full', None, 250), ('off', None, 0), ('sampled', None, 120),
+      ('sampled', 1, 120))
+  def test_number_of_validated_samples(self, validation, num_workers,
+                                       expected):
+    self.assertEqual(self._count_validated(validation, num_workers), expected)
+
+
+class MaxHintStepsTest(parameterized.TestCase):
+
+  @parameterized.parameters('dfs', 'bfs', 'bellman_ford', 'dijkstra',
+                            'mst_prim', 'floyd_warshall')
+  def test_bound_covers_sampled_hints(self, name):
+    sampler, _ = samplers.build_sampler(name, num_samples=-1, length=7, seed=0,
+                                        p=(0.1, 0.5, 0.9))
+    max_steps = sampler.max_steps
+    for _ in range(4):
+      feedback = sampler.next(32)
+      self.assertLessEqual(np.max(feedback.features.lengths), max_steps)
+    self.assertEqual(sampler.max_steps, max_steps)
+
+  @parameterized.parameters(False, True)
+  def test_hints_padding(self, pad_to_max_steps):
+    sampler, _ = samplers.build_sampler('bfs', num_samples=-1, length=9,
+                                        seed=0,
+                                        pad_to_max_steps=pad_to_max_steps)
+    for _ in range(4):
+      feedback = sampler.next(4)
+      num_steps = (sampler.max_steps if pad_to_max_steps else
+                   np.max(feedback.features.lengths))
+      for dp in feedback.features.hints:
+        self.assertEqual(dp.data.shape[0], num_steps)
+
+
+class RaggedHintsTest(parameterized.TestCase):
+
+  @parameterized.parameters('dfs', 'bellman_ford')
+  def test_padding_matches_batched_hints(self, name):
+    padded, _ = samplers.build_sampler(name, num_samples=20, length=6, seed=4)
+    ragged, _ = samplers.build_sampler(name, num_samples=20, length=6, seed=4,
+                                       ragged_hints=True)
+    padded, ragged = padded.next(), ragged.next()
+    self.assertIsInstance(ragged.features.hints, samplers.RaggedHints)
+    np.testing.assert_array_equal(ragged.features.lengths,
+                                  padded.features.lengths)
+
+    hints, lengths = samplers.pad_ragged_hints(ragged.features.hints)
+    np.testing.assert_array_equal(lengths, padded.features.lengths)
+    for x, y in zip(hints, padded.features.hints):
+      self.assertEqual(x.name, y.name)
+      np.testing.assert_array_equal(x.data, y.data)
+
+  def test_subsampling_keeps_trajectories(self):
+    sampler, _ = samplers.build_sampler('bellman_ford', num_samples=20,
+                                        length=6, seed=5, ragged_hints=True)
+    full = sampler.next().features
+    padded, _ = samplers.pad_ragged_hints(full.hints)
+    idx = [3, 0, 3, 17]
+    subsampled = samplers._subsample_ragged_hints(  # pylint:disable=protected-access
+        full.hints, idx)
+    sub_padded, lengths = samplers.pad_ragged_hints(
+        subsampled, min_steps=padded[0].data.shape[0])
+    np.testing.assert_array_equal(lengths, full.lengths[idx])
+    for x, y in zip(sub_padded, padded):
+      np.testing.assert_array_equal(x.data, y.data[:, idx])
+
+
+class EpochShuffleTest(parameterized.TestCase):
+
+  @parameterized.parameters(False, True)
+  def test_epoch_visits_every_sample_once(self, ragged_hints):
+    sampler, _ = samplers.build_sampler(
+        'bfs', num_samples=12, length=5, seed=6, ragged_hints=ragged_hints,
+        epoch_shuffle=True)
+    full = sampler.next()
+    positions = [dp for dp in full.features.inputs if dp.name == 's'][0]
+    sources = sorted(np.argmax(positions.data, axis=-1))
+
+    seen = []
+    for _ in range(3):
+      batch = sampler.next(4)
+      source = [dp for dp in batch.features.inputs if dp.name == 's'][0]
+      self.assertTrue(np.shares_memory(source.data, sampler._inputs[1].data))  # pylint:disable=protected-access
+      seen.extend(np.argmax(source.data, axis=-1))
+    self.assertEqual(sorted(seen), sources)
+
+  def test_next_into_preallocated_batch(self):
+    first, _ = samplers.build_sampler('bellman_ford', num_samples=10, length=5,
+                                      seed=7)
+    second, _ = samplers.build_sampler('bellman_ford', num_samples=10,
+                                       length=5, seed=7)
+    out = second.allocate_batch(6)
+    for _ in range(2):
+      expected = first.next(6)
+      batch = second.next(6, out=out)
+      self.assertIs(batch, out)
+      for x, y in zip(expected.features.inputs + expected.features.hints +
+                      expected.outputs,
+                      batch.features.inputs + batch.features.hints +
+                      batch.outputs):
+        np.testing.assert_array_equal(x.data, y.data)
+      np.testing.assert_array_equal(expected.features.lengths,
+                                    batch.features.lengths)
+
+
+class CompactSamplerTest(parameterized.TestCase):
+
+  @parameterized.product(name=['bfs', 'dfs', 'dijkstra'],
+                         ragged_hints=[False, True])
+  def test_expanded_batches_match(self, name, ragged_hints):
+    sampler, _ = samplers.build_sampler(name, num_samples=8, length=8, seed=0,
+                                        ragged_hints=ragged_hints)
+    compact, _ = samplers.build_sampler(name, num_samples=8, length=8, seed=0,
+                                        ragged_hints=ragged_hints,
+                                        compact=True)
+    expected, actual = sampler.next(4), compact.next(4)
+    self.assertLess(
+        sum(dp.data.nbytes for dp in actual.features.inputs),
+        sum(dp.data.nbytes for dp in expected.features.inputs))
+    if ragged_hints:
+      expected = expected._replace(features=expected.features._replace(
+          hints=samplers.pad_ragged_hints(expected.features.hints)[0]))
+      actual = actual._replace(features=actual.features._replace(
+          hints=samplers.pad_ragged_hints(actual.features.hints)[0]))
+    actual = samplers.expand_feedback(actual)
+    for x, y in zip(
+        expected.features.inputs + expected.features.hints + expected.outputs,
+        actual.features.inputs + actual.features.hints + actual.outputs):
+      self.assertEqual(x.data.dtype, y.data.dtype)
+      np.testing.assert_array_equal(x.data, y.data)
+
+
+class HintSelectionTest(absltest.TestCase):
+
+  def test_selected_hints_match_full_hints(self):
+    full, _ = samplers.build_sampler('dfs', num_samples=8, length=6, seed=0)
+    part, spec = samplers.build_sampler('dfs', num_samples=8, length=6, seed=0,
+                                        hints=['pi_h', 'color'])
+    self.assertNotIn('d', spec)
+    expected = {dp.name: dp.data for dp in full.next().features.hints}
+    actual = part.next().features.hints
+    self.assertEqual([dp.name for dp in actual], ['pi_h', 'color'])
+    for dp in actual:
+      np.testing.assert_array_equal(dp.data, expected[dp.name])
+
+
+class DeltaHintsTest(parameterized.TestCase):
+
+  @parameterized.product(ragged_hints=[False, True], num_workers=[None, 1])
+  def test_same_batches_as_dense_hints(self, ragged_hints, num_workers):
+    batch_hints = samplers._batch_hints  # pylint:disable=protected-access
+    batched = []
+
+    def spy(traj_hints, min_steps):
+      batched.extend(dp.data for sample in traj_hints for dp in sample)
+      return batch_hints(traj_hints, min_steps)
+
+    dense, _ = samplers.build_sampler('dijkstra', num_samples=-1, length=6,
+                                      seed=5, ragged_hints=ragged_hints,
+                                      num_workers=num_workers)
+    delta, _ = samplers.build_sampler('dijkstra', num_samples=-1, length=6,
+                                      seed=5, ragged_hints=ragged_hints,
+                                      num_workers=num_workers, delta_hints=True)
+    with mock.patch.object(samplers, '_batch_hints', spy):
+      expected, actual = dense.next(4), delta.next(4)
+    if not ragged_hints:
+      self.assertTrue(all(isinstance(data, samplers.probing.DeltaTrajectory)
+                          for data in batched[len(batched) // 2:]))
+    hints = ((expected.features.hints.hints, actual.features.hints.hints)
+             if ragged_hints else
+             (expected.features.hints, actual.features.hints))
+    for x, y in zip(*hints):
+      self.assertEqual(x.data.dtype, y.data.dtype)
+      np.testing.assert_array_equal(x.data, y.data)
+    np.testing.assert_array_equal(expected.features.lengths,
+                                  actual.features.lengths)
+
+
+class BatchedExecutorTest(parameterized.TestCase):
+
+  @parameterized.parameters('bfs', 'bellman_ford', 'dijkstra', 'mst_prim',
+                            'floyd_warshall')
+  def test_batched_samplers_give_identical_batches(self, name):
+    for kwargs in [dict(num_samples=20), dict(num_samples=-1),
+                   dict(num_samples=20, compact=True)]:
+      batches = []
+      for batched in [False, True]:
+        sampler, _ = samplers.build_sampler(name, length=7, seed=3,
+                                            batched=batched, **kwargs)
+        batches.append(sampler.next(10))
+      expected, actual = batches
+      np.testing.assert_array_equal(actual.features.lengths,
+                                    expected.features.lengths)
+      for x, y in zip(
+          actual.features.inputs + actual.features.hints + actual.outputs,
+          expected.features.inputs + expected.features.hints +
+          expected.outputs):
+        self.assertEqual((x.name, x.data.dtype), (y.name, y.data.dtype))
+        np.testing.assert_array_equal(x.data, y.data)
+
+  def test_selected_hints_are_kept(self):
+    sampler, spec = samplers.build_sampler(
+        'bfs', num_samples=10, length=5, seed=0, hints=['pi_h'], batched=True)
+    names = [dp.name for dp in sampler.next(4).features.hints]
+    self.assertEqual(names, ['pi_h'])
+    self.assertEqual(names, [k for k, v in spec.items() if v[0] == 'hint'])
+
+
+class BatchCacheTest(absltest.TestCase):
+
+  def _sampler(self, cache_dir, **kwargs):
+    sampler, _ = samplers.build_sampler('dijkstra', num_samples=6, length=5,
+                                        seed=8, cache_dir=cache_dir, **kwargs)
+    return sampler
+
+  def test_cached_batches_match_sampled_ones(self):
+    cache_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, cache_dir)
+    uncached = self._sampler(None)
+    expected = [uncached.next(3) for _ in range(2)]
+
+    for _ in range(2):  # Populates the cache, then reads from it.
+      cached = self._sampler(cache_dir)
+      for batch, expected_batch in zip([cached.next(3) for _ in range(2)],
+                                       expected):
+        for x, y in zip(batch.features.inputs + batch.features.hints,
+                        expected_batch.features.inputs +
+                        expected_batch.features.hints):
+          np.testing.assert_array_equal(x.data, y.data)
+    self.assertLen(os.listdir(cache_dir), 1)
+
+    with mock.patch.object(
+        samplers.BellmanFordSampler, '_make_batch_uncached',
+        side_effect=AssertionError('Dataset should come from the cache.')):
+      cached = self._sampler(cache_dir)
+    self.assertEqual(cached._num_unrolled, 6)  # pylint:disable=protected-access
+
+  def test_key_covers_validation(self):
+    cache_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, cache_dir)
+    self._sampler(cache_dir, validation='off')
+    self._sampler(cache_dir, validation='full')
+    self.assertLen(os.listdir(cache_dir), 2)
+
+  def test_on_the_fly_sampling_is_not_cached(self):
+    with self.assertRaises(ValueError):
+      samplers.build_sampler('dijkstra', num_samples=-1, length=5, seed=8,
+                             cache_dir=tempfile.gettempdir())
+
+  def test_key_covers_sampling_and_batching_code(self):
+    source_version = samplers._source_version  # pylint:disable=protected-access
+    source_version.cache_clear()
+    self.addCleanup(source_version.cache_clear)
+    with mock.patch.object(samplers.inspect, 'getsource',
+                           return_value='') as getsource:
+      source_version(samplers.algorithms.bfs, samplers.BfsSampler)
+    hashed = [call.args[0] for call in getsource.call_args_list]
+    self.assertIn(samplers, hashed)
+    self.assertIn(samplers.graphs_batched, hashed)
+    self.assertIn(samplers.probing, hashed)
+
+
+class BatchedRejectionSamplingTest(absltest.TestCase):
+
+  def test_segments_follow_coin_flips(self):
+    sampler, _ = samplers.build_sampler('segments_intersect', num_samples=200,
+                                        length=4, seed=9)
+    feedback = sampler.next()
+    intersect = feedback.outputs[0].data
+    self.assertSetEqual(set(np.unique(intersect)), {0, 1})
+    self.assertBetween(np.mean(intersect), 0.35, 0.65)
+
+  def test_matcher_embeds_needle(self):
+    sampler, _ = samplers.build_sampler('naive_string_matcher', num_samples=1,
+                                        length=20, seed=10)
+    for haystack, needle in sampler._sample_batch(50, 20):  # pylint:disable=protected-access
+      self.assertLen(needle, 4)
+      self.assertTrue(any(np.array_equal(haystack[i:i + 4], needle)
+                          for i in range(len(haystack) - 3)))
+
+
+if __name__ == '__main__':
+  absltest.main()